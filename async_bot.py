@@ -0,0 +1,424 @@
+"""Асинхронный рантайм бота на AsyncTeleBot
+
+Те же команды и кнопки, что в bot.py, но обработчики - корутины в одном
+цикле событий: пока один ждет ответа Telegram или Open-Meteo, остальные
+продолжают работу. Запросы к SQLite выполняются в пуле потоков
+AsyncDatabase, блокирующие HTTP-запросы погоды - в пуле по умолчанию.
+
+Запуск:
+    python async_bot.py
+"""
+import asyncio
+import logging
+import time
+
+from telebot import asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+
+from async_database import AsyncDatabase
+from async_notes_handler import AsyncNotesHandler
+from bot_common import (
+    WELCOME_TEXT, HELP_TEXT, ABOUT_TEXT, ECHO_INSTRUCTIONS, UNKNOWN_COMMAND_TEXT,
+    create_database, create_health_prober, build_ping_text, calculate_sum, build_echo_preview
+)
+from config import (
+    BOT_TOKEN, bot_logger, safe_log_user_info,
+    DB_NAME, DB_POOL_SIZE, ASYNC_DB_WORKERS, WEATHER_PREFETCH_ENABLED,
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+)
+from keyboards import create_main_keyboard, create_forecast_keyboard
+from message_router import MessageRouter, CallbackRouter
+from metrics import timed_handler, start_metrics_server
+from http_sessions import open_meteo_session, connection_stats
+from open_meteo import open_meteo_client
+from weather import (
+    get_weather_moscow, get_weather_city, get_weather_location,
+    weather_cache, weather_prefetcher, weather_batcher
+)
+from forecast import (
+    FORECAST_VARIANTS, parse_forecast_args, get_forecast_city, get_forecast_cell, forecast_cell,
+    forecast_cache, forecast_batcher
+)
+
+# Константы для состояний пользователя
+STATE_ECHO = "waiting_echo"
+
+# ========== ИНИЦИАЛИЗАЦИЯ ==========
+bot = AsyncTeleBot(BOT_TOKEN, parse_mode=None)
+
+# Таблицы маршрутов: команды, reply-кнопки и состояния; callback-запросы inline-кнопок
+router = MessageRouter()
+callbacks = CallbackRouter(bot, asynchronous=True)
+
+db = AsyncDatabase(create_database(), max_workers=ASYNC_DB_WORKERS)
+
+# Фоновые проверки Open-Meteo, Bot API и базы - /ping читает их результаты
+health = create_health_prober(db.sync)
+
+notes_handler = AsyncNotesHandler(bot, db, router, callbacks)
+
+# Словарь для хранения состояний эхо-команды
+user_states = {}
+
+# ========== РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ ЗАМЕТОК ==========
+notes_handler.register_handlers()
+notes_handler.register_callbacks()
+
+
+async def run_blocking(func, *args):
+    """Выполнение блокирующей функции в пуле потоков по умолчанию"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+def log_user_action(message, action, tag):
+    """Запись действия пользователя в лог"""
+    user_info = safe_log_user_info(
+        message.from_user.id,
+        message.from_user.username,
+        action,
+        message.text
+    )
+    bot_logger.info(f"{tag}: {user_info}")
+    return user_info
+
+
+# Обработчики команд
+@router.command('start')
+async def handle_start(message):
+    """Обработка команды /start"""
+    log_user_action(message, 'start', 'START')
+
+    await bot.send_message(
+        message.chat.id,
+        WELCOME_TEXT,
+        reply_markup=create_main_keyboard()
+    )
+
+
+@router.command('help')
+async def handle_help(message):
+    """Обработка команды /help"""
+    log_user_action(message, 'help', 'HELP')
+    await bot.send_message(message.chat.id, HELP_TEXT)
+
+
+@router.command('about')
+async def handle_about(message):
+    """Обработка команды /about"""
+    log_user_action(message, 'about', 'ABOUT')
+    await bot.send_message(message.chat.id, ABOUT_TEXT)
+
+
+@router.command('ping')
+async def handle_ping(message):
+    """Обработка команды /ping"""
+    start_time = time.perf_counter()
+    log_user_action(message, 'ping', 'PING')
+
+    # Внешние сервисы не опрашиваются: состояние - из фоновых проверок
+    queues = {'задач в цикле событий': len(asyncio.all_tasks())}
+    handling_us = (time.perf_counter() - start_time) * 1_000_000
+
+    await bot.send_message(message.chat.id, build_ping_text(handling_us, health.results(), queues))
+
+
+@router.command('weather')
+async def handle_weather(message):
+    """Обработка команды /weather [город] - по умолчанию погода в Москве"""
+    log_user_action(message, 'weather', 'WEATHER')
+
+    args = message.text.split(maxsplit=1)
+    if len(args) > 1:
+        weather_info = await run_blocking(get_weather_city, args[1])
+    else:
+        weather_info = await run_blocking(get_weather_moscow)
+    await bot.send_message(message.chat.id, weather_info)
+
+
+@router.command('sum')
+async def handle_sum(message):
+    """Обработка команды /sum - вычисление суммы чисел"""
+    user_info = log_user_action(message, 'sum', 'SUM_REQUEST')
+
+    args = message.text.split()[1:]
+
+    if not args:
+        await bot.send_message(
+            message.chat.id,
+            "❌ Пожалуйста, укажите числа для сложения.\n"
+            "Пример: /sum 5 10 15"
+        )
+        bot_logger.warning(f"SUM_EMPTY_ARGS: {user_info}")
+        return
+
+    try:
+        numbers, total, result_text = calculate_sum(args)
+    except ValueError:
+        await bot.send_message(
+            message.chat.id,
+            "❌ Ошибка: пожалуйста, вводите только целые числа.\n"
+            "Пример: /sum 5 10 15"
+        )
+        bot_logger.warning(f"SUM_VALUE_ERROR: {user_info}")
+        return
+
+    bot_logger.info(f"SUM_CALCULATED: {user_info}, numbers={numbers}, total={total}")
+    await bot.send_message(message.chat.id, result_text)
+
+
+@router.command('echo')
+async def handle_echo(message):
+    """Обработка команды /echo"""
+    log_user_action(message, 'echo', 'ECHO_COMMAND')
+
+    # Проверяем, есть ли текст после команды
+    args = message.text.split(maxsplit=1)
+
+    if len(args) > 1:
+        await process_echo_text(message, args[1])
+    else:
+        user_states[message.from_user.id] = STATE_ECHO
+        await bot.send_message(message.chat.id, ECHO_INSTRUCTIONS)
+
+
+async def process_echo_text(message, text):
+    """Обработка текста для эхо-команды"""
+    user_states.pop(message.from_user.id, None)
+    await bot.send_message(message.chat.id, build_echo_preview(text))
+
+
+# Кнопки в этом состоянии продолжают работать (capture=False)
+@router.state(user_states.get, STATE_ECHO, capture=False)
+async def handle_echo_state(message):
+    """Обработка текста в состоянии ожидания эхо"""
+    await process_echo_text(message, message.text)
+
+
+# Обработчики текстовых сообщений (reply-кнопки)
+@router.text("❓ О боте")
+async def handle_about_button(message):
+    """Обработка кнопки 'О боте'"""
+    log_user_action(message, 'button_about', 'BUTTON_ABOUT')
+    await handle_about(message)
+
+
+@router.text("☀️ Погода Москва")
+async def handle_weather_button(message):
+    """Обработка кнопки 'Погода Москва'"""
+    log_user_action(message, 'button_weather', 'BUTTON_WEATHER')
+
+    await bot.send_message(message.chat.id, "⏳ Загружаю данные о погоде...")
+    weather_info = await run_blocking(get_weather_moscow)
+    await bot.send_message(message.chat.id, weather_info)
+
+
+@bot.message_handler(content_types=['location'])
+@timed_handler
+async def handle_location(message):
+    """Погода в присланной геопозиции (кнопка 'Погода рядом' или вложение)"""
+    log_user_action(message, 'weather_location', 'WEATHER_LOCATION')
+
+    latitude, longitude = message.location.latitude, message.location.longitude
+    weather_info = await run_blocking(get_weather_location, latitude, longitude)
+    await bot.send_message(
+        message.chat.id,
+        weather_info,
+        reply_markup=create_forecast_keyboard(*forecast_cell(latitude, longitude))
+    )
+
+
+@router.command('forecast')
+async def handle_forecast(message):
+    """Обработка команды /forecast [завтра|неделя] [город] - прогноз погоды"""
+    log_user_action(message, 'forecast', 'FORECAST')
+
+    variant, city = parse_forecast_args(message.text)
+    forecast_text, cell = await run_blocking(get_forecast_city, city or "Москва", variant)
+    await bot.send_message(
+        message.chat.id,
+        forecast_text,
+        reply_markup=create_forecast_keyboard(*cell, variant) if cell else None
+    )
+
+
+@callbacks.route('forecast')
+async def handle_forecast_variant(call, variant, latitude, longitude, shown=None):
+    """Переключение варианта прогноза кнопками под сообщением"""
+    if shown or variant not in FORECAST_VARIANTS:
+        return
+
+    latitude, longitude = float(latitude), float(longitude)
+    forecast_text = await run_blocking(get_forecast_cell, latitude, longitude, variant)
+    await bot.edit_message_text(
+        forecast_text,
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=create_forecast_keyboard(latitude, longitude, variant)
+    )
+
+
+@router.text("🤝 Помощь")
+async def handle_help_button(message):
+    """Обработка кнопки 'Помощь'"""
+    log_user_action(message, 'button_help', 'BUTTON_HELP')
+    await handle_help(message)
+
+
+@router.text("🪄 Эхо команда")
+async def handle_echo_button(message):
+    """Обработка кнопки 'Эхо команда'"""
+    log_user_action(message, 'button_echo', 'BUTTON_ECHO')
+    await handle_echo(message)
+
+
+@router.text("⬇️ Скрыть клавиатуру")
+async def handle_hide_keyboard(message):
+    """Обработка кнопки 'Скрыть клавиатуру'"""
+    log_user_action(message, 'hide_keyboard', 'HIDE_KEYBOARD')
+
+    await bot.send_message(
+        message.chat.id,
+        "⌨️ Клавиатура скрыта. Используйте /start чтобы вернуть её.",
+        reply_markup=types.ReplyKeyboardRemove()
+    )
+
+
+@router.text("📝 Заметки")
+async def handle_notes_button(message):
+    """Обработка кнопки 'Заметки'"""
+    await notes_handler.handle_notes_button(message)
+
+
+@router.text("❌ Отмена")
+async def handle_cancel_button(message):
+    """Обработка кнопки 'Отмена'"""
+    log_user_action(message, 'cancel', 'CANCEL')
+
+    await bot.send_message(message.chat.id, "❌ Операция отменена, возвращаю вас в меню заметок...")
+    await notes_handler.handle_notes_button(message)
+
+
+@router.text("📝 Новая заметка")
+async def handle_new_note_button(message):
+    """Обработка кнопки 'Новая заметка'"""
+    log_user_action(message, 'new_note_button', 'NEW_NOTE_BUTTON')
+    await notes_handler.handle_note_add1(message)
+
+
+@router.text("📋 Список заметок")
+async def handle_list_notes_button(message):
+    """Обработка кнопки 'Список заметок'"""
+    log_user_action(message, 'list_notes_button', 'LIST_NOTES_BUTTON')
+    await notes_handler.handle_note_list1(message)
+
+
+@router.text("🔍 Поиск заметок")
+async def handle_search_notes_button(message):
+    """Обработка кнопки 'Поиск заметок'"""
+    await notes_handler.handle_note_find1(message)
+
+
+@router.text("📊 Статистика")
+async def handle_stats_button(message):
+    """Обработка кнопки 'Статистика'"""
+    log_user_action(message, 'stats_button', 'STATS_BUTTON')
+    await notes_handler.handle_note_count1(message)
+
+
+@router.text("📁 Экспорт заметок")
+async def handle_export_button(message):
+    """Обработка кнопки 'Экспорт заметок'"""
+    log_user_action(message, 'export_button', 'EXPORT_BUTTON')
+    await notes_handler.handle_note_export1(message)
+
+
+@router.text("🔙 Главное меню")
+async def handle_back_to_main_button(message):
+    """Обработка кнопки 'Главное меню'"""
+    log_user_action(message, 'back_to_main_button', 'BACK_TO_MAIN_BUTTON')
+
+    await bot.send_message(
+        message.chat.id,
+        "🔙 Возвращаюсь в главное меню...",
+        reply_markup=create_main_keyboard()
+    )
+
+
+@router.fallback
+async def handle_other_messages(message):
+    """Обработка всех остальных сообщений"""
+    log_user_action(message, 'unknown_command', 'UNKNOWN_COMMAND')
+    await bot.send_message(message.chat.id, UNKNOWN_COMMAND_TEXT)
+
+
+# Все текстовые сообщения и callback-запросы идут через таблицы маршрутов
+router.install(bot, asynchronous=True)
+callbacks.install()
+
+
+async def main():
+    """Основная функция запуска асинхронного бота"""
+    bot_logger.info("=" * 50)
+    bot_logger.info("Запуск телеграм-бота (asyncio)...")
+
+    metrics_server = None
+    try:
+        # Получаем информацию о боте для логирования
+        bot_info = await bot.get_me()
+        bot_logger.info(f"Бот @{bot_info.username} запущен успешно")
+        bot_logger.info(f"База данных: {DB_NAME} (пул соединений: {DB_POOL_SIZE}, "
+                        f"потоков БД: {db.max_workers})")
+
+        # Обновление кэша погоды идет в своем потоке, цикл событий не блокирует
+        if WEATHER_PREFETCH_ENABLED:
+            weather_prefetcher.start()
+        health.start()
+        # Сервер метрик отвечает из своих потоков, цикл событий не занимает
+        if METRICS_ENABLED:
+            metrics_server = start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+        # Запуск long polling
+        bot_logger.info("Запуск Long Polling...")
+        await bot.infinity_polling(
+            timeout=60,
+            request_timeout=90,
+            logger_level=logging.INFO
+        )
+
+    except asyncio_helper.ApiException as e:
+        bot_logger.error(f"Ошибка API Telegram: {str(e)[:200]}")
+    except Exception as e:
+        bot_logger.error(f"Неожиданная ошибка при запуске: {str(e)[:200]}")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        await bot.close_session()
+        bot_logger.info(f"Статистика callback-запросов: {callbacks.stats()}")
+        bot_logger.info(f"Соединения Open-Meteo: {connection_stats(open_meteo_session)}")
+        bot_logger.info(f"Клиент Open-Meteo: {open_meteo_client.stats()}")
+        health.stop()
+        bot_logger.info(f"Фоновые проверки: {health.stats()}")
+        weather_prefetcher.stop()
+        bot_logger.info(f"Фоновое обновление погоды: {weather_prefetcher.stats()}")
+        bot_logger.info(f"Статистика кэша погоды: {weather_cache.stats()}")
+        bot_logger.info(f"Пакетные запросы погоды: {weather_batcher.stats()}")
+        bot_logger.info(f"Статистика кэша прогнозов: {forecast_cache.stats()}")
+        bot_logger.info(f"Пакетные запросы прогнозов: {forecast_batcher.stats()}")
+        forecast_cache.close()
+        weather_cache.close()
+        bot_logger.info(f"Статистика пула БД: {db.sync.get_pool_stats()}")
+        if db.sync.get_cache_stats() is not None:
+            bot_logger.info(f"Статистика кэша заметок: {db.sync.get_cache_stats()}")
+        if db.sync.get_writer_stats() is not None:
+            bot_logger.info(f"Статистика потока записи БД: {db.sync.get_writer_stats()}")
+        db.close()
+        bot_logger.info("Бот остановлен")
+        bot_logger.info("=" * 50)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        bot_logger.info("Бот остановлен пользователем (Ctrl+C)")
@@ -0,0 +1,57 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.database.async')
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database для AsyncTeleBot
+
+    Вызовы sqlite3 блокируют поток, поэтому каждый метод Database
+    выполняется в выделенном пуле потоков, а обработчик получает
+    корутину: db.get_user_notes(...) превращается в
+    await adb.get_user_notes(...). Размер пула по умолчанию равен
+    размеру пула соединений - больше потоков все равно ждали бы
+    свободного соединения.
+
+    Исходный объект Database доступен как sync - для кода, который сам
+    выполняется в пуле через run() (экспорт, импорт).
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.sync = db
+        self.max_workers = max_workers or db.pool.size
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='db-async'
+        )
+        logger.info(f"Асинхронный доступ к БД: {self.max_workers} потоков")
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение func(*args, **kwargs) в пуле потоков базы данных"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        method = getattr(self.sync, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
+
+    def close(self):
+        """Остановка пула потоков и закрытие базы данных"""
+        self.executor.shutdown(wait=True)
+        self.sync.close()
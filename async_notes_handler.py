@@ -0,0 +1,610 @@
+import asyncio
+import logging
+
+from telebot import types
+
+from config import bot_logger, safe_log_user_info
+from notes_export import build_notes_export
+from notes_handler import (
+    NotesHandler, NO_DATABASE_TEXT, NO_NOTES_TEXT, NOTES_MENU_TEXT,
+    NOTE_EDIT_PROMPT, NOTE_DEL_PROMPT, INVALID_ID_TEXT
+)
+from message_router import CallbackRouter
+from metrics import timed_handler
+from notes_import import import_notes, ImportFormatError
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.notes.async')
+
+
+class AsyncNotesHandler(NotesHandler):
+    """Обработчики заметок для AsyncTeleBot
+
+    Состояния, проверка ввода, тексты и клавиатуры наследуются от
+    NotesHandler, здесь только ввод-вывод: вызовы бота и базы данных
+    выполняются через await. db - AsyncDatabase, поэтому запросы к
+    SQLite уходят в пул потоков и не блокируют цикл событий.
+    """
+
+    def __init__(self, bot, db, router=None, callbacks=None):
+        if callbacks is None:
+            callbacks = CallbackRouter(bot, asynchronous=True)
+        super().__init__(bot, db, router, callbacks)
+
+    async def handle_note_list1(self, message):
+        """Показ списка заметок"""
+        if not self.db:
+            await self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
+            return
+        user_id = message.from_user.id
+        logger.info(f"NOTE_LIST запрошен: user_id={user_id}")
+
+        response, markup = await self.build_notes_page(user_id)
+
+        if response is None:
+            await self.bot.send_message(message.chat.id, NO_NOTES_TEXT)
+            return
+
+        await self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup
+        )
+
+    async def build_notes_page(self, user_id, after_local_id=None, before_local_id=None, category=None):
+        """Формирование текста и inline-навигации для страницы списка заметок"""
+        page = await self.db.get_user_notes_page(
+            user_id,
+            page_size=self.NOTES_PAGE_SIZE,
+            after_local_id=after_local_id,
+            before_local_id=before_local_id,
+            category=category
+        )
+        return self.render_notes_page(page, category)
+
+    async def handle_note_add1(self, message, send_markup=True):
+        """Начало добавления заметки"""
+        if not self.db:
+            await self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
+            return
+        user_info = f"user_id={message.from_user.id}, username={message.from_user.username}"
+        logger.info(f"NOTE_ADD начато: {user_info}")
+
+        # Добавляем/обновляем пользователя в БД
+        await self.db.add_or_update_user(
+            message.from_user.id,
+            message.from_user.username,
+            message.from_user.first_name,
+            message.from_user.last_name
+        )
+
+        response, markup = self.begin_note_add(message.from_user.id)
+
+        await self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup if send_markup else None
+        )
+
+    async def handle_note_find1(self, message, search_text=None):
+        """Поиск заметок"""
+        if not self.db:
+            await self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
+            return
+        user_id = message.from_user.id
+        logger.info(f"NOTE_FIND начат: user_id={user_id}")
+
+        if search_text:
+            # Если поисковый запрос указан сразу
+            await self.perform_note_search(message, search_text)
+            return
+
+        # Запрашиваем поисковый запрос
+        response, markup = self.begin_note_find(user_id)
+
+        await self.bot.send_message(
+            message.chat.id,
+            response
+        )
+
+    async def handle_note_count1(self, message):
+        """Показать количество заметок"""
+        user_id = message.from_user.id
+        logger.info(f"NOTE_COUNT запрошен: user_id={user_id}")
+
+        stats = await self.db.get_note_stats(user_id)
+
+        await self.bot.send_message(
+            message.chat.id,
+            self.render_note_stats(stats)
+        )
+
+    async def handle_note_export1(self, message):
+        """Экспорт заметок в файл"""
+        user_id = message.from_user.id
+        logger.info(f"NOTE_EXPORT запрошен: user_id={user_id}")
+
+        total_count = await self.db.get_notes_count(user_id)
+
+        if not total_count:
+            await self.bot.send_message(
+                message.chat.id,
+                "📭 Нет заметок для экспорта."
+            )
+            return
+
+        # Чтение заметок и запись буфера целиком выполняются в пуле потоков БД
+        try:
+            export_file, filename, count = await self.db.run(
+                build_notes_export,
+                self.db.sync.iter_user_notes(user_id),
+                message.from_user.username,
+                compress=total_count >= self.EXPORT_COMPRESS_MIN_NOTES
+            )
+        except Exception as e:
+            logger.error(f"Ошибка создания файла экспорта: {e}")
+            await self.bot.send_message(
+                message.chat.id,
+                "❌ Ошибка при создании файла экспорта."
+            )
+            return
+
+        try:
+            # Отправляем файл пользователю
+            await self.bot.send_document(
+                message.chat.id,
+                export_file,
+                caption=f"📁 Экспорт заметок\nВсего заметок: {count}",
+                visible_file_name=filename
+            )
+
+            logger.info(f"NOTE_EXPORT выполнен: user_id={user_id}, notes={count}")
+
+        except Exception as e:
+            logger.error(f"Ошибка отправки файла: {e}")
+            await self.bot.send_message(
+                message.chat.id,
+                "❌ Ошибка при создании файла экспорта."
+            )
+        finally:
+            export_file.close()
+
+    async def handle_note_import1(self, message):
+        """Начало импорта заметок из файла"""
+        user_id = message.from_user.id
+        logger.info(f"NOTE_IMPORT начат: user_id={user_id}")
+
+        response, markup = self.begin_note_import(user_id)
+
+        await self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup
+        )
+
+    async def download_document(self, document):
+        """Загрузка документа во временный буфер порциями
+
+        Скачивание блокирующее, поэтому идет в пуле потоков по умолчанию,
+        чтобы не занимать потоки базы данных.
+        """
+        file_url = await self.bot.get_file_url(document.file_id)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.fetch_file, file_url)
+
+    async def perform_note_import(self, message):
+        """Импорт заметок из присланного файла"""
+        user_id = message.from_user.id
+        document = message.document
+
+        # Очищаем состояние
+        self.clear_state(user_id)
+
+        if self.is_too_large(document):
+            await self.bot.send_message(
+                message.chat.id,
+                self.render_too_large(),
+                reply_markup=types.ReplyKeyboardRemove()
+            )
+            return
+
+        await self.bot.send_message(
+            message.chat.id,
+            "⏳ Импортирую заметки...",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+
+        try:
+            upload = await self.download_document(document)
+        except Exception as e:
+            # Текст ошибки не логируем: в URL файла содержится токен бота
+            logger.error(f"Ошибка загрузки файла импорта: user_id={user_id}, {type(e).__name__}")
+            await self.bot.send_message(message.chat.id, "❌ Не удалось загрузить файл.")
+            return
+
+        # Разбор файла и запись порций выполняются в пуле потоков БД
+        try:
+            result = await self.db.run(import_notes, self.db.sync, user_id, upload, document.file_name)
+        except ImportFormatError as e:
+            logger.warning(f"NOTE_IMPORT: неверный формат файла, user_id={user_id}: {e}")
+            await self.bot.send_message(message.chat.id, self.render_import_error(e))
+            return
+        finally:
+            upload.close()
+
+        await self.bot.send_message(message.chat.id, self.render_import_result(result))
+
+        logger.info(f"NOTE_IMPORT выполнен: user_id={user_id}, {result}")
+
+    async def handle_notes_button(self, message):
+        """Обработка кнопки 'Заметки'"""
+        user_info = safe_log_user_info(
+            message.from_user.id,
+            message.from_user.username,
+            'button_notes',
+            message.text
+        )
+        bot_logger.info(f"BUTTON_NOTES: {user_info}")
+
+        await self.bot.send_message(
+            message.chat.id,
+            NOTES_MENU_TEXT,
+            reply_markup=self.create_main_notes_keyboard()
+        )
+
+    async def cancel_note_creation(self, message):
+        """Отмена создания заметки"""
+        self.clear_state(message.from_user.id)
+
+        await self.bot.send_message(
+            message.chat.id,
+            "❌ Создание заметки отменено."
+        )
+
+    async def cancel_operation(self, message):
+        """Отмена текущей операции"""
+        self.clear_state(message.from_user.id)
+
+        await self.bot.send_message(
+            message.chat.id,
+            "❌ Операция отменена."
+        )
+
+    async def perform_note_search(self, message, search_text):
+        """Выполнение поиска заметок"""
+        user_id = message.from_user.id
+
+        # Очищаем состояние
+        self.clear_state(user_id)
+
+        notes = await self.db.search_notes(user_id, search_text)
+
+        await self.bot.send_message(
+            message.chat.id,
+            self.render_search_results(search_text, notes)
+        )
+
+        logger.info(f"NOTE_SEARCH выполнен: user_id={user_id}, query='{search_text}', found={len(notes)}")
+
+    async def show_note_for_edit(self, message, note_id):
+        """Показать заметку для редактирования"""
+        user_id = message.from_user.id
+        note = await self.db.get_note_by_id(user_id, note_id)
+
+        if not note:
+            await self.bot.send_message(message.chat.id, self.render_note_not_found(note_id))
+            return
+
+        # Очищаем состояние
+        self.clear_state(user_id)
+
+        response, markup = self.render_note_for_edit(note_id, note)
+
+        await self.bot.send_message(
+            message.chat.id,
+            response
+        )
+
+    async def confirm_note_delete(self, message, note_id):
+        """Подтверждение удаления заметки"""
+        user_id = message.from_user.id
+        note = await self.db.get_note_by_id(user_id, note_id)
+
+        if not note:
+            await self.bot.send_message(message.chat.id, self.render_note_not_found(note_id))
+            return
+
+        # Очищаем состояние
+        self.clear_state(user_id)
+
+        response, markup = self.render_delete_confirm(note_id, note)
+
+        await self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup
+        )
+
+    async def handle_note_id_command(self, message, state, prompt, usage, action):
+        """/note_edit и /note_del: ID из аргумента команды или запрос ID"""
+        args = message.text.split()
+
+        if len(args) > 1:
+            # Если ID указан сразу
+            note_id = self.parse_note_id(args[1])
+            if note_id is None:
+                await self.bot.send_message(
+                    message.chat.id,
+                    f"❌ Неверный формат ID. Используйте: {usage} <ID_заметки>"
+                )
+                return
+            await action(message, note_id)
+        else:
+            # Запрашиваем ID
+            self.user_states[message.from_user.id] = state
+
+            await self.bot.send_message(message.chat.id, prompt)
+
+    async def handle_note_id_input(self, message, action):
+        """Обработка введенного ID для редактирования или удаления"""
+        if self.is_cancel(message.text):
+            await self.cancel_operation(message)
+            return
+
+        note_id = self.parse_note_id(message.text)
+        if note_id is None:
+            await self.bot.send_message(message.chat.id, INVALID_ID_TEXT)
+            return
+
+        await action(message, note_id)
+
+    def register_handlers(self):
+        """Регистрация обработчиков команд заметок"""
+
+        @self.router.command('note_add')
+        async def handle_note_add(message):
+            """Начало добавления заметки"""
+            await self.handle_note_add1(message, send_markup=False)
+
+        @self.router.command('note_list')
+        async def handle_note_list(message):
+            """Показ списка заметок"""
+            await self.handle_note_list1(message)
+
+        @self.router.command('note_find')
+        async def handle_note_find(message):
+            """Поиск заметок"""
+            await self.handle_note_find1(message, self.command_argument(message.text))
+
+        @self.router.command('note_edit')
+        async def handle_note_edit(message):
+            """Редактирование заметки"""
+            logger.info(f"NOTE_EDIT начат: user_id={message.from_user.id}")
+            await self.handle_note_id_command(
+                message, self.STATE_EDIT_NOTE_ID, NOTE_EDIT_PROMPT, '/note_edit', self.show_note_for_edit
+            )
+
+        @self.router.command('note_del')
+        async def handle_note_del(message):
+            """Удаление заметки"""
+            logger.info(f"NOTE_DEL начат: user_id={message.from_user.id}")
+            await self.handle_note_id_command(
+                message, self.STATE_DELETE_NOTE_ID, NOTE_DEL_PROMPT, '/note_del', self.confirm_note_delete
+            )
+
+        @self.router.command('note_count')
+        async def handle_note_count(message):
+            """Показать количество заметок"""
+            await self.handle_note_count1(message)
+
+        @self.router.command('note_export')
+        async def handle_note_export(message):
+            """Экспорт заметок в файл"""
+            await self.handle_note_export1(message)
+
+        @self.router.command('note_import')
+        async def handle_note_import(message):
+            """Импорт заметок из файла"""
+            await self.handle_note_import1(message)
+
+        @self.bot.message_handler(content_types=['document'], func=lambda message:
+        self.get_state(message.from_user.id) == self.STATE_IMPORT_NOTES or
+        (message.caption or '').startswith('/note_import'))
+        @timed_handler
+        async def handle_note_import_document(message):
+            """Обработка файла для импорта заметок"""
+            await self.perform_note_import(message)
+
+        @self.router.state(self.get_state, self.STATE_ADD_NOTE_TITLE)
+        async def handle_note_title_input(message):
+            """Обработка ввода заголовка заметки"""
+            if message.text == "❌ Отмена":
+                await self.cancel_note_creation(message)
+                return
+
+            response, markup = self.process_note_title(message.from_user.id, message.text)
+
+            await self.bot.send_message(
+                message.chat.id,
+                response,
+                reply_markup=markup
+            )
+
+        @self.router.state(self.get_state, self.STATE_ADD_NOTE_CONTENT)
+        async def handle_note_content_input(message):
+            """Обработка ввода содержания заметки"""
+            user_id = message.from_user.id
+            temp_data = self.user_states[user_id]['temp_data']
+
+            if message.text == "❌ Отмена":
+                await self.cancel_note_creation(message)
+                return
+
+            content, error = self.parse_note_content(message.text)
+            if error:
+                await self.bot.send_message(message.chat.id, error)
+                return
+
+            # Добавляем заметку в БД
+            note_id = await self.db.add_note(
+                user_id=user_id,
+                title=temp_data['title'],
+                content=content,
+                category=temp_data.get('category', 'general'),
+                tags=temp_data.get('tags')
+            )
+
+            if not note_id:
+                await self.bot.send_message(
+                    message.chat.id,
+                    "❌ Ошибка при сохранении заметки. Попробуйте снова."
+                )
+                return
+
+            # Очищаем состояние
+            self.clear_state(user_id)
+
+            response, markup = self.render_note_added(note_id, temp_data)
+
+            await self.bot.send_message(
+                message.chat.id,
+                "Отлично!",
+                reply_markup=types.ReplyKeyboardRemove()
+            )
+            await self.bot.send_message(
+                message.chat.id,
+                response,
+                reply_markup=markup
+            )
+
+            logger.info(f"NOTE_ADD завершен: user_id={user_id}, note_id={note_id}")
+
+        # Обработчики других состояний
+        @self.router.state(self.get_state, self.STATE_EDIT_NOTE_ID)
+        async def handle_edit_note_id_input(message):
+            """Обработка ввода ID для редактирования"""
+            await self.handle_note_id_input(message, self.show_note_for_edit)
+
+        @self.router.state(self.get_state, self.STATE_DELETE_NOTE_ID)
+        async def handle_delete_note_id_input(message):
+            """Обработка ввода ID для удаления"""
+            await self.handle_note_id_input(message, self.confirm_note_delete)
+
+        @self.router.state(self.get_state, self.STATE_IMPORT_NOTES)
+        async def handle_import_text_input(message):
+            """Текст вместо файла в режиме импорта"""
+            if self.is_cancel(message.text):
+                await self.cancel_operation(message)
+                return
+
+            await self.bot.send_message(
+                message.chat.id,
+                "📎 Отправьте файл с заметками (JSON, CSV или TXT) или введите 'отмена':"
+            )
+
+        @self.router.state(self.get_state, self.STATE_SEARCH_NOTES)
+        async def handle_search_input(message):
+            """Обработка поискового запроса"""
+            if message.text == "🔙 Назад к заметкам":
+                await self.cancel_operation(message)
+                await self.bot.send_message(
+                    message.chat.id,
+                    "Возвращаемся к списку заметок..."
+                )
+                await self.handle_note_list1(message)
+                return
+
+            if message.text == "❌ Отмена":
+                await self.cancel_operation(message)
+                return
+
+            await self.perform_note_search(message, message.text.strip())
+
+    def register_callbacks(self):
+        """Регистрация обработчиков callback-запросов для заметок"""
+        callbacks = self.callbacks
+
+        @callbacks.route('confirm_delete')
+        async def handle_confirm_delete(call, note_id):
+            """Подтверждение удаления"""
+            if await self.db.delete_note(call.from_user.id, int(note_id)):
+                await callbacks.answer(call, "Заметка удалена!")
+                await self.bot.edit_message_text(
+                    "✅ Заметка успешно удалена.",
+                    call.message.chat.id,
+                    call.message.message_id
+                )
+            else:
+                await callbacks.answer(call, "Ошибка удаления!")
+
+        @callbacks.route('cancel_delete')
+        async def handle_cancel_delete(call):
+            """Отмена удаления"""
+            await callbacks.answer(call, "Удаление отменено")
+            await self.bot.edit_message_text(
+                "❌ Удаление отменено.",
+                call.message.chat.id,
+                call.message.message_id
+            )
+
+        # Категория может содержать ':' - отделяем только направление и курсор
+        @callbacks.route('notes_page', maxsplit=2)
+        async def handle_notes_page(call, *args):
+            """Листание списка заметок: notes_page:<prev|next>:<курсор>[:<категория>]"""
+            response, markup = await self.build_notes_page(call.from_user.id, **self.parse_page_callback(*args))
+
+            if response is None:
+                await callbacks.answer(call, "📭 Больше заметок нет")
+                return
+
+            await callbacks.answer(call)
+            await self.bot.edit_message_text(
+                response,
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=markup
+            )
+
+        @callbacks.route('notes_list')
+        async def handle_notes_list(call):
+            """Показ списка заметок"""
+            await callbacks.answer(call)
+            await self.handle_notes_button(call.message)
+
+        @callbacks.route('notes_add_new')
+        async def handle_notes_add_new(call):
+            """Добавление новой заметки"""
+            await callbacks.answer(call)
+            await self.handle_note_add1(call.message)
+
+        @callbacks.route('notes_search')
+        async def handle_notes_search(call):
+            """Поиск заметок"""
+            await callbacks.answer(call)
+            await self.handle_note_find1(call.message)
+
+        @callbacks.route('notes_stats')
+        async def handle_notes_stats(call):
+            """Статистика"""
+            await callbacks.answer(call)
+            await self.handle_note_count1(call.message)
+
+        @callbacks.route('notes_export')
+        async def handle_notes_export(call):
+            """Экспорт заметок"""
+            await callbacks.answer(call, "📁 Создаю файл экспорта...")
+            await self.handle_note_export1(call.message)
+
+        @callbacks.family('edit_')
+        async def handle_edit_field(call, field, note_id):
+            """Редактирование определенного поля: edit_<поле>:<ID>"""
+            note_id = int(note_id)
+
+            await callbacks.answer(call, f"Редактирование: {field}")
+
+            await self.bot.send_message(
+                call.message.chat.id,
+                f"Для редактирования {field} "
+                f"заметки #{note_id} используйте команду:\n"
+                f"/note_edit {note_id}"
+            )
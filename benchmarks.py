@@ -0,0 +1,574 @@
+"""Бенчмарки производительности бота
+
+Запуск:
+    python benchmarks.py search --notes 100000
+    python benchmarks.py export --notes 50000
+    python benchmarks.py rows --rows 10000
+    python benchmarks.py bulk --notes 20000
+    python benchmarks.py runtime --users 200 --latency-ms 50
+    python benchmarks.py workers --chats 200 --latency-ms 20
+    python benchmarks.py router --messages 100000
+    python benchmarks.py metrics --calls 200000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from database import Database
+from message_router import MessageRouter, extract_command
+from metrics import MetricsRegistry, timed
+from note_model import note_row_factory
+from notes_import import IMPORT_CHUNK_SIZE
+from notes_export import build_notes_export
+
+# Слоги для синтетического словаря с распределением частот по Ципфу:
+# частые слова встречаются почти везде, редкие - в единицах заметок
+SYLLABLES = ['ра', 'бо', 'та', 'ве', 'ст', 'ре', 'ча', 'про', 'ект', 'ли',
+             'ко', 'ни', 'до', 'ме', 'ну', 'ка', 'зо', 'пы', 'ле', 'ви']
+VOCABULARY = [
+    ''.join(parts)
+    for parts in itertools.product(SYLLABLES, repeat=3)
+]
+_CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def _random_text(rng, words_count):
+    """Случайный текст из синтетического словаря"""
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=_CUM_WEIGHTS, k=words_count))
+
+
+def _fill_notes(db, user_id, count, seed=42):
+    """Быстрое заполнение базы заметками одного пользователя"""
+    rng = random.Random(seed)
+    rows = (
+        (user_id, i, _random_text(rng, 4).capitalize(), _random_text(rng, 40),
+         json.dumps(_random_text(rng, 2).split(), ensure_ascii=False))
+        for i in range(1, count + 1)
+    )
+    with db.get_connection() as conn:
+        conn.executemany(
+            'INSERT INTO notes (user_id, note_local_id, title, content, tags) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+        conn.execute(
+            'INSERT OR REPLACE INTO user_note_seq (user_id, last_local_id) VALUES (?, ?)',
+            (user_id, count)
+        )
+        conn.commit()
+
+
+def _timeit(func, repeat):
+    """Среднее время вызова в миллисекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench_search(notes, repeat, other_users, other_notes):
+    """Поиск: FTS5 против LIKE на notes заметках одного пользователя
+
+    У other_users других пользователей по other_notes заметок из того же
+    словаря: их совпадения не должны замедлять поиск по чужому индексу.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        print(f"Заполнение базы: {notes} заметок + {other_users} x {other_notes} у других пользователей...")
+        _fill_notes(db, user_id=1, count=notes)
+        for user_id in range(2, other_users + 2):
+            _fill_notes(db, user_id=user_id, count=other_notes, seed=user_id)
+
+        # Слова разной частоты: от очень частых до редких
+        queries = [VOCABULARY[rank] for rank in (50, 500, 3000, 7000)]
+        queries.append(f'{VOCABULARY[100]} {VOCABULARY[200]}')
+        print(f"{'запрос':<15}{'найдено':>10}{'LIKE, мс':>12}{'FTS5, мс':>12}")
+        for query in queries:
+            found = len(db.search_notes(1, query))
+            like_ms = _timeit(lambda: db._search_notes_like(1, query), repeat)
+            fts_ms = _timeit(lambda: db.search_notes(1, query), repeat)
+            print(f"{query:<15}{found:>10}{like_ms:>12.1f}{fts_ms:>12.1f}")
+
+        db.close()
+
+
+def bench_export(notes):
+    """Экспорт: пиковая память потокового экспорта против списка заметок"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), cache_enabled=False)
+        print(f"Заполнение базы: {notes} заметок...")
+        _fill_notes(db, user_id=1, count=notes)
+
+        print(f"{'вариант':<20}{'время, мс':>12}{'пик памяти, КБ':>18}")
+        for compress in (False, True):
+            tracemalloc.start()
+            start = time.perf_counter()
+            export_file, filename, _ = build_notes_export(db.iter_user_notes(1), compress=compress)
+            elapsed = (time.perf_counter() - start) * 1000
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            export_file.close()
+            print(f"{filename:<20}{elapsed:>12.1f}{peak // 1024:>18}")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        db.get_all_user_notes(1)
+        elapsed = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{'get_all_user_notes':<20}{elapsed:>12.1f}{peak // 1024:>18}")
+
+        db.close()
+
+
+def bench_rows(rows, repeat):
+    """Чтение строк: Note из фабрики строк против dict(sqlite3.Row) + 'id'"""
+    def as_dicts(cursor):
+        cursor.row_factory = sqlite3.Row
+        result = []
+        for note in cursor.fetchall():
+            note_dict = dict(note)
+            note_dict['id'] = note_dict['note_local_id']
+            result.append(note_dict)
+        return result
+
+    def as_notes(cursor):
+        cursor.row_factory = note_row_factory
+        return cursor.fetchall()
+
+    query = '''
+        SELECT user_id, note_local_id, title, content, tags, category,
+               created_at, updated_at
+        FROM notes WHERE user_id = ? ORDER BY note_local_id DESC
+    '''
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), cache_enabled=False)
+        print(f"Заполнение базы: {rows} заметок...")
+        _fill_notes(db, user_id=1, count=rows)
+
+        print(f"{'вариант':<12}{'время, мс':>12}{'память, КБ':>14}{'аллокаций':>12}")
+        with db.get_connection() as conn:
+            for name, build in (('dict', as_dicts), ('Note', as_notes)):
+                elapsed = _timeit(lambda: build(conn.execute(query, (1,))), repeat)
+
+                # Память, удерживаемая результатом: тексты заметок одинаковы
+                # в обоих вариантах, разница - в обертках строк
+                tracemalloc.start()
+                result = build(conn.execute(query, (1,)))
+                size, _ = tracemalloc.get_traced_memory()
+                blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+                tracemalloc.stop()
+                del result
+
+                print(f"{name:<12}{elapsed:>12.1f}{size // 1024:>14}{blocks:>12}")
+
+            # Декодирование тегов и дат, как это делают обработчики
+            dicts = as_dicts(conn.execute(query, (1,)))
+            notes = as_notes(conn.execute(query, (1,)))
+            dict_ms = _timeit(lambda: [
+                (json.loads(n['tags']) if n['tags'] else [], datetime.strptime(n['created_at'], '%Y-%m-%d %H:%M:%S'))
+                for n in dicts
+            ], 1)
+            note_ms = _timeit(lambda: [(n.tags, n.created_at) for n in notes], 1)
+            print(f"{'декодирование тегов и дат, мс':<30}{'dict':>6}{dict_ms:>8.1f}{'Note':>6}{note_ms:>8.1f}")
+
+        db.close()
+
+
+def bench_bulk(notes):
+    """Запись: add_note по одной заметке против add_notes_bulk порциями"""
+    rng = random.Random(42)
+    batch = [
+        {'title': _random_text(rng, 4).capitalize(), 'content': _random_text(rng, 40),
+         'tags': _random_text(rng, 2).split()}
+        for _ in range(notes)
+    ]
+
+    print(f"{'вариант':<20}{'заметок':>10}{'время, мс':>12}{'заметок/с':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), cache_enabled=False)
+
+        # По одной заметке - только на части данных, иначе слишком долго
+        single = batch[:min(notes, 2000)]
+        start = time.perf_counter()
+        for note in single:
+            db.add_note(1, note['title'], note['content'], note['tags'])
+        elapsed = time.perf_counter() - start
+        print(f"{'add_note':<20}{len(single):>10}{elapsed * 1000:>12.1f}{len(single) / elapsed:>12.0f}")
+
+        for chunk_size in (IMPORT_CHUNK_SIZE, notes):
+            start = time.perf_counter()
+            for i in range(0, notes, chunk_size):
+                db.add_notes_bulk(2, batch[i:i + chunk_size])
+            elapsed = time.perf_counter() - start
+            name = f"bulk по {chunk_size}"
+            print(f"{name:<20}{notes:>10}{elapsed * 1000:>12.1f}{notes / elapsed:>12.0f}")
+
+        db.close()
+
+
+class _BenchBot:
+    """Бот для бенчмарка рантаймов: send_message ждет latency секунд
+
+    Задержка имитирует запрос к Bot API, остальные методы бота
+    обработчикам списка, поиска и статистики не нужны.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    def send_message(self, chat_id, text, **kwargs):
+        time.sleep(self.latency)
+        self.sent += 1
+
+
+class _AsyncBenchBot(_BenchBot):
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+def _bench_message(user_id, text):
+    """Минимальное сообщение Telegram для вызова обработчика"""
+    user = SimpleNamespace(id=user_id, username=None, first_name=None, last_name=None)
+    return SimpleNamespace(from_user=user, chat=SimpleNamespace(id=user_id), text=text)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_runtime(users, notes, latency_ms, threads):
+    """Обработчики заметок: TeleBot с пулом потоков против AsyncTeleBot
+
+    Каждый пользователь одновременно запрашивает список, статистику и
+    поиск. Синхронные обработчики выполняются в пуле из threads потоков
+    (как рабочие потоки TeleBot), асинхронные - в одном цикле событий.
+    """
+    # Обработчики импортируются здесь: им нужны telebot и BOT_TOKEN
+    from async_database import AsyncDatabase
+    from async_notes_handler import AsyncNotesHandler
+    from notes_handler import NotesHandler
+
+    latency = latency_ms / 1000
+    requests_count = users * 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), cache_enabled=False)
+        for user_id in range(1, users + 1):
+            _fill_notes(db, user_id=user_id, count=notes, seed=user_id)
+        query = VOCABULARY[50]
+
+        def run_sync():
+            handler = NotesHandler(_BenchBot(latency), db)
+            timings = []
+
+            # Время считается от получения обновления, включая ожидание потока
+            def timed(start, func, message, *args):
+                func(message, *args)
+                timings.append(time.perf_counter() - start)
+
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                for user_id in range(1, users + 1):
+                    message = _bench_message(user_id, '/note_list')
+                    start = time.perf_counter()
+                    pool.submit(timed, start, handler.handle_note_list1, message)
+                    pool.submit(timed, start, handler.handle_note_count1, message)
+                    pool.submit(timed, start, handler.perform_note_search, message, query)
+            return timings
+
+        async def run_async():
+            adb = AsyncDatabase(db)
+            handler = AsyncNotesHandler(_AsyncBenchBot(latency), adb)
+            timings = []
+
+            async def timed(start, coroutine):
+                await coroutine
+                timings.append(time.perf_counter() - start)
+
+            tasks = []
+            for user_id in range(1, users + 1):
+                message = _bench_message(user_id, '/note_list')
+                start = time.perf_counter()
+                tasks.append(timed(start, handler.handle_note_list1(message)))
+                tasks.append(timed(start, handler.handle_note_count1(message)))
+                tasks.append(timed(start, handler.perform_note_search(message, query)))
+            await asyncio.gather(*tasks)
+            adb.executor.shutdown(wait=True)
+            return timings
+
+        print(f"{users} пользователей x 3 запроса, задержка Bot API {latency_ms} мс")
+        print(f"{'рантайм':<22}{'всего, с':>10}{'запр/с':>10}{'p50, мс':>10}{'p95, мс':>10}")
+        for name, run in ((f"потоки ({threads})", run_sync),
+                          ("asyncio", lambda: asyncio.run(run_async()))):
+            start = time.perf_counter()
+            timings = run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<22}{elapsed:>10.2f}{requests_count / elapsed:>10.0f}"
+                  f"{_percentile(timings, 0.5) * 1000:>10.1f}{_percentile(timings, 0.95) * 1000:>10.1f}")
+
+        db.close()
+
+
+def bench_workers(chats, messages, latency_ms):
+    """Пропускная способность ChatWorkerPool в зависимости от числа очередей
+
+    Задача имитирует обработчик: запись заметки и ответ Bot API с
+    задержкой latency_ms. Пока узкое место - ожидание сети, рост
+    линейный; упирается он в запись SQLite (один писатель).
+    """
+    # chat_workers импортирует telebot
+    from chat_workers import ChatWorkerPool
+
+    latency = latency_ms / 1000
+    tasks = chats * messages
+    print(f"{chats} чатов x {messages} сообщений, задержка Bot API {latency_ms} мс")
+    print(f"{'очередей':<10}{'время, с':>10}{'задач/с':>10}{'ожидание, мс':>14}{'макс. глубина':>15}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in (1, 2, 4, 8, 16):
+            db = Database(os.path.join(tmp, f'bench-{workers}.db'), cache_enabled=False)
+
+            def handler(chat_id, number):
+                db.add_note(chat_id, f"Заметка {number}", "текст")
+                time.sleep(latency)
+
+            pool = ChatWorkerPool(workers=workers, queue_size=tasks)
+            start = time.perf_counter()
+            for number in range(messages):
+                for chat_id in range(1, chats + 1):
+                    pool.submit(chat_id, handler, chat_id, number)
+            pool.close(timeout=600)
+            elapsed = time.perf_counter() - start
+
+            stats = pool.stats()
+            avg_wait = sum(q['avg_wait_ms'] * q['tasks'] for q in stats['queues']) / stats['tasks']
+            max_depth = max(q['max_depth'] for q in stats['queues'])
+            print(f"{workers:<10}{elapsed:>10.2f}{tasks / elapsed:>10.0f}{avg_wait:>14.1f}{max_depth:>15}")
+            db.close()
+
+
+def _linear_match(handlers, message):
+    """Выбор обработчика так, как это делает TeleBot: фильтры по порядку"""
+    for commands, func, handler in handlers:
+        if commands is not None and extract_command(message.text) not in commands:
+            continue
+        if func is not None and not func(message):
+            continue
+        return handler
+    return None
+
+
+def bench_router(messages):
+    """Стоимость выбора обработчика: цепочка лямбд против MessageRouter
+
+    Набор как в bot.py: 16 команд, состояние ввода заметок и эхо, N
+    reply-кнопок и обработчик по умолчанию. Сообщения - нажатия
+    случайных кнопок, команды и произвольный текст (доходит до fallback).
+    """
+    rng = random.Random(42)
+    user_states = {}
+    commands = [f'cmd{i}' for i in range(16)]
+    print(f"{messages} сообщений на замер, время выбора обработчика в мкс")
+    print(f"{'кнопок':<10}{'лямбды':>10}{'роутер':>10}{'ускорение':>12}")
+
+    for buttons_count in (10, 50, 200, 1000):
+        buttons = [f"Кнопка {i}" for i in range(buttons_count)]
+
+        # Порядок регистрации как в bot.py: команды, состояния, кнопки, fallback
+        handlers = [(['start'], None, 'start')]
+        handlers += [([command], None, command) for command in commands]
+        handlers.append((None, lambda m: user_states.get(m.from_user.id) == 'note', 'note'))
+        handlers += [(None, (lambda m, b=button: m.text == b), button) for button in buttons]
+        handlers.append((None, lambda m: user_states.get(m.from_user.id) == 'echo', 'echo'))
+        handlers.append((None, lambda m: True, 'other'))
+
+        router = MessageRouter()
+        router.command('start', *commands)(lambda m: None)
+        router.state(user_states.get, 'note')(lambda m: None)
+        router.state(user_states.get, 'echo', capture=False)(lambda m: None)
+        router.text(*buttons)(lambda m: None)
+        router.fallback(lambda m: None)
+
+        texts = buttons + ['/' + command for command in commands] + ['произвольный текст']
+        sample = [_bench_message(rng.randrange(100), rng.choice(texts)) for _ in range(messages)]
+
+        start = time.perf_counter()
+        for message in sample:
+            _linear_match(handlers, message)
+        linear = (time.perf_counter() - start) * 1e6 / messages
+
+        start = time.perf_counter()
+        for message in sample:
+            router.resolve(message)
+        routed = (time.perf_counter() - start) * 1e6 / messages
+
+        print(f"{buttons_count:<10}{linear:>10.2f}{routed:>10.2f}{linear / routed:>11.1f}x")
+
+
+def _per_call_ns(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) * 1e9 / calls
+
+
+def bench_metrics(calls, threads):
+    """Цена метрик на горячем пути: замер, обертка обработчика и метода Database
+
+    Сравнивается один и тот же вызов без метрик и с ними; для Database -
+    чтение заметки из кэша, самый быстрый метод, где доля метрик
+    наибольшая. Отдельно - замеры из нескольких потоков в одну метку и
+    время формирования /metrics.
+    """
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', "бенчмарк", ('name',))
+    counter = registry.counter('bench_total', "бенчмарк", ('name',))
+    child = histogram.labels('bench')
+
+    print(f"{calls} вызовов на замер, нс на вызов")
+    print(f"{'операция':<40}{'нс':>10}")
+    rows = [
+        ("пустой вызов", lambda: None),
+        ("histogram.observe", lambda: child.observe(0.001)),
+        ("histogram.labels(...).observe", lambda: histogram.labels('bench').observe(0.001)),
+        ("counter.labels(...).inc", lambda: counter.labels('bench').inc()),
+        ("timed(пустая функция)", timed(child)(lambda: None)),
+    ]
+    for name, func in rows:
+        print(f"{name:<40}{_per_call_ns(func, calls):>10.0f}")
+
+    # Обработчик через MessageRouter.dispatch: метрики против прямого вызова
+    router = MessageRouter()
+
+    @router.command('start')
+    def handle_start(message):
+        return None
+
+    message = _bench_message(1, '/start')
+    pairs = [(
+        "обработчик через dispatch",
+        lambda: router.resolve(message)(message),
+        lambda: router.dispatch(message),
+        calls
+    )]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        get_note = Database.get_note_by_id.__wrapped__
+        for cache_enabled, title in ((True, "get_note_by_id из кэша"), (False, "get_note_by_id из SQLite")):
+            db = Database(os.path.join(tmp, f'bench-metrics-{cache_enabled}.db'), cache_enabled=cache_enabled)
+            db.add_note(1, "Заметка", "текст")
+            pairs.append((
+                title,
+                lambda db=db: get_note(db, 1, 1),
+                lambda db=db: db.get_note_by_id(1, 1),
+                max(1, calls // 10)
+            ))
+
+        print()
+        print(f"{'вызов':<40}{'без, нс':>10}{'с, нс':>10}{'+нс':>8}{'+%':>8}")
+        for title, bare_func, timed_func, count in pairs:
+            bare = _per_call_ns(bare_func, count)
+            instrumented = _per_call_ns(timed_func, count)
+            print(f"{title:<40}{bare:>10.0f}{instrumented:>10.0f}"
+                  f"{instrumented - bare:>8.0f}{(instrumented - bare) / bare * 100:>7.1f}%")
+
+    print()
+
+    # Все потоки пишут в одну метку - худший случай для блокировки
+    per_thread = calls // threads
+
+    def observe_many():
+        for _ in range(per_thread):
+            child.observe(0.001)
+
+    workers = [threading.Thread(target=observe_many) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    contended = (time.perf_counter() - start) * 1e9 / (per_thread * threads)
+    print(f"{f'observe из {threads} потоков в одну метку':<40}{contended:>10.0f}")
+
+    # Объем как у бота: около 100 обработчиков и методов БД
+    for number in range(100):
+        histogram.labels(f'handler_{number}').observe(0.001)
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"/metrics для 100 меток: {(time.perf_counter() - start) * 1000:.2f} мс, {len(text) // 1024} КБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки бота")
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    search = subparsers.add_parser('search', help="FTS5 против LIKE")
+    search.add_argument('--notes', type=int, default=100_000)
+    search.add_argument('--repeat', type=int, default=5)
+    search.add_argument('--other-users', type=int, default=100)
+    search.add_argument('--other-notes', type=int, default=2000)
+
+    export = subparsers.add_parser('export', help="Пиковая память экспорта")
+    export.add_argument('--notes', type=int, default=50_000)
+
+    rows = subparsers.add_parser('rows', help="Note против словарей при чтении строк")
+    rows.add_argument('--rows', type=int, default=10_000)
+    rows.add_argument('--repeat', type=int, default=5)
+
+    bulk = subparsers.add_parser('bulk', help="Пакетная запись заметок")
+    bulk.add_argument('--notes', type=int, default=20_000)
+
+    runtime = subparsers.add_parser('runtime', help="TeleBot с потоками против AsyncTeleBot")
+    runtime.add_argument('--users', type=int, default=200)
+    runtime.add_argument('--notes', type=int, default=50, help="заметок на пользователя")
+    runtime.add_argument('--latency-ms', type=float, default=50, help="задержка ответа Bot API")
+    runtime.add_argument('--threads', type=int, default=2, help="потоков TeleBot (num_threads)")
+
+    workers = subparsers.add_parser('workers', help="Масштабирование пула обработчиков по чатам")
+    workers.add_argument('--chats', type=int, default=200)
+    workers.add_argument('--messages', type=int, default=5, help="сообщений на чат")
+    workers.add_argument('--latency-ms', type=float, default=20, help="задержка ответа Bot API")
+
+    router = subparsers.add_parser('router', help="Выбор обработчика: цепочка лямбд против таблицы маршрутов")
+    router.add_argument('--messages', type=int, default=100_000)
+
+    metrics = subparsers.add_parser('metrics', help="Цена метрик: замер, обработчик, метод Database")
+    metrics.add_argument('--calls', type=int, default=200_000)
+    metrics.add_argument('--threads', type=int, default=4)
+
+    args = parser.parse_args()
+
+    if args.bench == 'search':
+        bench_search(args.notes, args.repeat, args.other_users, args.other_notes)
+    elif args.bench == 'export':
+        bench_export(args.notes)
+    elif args.bench == 'rows':
+        bench_rows(args.rows, args.repeat)
+    elif args.bench == 'bulk':
+        bench_bulk(args.notes)
+    elif args.bench == 'runtime':
+        bench_runtime(args.users, args.notes, args.latency_ms, args.threads)
+    elif args.bench == 'workers':
+        bench_workers(args.chats, args.messages, args.latency_ms)
+    elif args.bench == 'router':
+        bench_router(args.messages)
+    elif args.bench == 'metrics':
+        bench_metrics(args.calls, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,35 @@
 import telebot
 from telebot import types
-import requests
 import time
 import logging  # Добавлен импорт модуля logging
-from datetime import datetime
-from database import Database
-from notes_handler import NotesHandler
+from notes_handler import NotesHandler, NOTES_MENU_TEXT
+from weather import (
+    get_weather_moscow, get_weather_city, get_weather_location,
+    weather_cache, weather_prefetcher, weather_batcher
+)
+from forecast import (
+    FORECAST_VARIANTS, parse_forecast_args, get_forecast_city, get_forecast_cell, forecast_cell,
+    forecast_cache, forecast_batcher
+)
+from webhook_server import WebhookServer, create_bot_dispatch
+from chat_workers import ChatWorkerPool, ChatOrderedTeleBot
+from message_router import MessageRouter, CallbackRouter
+from outbox import OutgoingScheduler, OutboxMixin
+from http_sessions import configure_telebot, open_meteo_session, telegram_session, connection_stats
+from open_meteo import open_meteo_client
+from metrics import registry, timed_handler, start_metrics_server
+from bot_common import (
+    WELCOME_TEXT, HELP_TEXT, ABOUT_TEXT, ECHO_INSTRUCTIONS, UNKNOWN_COMMAND_TEXT,
+    create_database, create_health_prober, build_ping_text, calculate_sum, build_echo_preview
+)
 # ИМПОРТ КЛАВИАТУР
 from keyboards import (
     create_main_keyboard,
     create_notes_keyboard,
     create_cancel_keyboard,
     create_echo_keyboard,
-    create_hide_keyboard
+    create_hide_keyboard,
+    create_forecast_keyboard
 )
 # ========== КОНФИГУРАЦИЯ ==========
 import os
@@ -21,7 +38,12 @@ from logging.handlers import RotatingFileHandler
 
 from config import (
     BOT_TOKEN, bot_logger, OPEN_METEO_URL, MOSCOW_COORDS,
-    safe_log_user_info
+    safe_log_user_info,
+    DB_NAME, DB_POOL_SIZE,
+    HANDLER_WORKERS, HANDLER_QUEUE_SIZE,
+    OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_SENDERS, OUTBOX_MAX_RETRIES,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN,
+    WEATHER_PREFETCH_ENABLED, METRICS_ENABLED, METRICS_HOST, METRICS_PORT
 )
 load_dotenv()
 
@@ -69,12 +91,48 @@ user_temp_data = {}
 # Константы для состояний пользователя
 STATE_ECHO = "waiting_echo"
 # ========== ИНИЦИАЛИЗАЦИЯ ==========
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None)
+# Все запросы к Bot API идут через одну сессию с пулом соединений
+configure_telebot()
+
+# Обновления обрабатываются в очередях по чатам: сообщения одного чата
+# строго по порядку, разные чаты - параллельно
+handler_pool = ChatWorkerPool(workers=HANDLER_WORKERS, queue_size=HANDLER_QUEUE_SIZE)
+
+# Исходящие сообщения уходят через очередь с лимитами Telegram:
+# обработчик ставит ответ в очередь и не ждет HTTP-запроса
+outbox = OutgoingScheduler(
+    global_rate=OUTBOX_GLOBAL_RATE,
+    chat_rate=OUTBOX_CHAT_RATE,
+    chat_burst=OUTBOX_CHAT_BURST,
+    senders=OUTBOX_SENDERS,
+    max_retries=OUTBOX_MAX_RETRIES
+)
+
+
+# Глубина очередей для метрик считается в момент чтения /metrics
+registry.gauge(
+    'bot_handler_queue_depth', "Обновления, ожидающие обработчика во всех очередях чатов"
+).set_function(lambda: sum(handler_pool.queue_depths()))
+registry.gauge('bot_outbox_depth', "Вызовы Bot API, ожидающие отправки").set_function(outbox.depth)
+
+
+class Bot(OutboxMixin, ChatOrderedTeleBot):
+    """Бот: обработка в очередях чатов, отправка через очередь с лимитами"""
+
+
+bot = Bot(BOT_TOKEN, handler_pool, outbox=outbox, parse_mode=None)
+
+# Таблицы маршрутов: команды, reply-кнопки и состояния; callback-запросы inline-кнопок
+router = MessageRouter()
+callbacks = CallbackRouter(bot)
 
 # Инициализация базы данных и обработчика заметок
-db = Database()
-notes_handler = NotesHandler(bot)
-notes_handler.set_database(db)
+db = create_database()
+
+# Фоновые проверки Open-Meteo, Bot API и базы - /ping читает их результаты
+health = create_health_prober(db)
+
+notes_handler = NotesHandler(bot, db, router, callbacks)
 
 # ========== РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ ЗАМЕТОК ==========
 notes_handler.register_handlers()
@@ -135,71 +193,9 @@ def safe_log_user_info(user_id, username=None, action=None, message_preview=None
 
 
 
-def get_weather_moscow():
-
-    """Получение текущей погоды в Москве через Open-Meteo API"""
-    try:
-        params = {
-            "latitude": MOSCOW_COORDS["latitude"],
-            "longitude": MOSCOW_COORDS["longitude"],
-            "current": ["temperature_2m", "weather_code", "wind_speed_10m", "relative_humidity_2m"],
-            "timezone": "Europe/Moscow"
-        }
-
-        response = requests.get(OPEN_METEO_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        current = data.get("current", {})
-        temperature = current.get("temperature_2m")
-        wind_speed = current.get("wind_speed_10m")
-        weather_code = current.get("weather_code")
-        humidity = current.get("relative_humidity_2m")
-
-        # Простая интерпретация кодов погоды
-        weather_descriptions = {
-            0: "ясно ☀️",
-            1: "в основном ясно 🌤",
-            2: "переменная облачность ⛅",
-            3: "пасмурно ☁️",
-            45: "туман 🌫",
-            48: "туман с инеем 🌫",
-            51: "легкая морось 🌧",
-            53: "умеренная морось 🌧",
-            55: "сильная морось 🌧",
-            61: "небольшой дождь 🌦",
-            63: "умеренный дождь 🌧",
-            65: "сильный дождь 🌧",
-            80: "ливни 🌧",
-            95: "гроза ⛈"
-        }
-
-        weather_desc = weather_descriptions.get(weather_code, "неизвестно")
-
-        if temperature is not None:
-            weather_text = (
-                f"🌤 Погода в Москве сейчас:\n"
-                f"• Температура: {temperature}°C\n"
-                f"• Состояние: {weather_desc}\n"
-                f"• Влажность: {humidity}%\n"
-                f"• Ветер: {wind_speed} км/ч"
-            )
-            bot_logger.info(f"Получены данные погоды: {temperature}°C, {weather_desc}")
-            return weather_text
-        else:
-            return "Не удалось получить данные о погоде. Попробуйте позже."
-
-    except requests.exceptions.RequestException as e:
-        bot_logger.error(f"Ошибка при запросе погоды: {str(e)[:100]}...")
-        return "Ошибка при получении данных о погоде. Сервис временно недоступен."
-    except Exception as e:
-        bot_logger.error(f"Неожиданная ошибка в get_weather_moscow: {str(e)[:100]}...")
-        return "Произошла непредвиденная ошибка."
-
-
-@bot.message_handler(commands=['weather'])
+@router.command('weather')
 def handle_weather(message):
-    """Обработка команды /weather - показывает погоду в Москве"""
+    """Обработка команды /weather [город] - по умолчанию погода в Москве"""
     user_info = safe_log_user_info(
         message.from_user.id,
         message.from_user.username,
@@ -208,8 +204,8 @@ def handle_weather(message):
     )
     bot_logger.info(f"WEATHER: {user_info}")
 
-    # Получаем погоду в Москве
-    weather_info = get_weather_moscow()
+    args = message.text.split(maxsplit=1)
+    weather_info = get_weather_city(args[1]) if len(args) > 1 else get_weather_moscow()
 
     # Отправляем пользователю
     bot.send_message(
@@ -233,6 +229,8 @@ def create_main_keyboard():
     ]
 
     keyboard.add(*buttons)
+    # Telegram сам отправит геопозицию пользователя сообщением
+    keyboard.add(types.KeyboardButton("📍 Погода рядом", request_location=True))
     return keyboard
 
 
@@ -252,7 +250,7 @@ def create_notes_keyboard():
     keyboard.add(*buttons)
     return keyboard
 
-@bot.message_handler(func=lambda message: message.text == "❌ Отмена")
+@router.text("❌ Отмена")
 def create_cancel_keyboard(message):
     """Обработка кнопки 'Отмена'"""
     keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -382,22 +380,11 @@ def handle_notes_main(message):
 
     bot.send_message(
         message.chat.id,
-        "📝 *Менеджер заметок*\n\n"
-        "Выберите действие:\n"
-        "• 📝 Новая заметка - добавить заметку\n"
-        "• 📋 Список заметок - просмотреть все\n"
-        "• 🔍 Поиск заметок - найти по тексту\n"
-        "• 📊 Статистика - количество заметок\n"
-        "• 📁 Экспорт заметок - скачать файл\n\n"
-        "Или используйте команды:\n"
-        "/note_add - добавить заметку\n"
-        "/note_list - список заметок\n"
-        "/note_find - поиск заметок\n"
-        "/note_count - статистика",
+        NOTES_MENU_TEXT,
         reply_markup=markup
 
     )
-@bot.message_handler(func=lambda message: message.text == "📝 Заметки")
+@router.text("📝 Заметки")
 def handle_notes_button(message):
     """Обработка кнопки 'Заметки'"""
     user_info = safe_log_user_info(
@@ -413,18 +400,7 @@ def handle_notes_button(message):
 
     bot.send_message(
         message.chat.id,
-        "📝 *Менеджер заметок*\n\n"
-        "Выберите действие:\n"
-        "• 📝 Новая заметка - добавить заметку\n"
-        "• 📋 Список заметок - просмотреть все\n"
-        "• 🔍 Поиск заметок - найти по тексту\n"
-        "• 📊 Статистика - количество заметок\n"
-        "• 📁 Экспорт заметок - скачать файл\n\n"
-        "Или используйте команды:\n"
-        "/note_add - добавить заметку\n"
-        "/note_list - список заметок\n"
-        "/note_find - поиск заметок\n"
-        "/note_count - статистика",
+        NOTES_MENU_TEXT,
         reply_markup=markup
 
     )
@@ -432,7 +408,7 @@ def handle_notes_button(message):
 
 # После обработчика handle_notes_button добавьте:
 
-@bot.message_handler(func=lambda message: message.text == "📝 Новая заметка")
+@router.text("📝 Новая заметка")
 def handle_new_note_button(message):
     """Обработка кнопки 'Новая заметка'"""
     user_info = safe_log_user_info(
@@ -452,7 +428,7 @@ def handle_new_note_button(message):
     # )
 
 
-@bot.message_handler(func=lambda message: message.text == "📋 Список заметок")
+@router.text("📋 Список заметок")
 def handle_list_notes_button(message):
     """Обработка кнопки 'Список заметок'"""
     user_info = safe_log_user_info(
@@ -467,7 +443,7 @@ def handle_list_notes_button(message):
     notes_handler.handle_note_list1(message)
 
 
-@bot.message_handler(func=lambda message: message.text == "🔍 Поиск заметок")
+@router.text("🔍 Поиск заметок")
 def handle_search_notes_button(message):
     """Обработка кнопки 'Поиск заметок'"""
     # user_info = safe_log_user_info(
@@ -486,7 +462,7 @@ def handle_search_notes_button(message):
     # )
 
 
-@bot.message_handler(func=lambda message: message.text == "📊 Статистика")
+@router.text("📊 Статистика")
 def handle_stats_button(message):
     """Обработка кнопки 'Статистика'"""
     user_info = safe_log_user_info(
@@ -500,7 +476,7 @@ def handle_stats_button(message):
     notes_handler.handle_note_count1(message)
 
 
-@bot.message_handler(func=lambda message: message.text == "📁 Экспорт заметок")
+@router.text("📁 Экспорт заметок")
 def handle_export_button(message):
     """Обработка кнопки 'Экспорт заметок'"""
     user_info = safe_log_user_info(
@@ -514,7 +490,7 @@ def handle_export_button(message):
     notes_handler.handle_note_export1(message)
 
 
-@bot.message_handler(func=lambda message: message.text == "🔙 Главное меню")
+@router.text("🔙 Главное меню")
 def handle_back_to_main_button(message):
     """Обработка кнопки 'Главное меню'"""
     user_info = safe_log_user_info(
@@ -531,7 +507,7 @@ def handle_back_to_main_button(message):
         reply_markup=create_main_keyboard()
     )
 # Обработчики команд
-@bot.message_handler(commands=['start'])
+@router.command('start')
 def handle_start(message):
     """Обработка команды /start"""
     user_info = safe_log_user_info(
@@ -542,32 +518,14 @@ def handle_start(message):
     )
     bot_logger.info(f"START: {user_info}")
 
-    welcome_text = (
-        "👋 *Привет! Я умный бот с заметками.*\n\n"
-        "*Основные возможности:*\n"
-        "• 📝 Система заметок с поиском и категориями\n"
-        "• 🌤 Погода в Москве в реальном времени\n"
-        "• 🔢 Математические вычисления\n"
-        "• 🔄 Эхо-команда с разными вариантами\n"
-        "• 📊 Логирование всех действий\n\n"
-        "*Команды заметок:*\n"
-        "/note_add - добавить заметку\n"
-        "/note_list - список заметок\n"
-        "/note_find - поиск по заметкам\n"
-        "/note_count - статистика\n\n"
-        "Для получения полного списка команд и возможностей\n"
-        "Воспользуйтесь командой /help\n"
-        "или используйте Используйте кнопки ниже ⬇️"
-    )
-
     bot.send_message(
         message.chat.id,
-        welcome_text,
+        WELCOME_TEXT,
         reply_markup = create_main_keyboard()
     )
 
 
-@bot.message_handler(commands=['echo'])
+@router.command('echo')
 def handle_echo(message):
     """Обработка команды /echo"""
     user_info = safe_log_user_info(
@@ -589,29 +547,17 @@ def handle_echo(message):
         # Если текст не передан, запрашиваем его
         user_states[message.from_user.id] = STATE_ECHO
 
-        echo_instructions = (
-            "📝 Команда Эхо\n\n"
-            "Отправьте мне текст, и я его повторю.\n"
-            "Вы можете:\n"
-            "• Отправить любой текст\n"
-            "• Использовать кнопки ниже для примеров\n"
-            "• Нажать 'Отменить эхо' для выхода\n\n"
-            "Что вы хотите, чтобы я повторил?"
-        )
+        # Текст прошлого эха больше не подтверждается
+        user_temp_data.pop(message.from_user.id, None)
 
         # Отправляем сообщение с inline-кнопками
-        msg = bot.send_message(
+        bot.send_message(
             message.chat.id,
-            echo_instructions
+            ECHO_INSTRUCTIONS
         )
 
-        # Сохраняем ID сообщения для возможного редактирования
-        user_temp_data[message.from_user.id] = {
-            'echo_message_id': msg.message_id
-        }
 
-
-@bot.message_handler(func=lambda message: message.text == "🪄 Эхо команда")
+@router.text("🪄 Эхо команда")
 def handle_echo_button(message):
     """Обработка кнопки 'Эхо команда'"""
     user_info = safe_log_user_info(
@@ -624,7 +570,7 @@ def handle_echo_button(message):
     handle_echo(message)
 
 
-@bot.message_handler(func=lambda message: message.text == "⬇️ Скрыть клавиатуру")
+@router.text("⬇️ Скрыть клавиатуру")
 def handle_hide_keyboard(message):
     """Обработка кнопки 'Скрыть клавиатуру'"""
     user_info = safe_log_user_info(
@@ -642,7 +588,7 @@ def handle_hide_keyboard(message):
         reply_markup=hide_markup)
 
 
-@bot.message_handler(func=lambda message: message.text == "Показать клавиатуру")
+@router.text("Показать клавиатуру")
 def handle_show_keyboard(message):
     """Обработка кнопки 'Показать клавиатуру'"""
     user_info = safe_log_user_info(
@@ -660,7 +606,7 @@ def handle_show_keyboard(message):
     )
 
 
-@bot.message_handler(func=lambda message: message.text == "Пример текста")
+@router.text("Пример текста")
 def handle_example_text(message):
     """Обработка кнопки 'Пример текста'"""
     user_info = safe_log_user_info(
@@ -674,19 +620,18 @@ def handle_example_text(message):
     example = "Это пример текста для команды эхо! Вы можете изменить его."
 
     # Отправляем пример с inline-кнопками
-    msg = bot.send_message(
+    bot.send_message(
         message.chat.id,
         f"📋 Пример:\n`{example}`\n\nХотите использовать этот текст?"
     )
 
     # Сохраняем пример для этого пользователя
     user_temp_data[message.from_user.id] = {
-        'echo_text': example,
-        'example_message_id': msg.message_id
+        'echo_text': example
     }
 
 
-@bot.message_handler(func=lambda message: message.text == "Отменить эхо")
+@router.text("Отменить эхо")
 def handle_cancel_echo(message):
     """Обработка кнопки 'Отменить эхо'"""
     user_info = safe_log_user_info(
@@ -725,28 +670,26 @@ def process_echo_text(message, text):
         del user_states[message.from_user.id]
 
     # Отправляем текст с inline-кнопками для выбора действия
-    msg = bot.send_message(
+    bot.send_message(
         message.chat.id,
-        f"📝 Ваш текст ({len(text)} символов):\n\n`{text[:100]}{'...' if len(text) > 100 else ''}`\n\nВыберите действие:"
+        build_echo_preview(text)
     )
 
-    # Сохраняем текст и ID сообщения
+    # Сохраняем текст для кнопок подтверждения
     user_temp_data[message.from_user.id] = {
-        'echo_text': text,
-        'options_message_id': msg.message_id
+        'echo_text': text
     }
 
 
 # Обработчик текстовых сообщений для состояния ECHO
-@bot.message_handler(func=lambda message:
-message.from_user.id in user_states and
-user_states[message.from_user.id] == STATE_ECHO)
+# Кнопки в этом состоянии продолжают работать (capture=False)
+@router.state(user_states.get, STATE_ECHO, capture=False)
 def handle_echo_state(message):
     """Обработка текста в состоянии ожидания эхо"""
     process_echo_text(message, message.text)
 
 
-@bot.message_handler(commands=['test_inline'])
+@router.command('test_inline')
 def test_inline_buttons(message):
     """Тестовая команда для проверки inline-кнопок"""
     bot_logger.info(f"TEST_INLINE: user_id={message.from_user.id}")
@@ -778,228 +721,221 @@ def test_inline_buttons(message):
         parse_mode='Markdown',
         reply_markup=markup
     )
-# Обработчик inline-кнопок
-@bot.callback_query_handler(func=lambda call: True)
-def handle_inline_buttons(call):
-    """Обработка нажатий inline-кнопок"""
-    user_info = safe_log_user_info(
-        call.from_user.id,
-        call.from_user.username,
-        'inline_button',
-        call.data
+# Обработчики inline-кнопок
+@callbacks.route('confirm_echo')
+def handle_confirm_echo(call, message_id=None):
+    """Подтверждение эхо"""
+    # Получаем сохраненный текст
+    user_data = user_temp_data.get(call.from_user.id, {})
+    echo_text = user_data.get('echo_text', '')
+
+    if echo_text:
+        # Отправляем подтвержденный текст
+        bot.send_message(
+            call.message.chat.id,
+            f"✅ Подтверждено!\n\n{echo_text}"
+        )
+
+        # Редактируем исходное сообщение
+        bot.edit_message_text(
+            "✅ Эхо подтверждено и отправлено!",
+            call.message.chat.id,
+            call.message.message_id
+        )
+
+        # Удаляем временные данные
+        user_temp_data.pop(call.from_user.id, None)
+
+
+@callbacks.route('cancel_echo')
+def handle_cancel_echo_callback(call, message_id=None):
+    """Отмена эхо"""
+    bot.edit_message_text(
+        "❌ Эхо отменено.",
+        call.message.chat.id,
+        call.message.message_id
     )
-    bot_logger.info(f"INLINE_BUTTON: {user_info}, data={call.data}")
-
-    # Разделяем callback_data на части
-    callback_parts = call.data.split(':')
-    callback_type = callback_parts[0]
-
-    if callback_type == "confirm_echo":
-        # Подтверждение эхо
-        if len(callback_parts) > 1:
-            message_id = callback_parts[1]
-
-            # Получаем сохраненный текст
-            user_data = user_temp_data.get(call.from_user.id, {})
-            echo_text = user_data.get('echo_text', '')
-
-            if echo_text:
-                # Отправляем подтвержденный текст
-                bot.send_message(
-                    call.message.chat.id,
-                    f"✅ Подтверждено!\n\n{echo_text}"
-                )
-
-                # Редактируем исходное сообщение
-                bot.edit_message_text(
-                    "✅ Эхо подтверждено и отправлено!",
-                    call.message.chat.id,
-                    call.message.message_id
-                )
-
-                # Удаляем временные данные
-                if call.from_user.id in user_temp_data:
-                    del user_temp_data[call.from_user.id]
-
-    elif callback_type == "cancel_echo":
-        # Отмена эхо
-        if len(callback_parts) > 1:
-            message_id = callback_parts[1]
-
-            bot.edit_message_text(
-                "❌ Эхо отменено.",
-                call.message.chat.id,
-                call.message.message_id
-            )
 
-            # Удаляем временные данные
-            if call.from_user.id in user_temp_data:
-                del user_temp_data[call.from_user.id]
+    # Удаляем временные данные
+    user_temp_data.pop(call.from_user.id, None)
 
-    elif callback_type == "confirm_general":
-        # Общее подтверждение
-        bot.answer_callback_query(call.id, "Действие подтверждено!")
 
-        # Получаем текст из сообщения
-        original_text = call.message.text
-        lines = original_text.split('\n')
-        if lines and '`' in lines[0]:
-            # Извлекаем текст из markdown
-            text_line = lines[0].strip('`')
-            bot.send_message(
-                call.message.chat.id,
-                f"✅ {text_line}"
-            )
+@callbacks.route('confirm_general')
+def handle_confirm_general(call):
+    """Общее подтверждение"""
+    callbacks.answer(call, "Действие подтверждено!")
 
-    elif callback_type == "cancel_general":
-        # Общая отмена
-        bot.answer_callback_query(call.id, "Действие отменено!")
-        bot.edit_message_text(
-            "❌ Действие отменено пользователем.",
+    # Получаем текст из сообщения
+    original_text = call.message.text
+    lines = original_text.split('\n')
+    if lines and '`' in lines[0]:
+        # Извлекаем текст из markdown
+        text_line = lines[0].strip('`')
+        bot.send_message(
             call.message.chat.id,
-            call.message.message_id
+            f"✅ {text_line}"
         )
 
-    elif callback_type == "edit_echo":
-        # Редактирование текста
-        bot.answer_callback_query(call.id, "Введите новый текст...")
 
-        # Устанавливаем состояние редактирования
-        user_states[call.from_user.id] = STATE_ECHO
+@callbacks.route('cancel_general')
+def handle_cancel_general(call):
+    """Общая отмена"""
+    callbacks.answer(call, "Действие отменено!")
+    bot.edit_message_text(
+        "❌ Действие отменено пользователем.",
+        call.message.chat.id,
+        call.message.message_id
+    )
 
-        bot.send_message(
+
+@callbacks.route('edit_echo')
+def handle_edit_echo(call):
+    """Редактирование текста"""
+    callbacks.answer(call, "Введите новый текст...")
+
+    # Устанавливаем состояние редактирования
+    user_states[call.from_user.id] = STATE_ECHO
+
+    bot.send_message(
+        call.message.chat.id,
+        "✏️ Введите новый текст для эхо:"
+    )
+
+
+@callbacks.route('preview_echo')
+def handle_preview_echo(call):
+    """Показать предпросмотр"""
+    user_data = user_temp_data.get(call.from_user.id, {})
+    echo_text = user_data.get('echo_text', '')
+
+    if echo_text:
+        preview = echo_text[:200] + ("..." if len(echo_text) > 200 else "")
+        callbacks.answer(
+            call,
+            f"Предпросмотр: {preview}",
+            show_alert=True
+        )
+    else:
+        callbacks.answer(call, "Текст не найден")
+
+
+# Варианты преобразования текста для кнопок echo_<вариант>
+ECHO_VARIANTS = {
+    'as_is': lambda text: text,
+    'upper': str.upper,
+    'lower': str.lower,
+    'capitalize': str.capitalize,
+    'reverse': lambda text: text[::-1],
+}
+
+
+@callbacks.family('echo_')
+def handle_echo_variant(call, echo_variant):
+    """Обработка вариантов эхо"""
+    user_data = user_temp_data.get(call.from_user.id, {})
+    original_text = user_data.get('echo_text', '')
+
+    if not original_text:
+        return
+
+    if echo_variant == "cancel":
+        bot.edit_message_text(
+            "❌ Эхо отменено.",
             call.message.chat.id,
-            "✏️ Введите новый текст для эхо:"
+            call.message.message_id
         )
+        return
+
+    transform = ECHO_VARIANTS.get(echo_variant)
+    if transform is None:
+        callbacks.answer(call, "❌ Действие не распознано")
+        return
 
-    elif callback_type == "preview_echo":
-        # Показать предпросмотр
-        user_data = user_temp_data.get(call.from_user.id, {})
-        echo_text = user_data.get('echo_text', '')
-
-        if echo_text:
-            preview = echo_text[:200] + ("..." if len(echo_text) > 200 else "")
-            bot.answer_callback_query(
-                call.id,
-                f"Предпросмотр: {preview}",
-                show_alert=True
+    # Отправляем результат
+    bot.send_message(
+        call.message.chat.id,
+        f"🔤 Результат ({echo_variant}):\n\n{transform(original_text)}"
+    )
+
+    # Редактируем исходное сообщение
+    bot.edit_message_text(
+        f"✅ Эхо выполнено! Вариант: {echo_variant}",
+        call.message.chat.id,
+        call.message.message_id
+    )
+
+    # Удаляем временные данные
+    user_temp_data.pop(call.from_user.id, None)
+
+
+@callbacks.family('action_')
+def handle_text_action(call, action):
+    """Обработка действий"""
+    user_data = user_temp_data.get(call.from_user.id, {})
+    original_text = user_data.get('echo_text', '')
+
+    if original_text:
+        if action == "stats":
+            # Статистика
+            stats_text = (
+                f"📊 Статистика текста:\n"
+                f"• Символов: {len(original_text)}\n"
+                f"• Слов: {len(original_text.split())}\n"
+                f"• Строк: {len(original_text.splitlines())}\n"
+                f"• Уникальных символов: {len(set(original_text))}"
             )
-        else:
-            bot.answer_callback_query(call.id, "Текст не найден")
-
-    elif callback_type.startswith("echo_"):
-        # Обработка вариантов эхо
-        echo_variant = callback_type.replace("echo_", "")
-        user_data = user_temp_data.get(call.from_user.id, {})
-        original_text = user_data.get('echo_text', '')
-
-        if original_text:
-            # Применяем преобразование
-            if echo_variant == "as_is":
-                result = original_text
-            elif echo_variant == "upper":
-                result = original_text.upper()
-            elif echo_variant == "lower":
-                result = original_text.lower()
-            elif echo_variant == "capitalize":
-                result = original_text.capitalize()
-            elif echo_variant == "reverse":
-                result = original_text[::-1]
-            elif echo_variant == "cancel":
-                bot.edit_message_text(
-                    "❌ Эхо отменено.",
-                    call.message.chat.id,
-                    call.message.message_id
-                )
-                return
-
-            # Отправляем результат
+            bot.send_message(call.message.chat.id, stats_text)
+
+        elif action == "repeat":
+            # Повторить
+            bot.send_message(call.message.chat.id, f"🔄 {original_text}")
+
+        elif action == "trim":
+            # Обрезать пробелы
+            trimmed = original_text.strip()
+            bot.send_message(call.message.chat.id, f"✂️ Обрезано:\n{trimmed}")
+
+        elif action == "count":
+            # Посчитать слова
+            words = original_text.split()
+            word_count = len(words)
+            unique_words = len(set(words))
             bot.send_message(
                 call.message.chat.id,
-                f"🔤 Результат ({echo_variant}):\n\n{result}"
-            )
-
-            # Редактируем исходное сообщение
-            bot.edit_message_text(
-                f"✅ Эхо выполнено! Вариант: {echo_variant}",
-                call.message.chat.id,
-                call.message.message_id
+                f"🔢 Слов: {word_count}\nУникальных слов: {unique_words}"
             )
 
-            # Удаляем временные данные
-            if call.from_user.id in user_temp_data:
-                del user_temp_data[call.from_user.id]
-
-        bot.answer_callback_query(call.id)
-
-    elif callback_type.startswith("action_"):
-        # Обработка действий
-        action = callback_type.replace("action_", "")
-        user_data = user_temp_data.get(call.from_user.id, {})
-        original_text = user_data.get('echo_text', '')
-
-        if original_text:
-            if action == "stats":
-                # Статистика
-                stats_text = (
-                    f"📊 Статистика текста:\n"
-                    f"• Символов: {len(original_text)}\n"
-                    f"• Слов: {len(original_text.split())}\n"
-                    f"• Строк: {len(original_text.splitlines())}\n"
-                    f"• Уникальных символов: {len(set(original_text))}"
-                )
-                bot.send_message(call.message.chat.id, stats_text)
-
-            elif action == "repeat":
-                # Повторить
-                bot.send_message(call.message.chat.id, f"🔄 {original_text}")
-
-            elif action == "trim":
-                # Обрезать пробелы
-                trimmed = original_text.strip()
-                bot.send_message(call.message.chat.id, f"✂️ Обрезано:\n{trimmed}")
-
-            elif action == "count":
-                # Посчитать слова
-                words = original_text.split()
-                word_count = len(words)
-                unique_words = len(set(words))
-                bot.send_message(
-                    call.message.chat.id,
-                    f"🔢 Слов: {word_count}\nУникальных слов: {unique_words}"
-                )
-
-            elif action == "find_duplicates":
-                # Найти повторяющиеся слова
-                words = original_text.lower().split()
-                word_counts = {}
-                for word in words:
-                    if len(word) > 2:  # Игнорируем короткие слова
-                        word_counts[word] = word_counts.get(word, 0) + 1
-
-                duplicates = {k: v for k, v in word_counts.items() if v > 1}
-                if duplicates:
-                    dup_text = "\n".join([f"• {k}: {v} раз" for k, v in duplicates.items()][:5])
-                    bot.send_message(call.message.chat.id, f"🔍 Повторяющиеся слова:\n{dup_text}")
-                else:
-                    bot.send_message(call.message.chat.id, "✅ Повторяющихся слов не найдено")
-
-            elif action == "random":
-                # Случайный вариант
-                import random
-                words = original_text.split()
-                if len(words) > 1:
-                    random.shuffle(words)
-                    result = " ".join(words)
-                    bot.send_message(call.message.chat.id, f"🎲 Перемешано:\n{result}")
-                else:
-                    bot.send_message(call.message.chat.id, "❌ Недостаточно слов для перемешивания")
-
-        bot.answer_callback_query(call.id)
-
-@bot.message_handler(commands=['ping'])
+        elif action == "find_duplicates":
+            # Найти повторяющиеся слова
+            words = original_text.lower().split()
+            word_counts = {}
+            for word in words:
+                if len(word) > 2:  # Игнорируем короткие слова
+                    word_counts[word] = word_counts.get(word, 0) + 1
+
+            duplicates = {k: v for k, v in word_counts.items() if v > 1}
+            if duplicates:
+                dup_text = "\n".join([f"• {k}: {v} раз" for k, v in duplicates.items()][:5])
+                bot.send_message(call.message.chat.id, f"🔍 Повторяющиеся слова:\n{dup_text}")
+            else:
+                bot.send_message(call.message.chat.id, "✅ Повторяющихся слов не найдено")
+
+        elif action == "random":
+            # Случайный вариант
+            import random
+            words = original_text.split()
+            if len(words) > 1:
+                random.shuffle(words)
+                result = " ".join(words)
+                bot.send_message(call.message.chat.id, f"🎲 Перемешано:\n{result}")
+            else:
+                bot.send_message(call.message.chat.id, "❌ Недостаточно слов для перемешивания")
+
+
+@router.command('ping')
 def handle_ping(message):
     """Обработка команды /ping - проверка работоспособности"""
+    start_time = time.perf_counter()
     user_info = safe_log_user_info(
         message.from_user.id,
         message.from_user.username,
@@ -1008,27 +944,18 @@ def handle_ping(message):
     )
     bot_logger.info(f"PING: {user_info}")
 
-    # Измеряем время ответа
-    start_time = time.time()
-
-    # Проверяем доступность API погоды
-    api_status = "доступно ✅" if test_api_connection() else "недоступно ❌"
-
-    response_time = round((time.time() - start_time) * 1000, 2)
-
-    ping_text = (
-        "🏓 Pong!\n\n"
-        f"• Время ответа: {response_time} мс\n"
-        f"• API погоды: {api_status}\n"
-        f"• Бот запущен: {get_bot_uptime()}\n"
-        f"• Текущее время: {datetime.now().strftime('%H:%M:%S')}"
-    )
+    # Внешние сервисы не опрашиваются: состояние - из фоновых проверок
+    queues = {
+        'обработчиков': sum(handler_pool.queue_depths()),
+        'отправки': outbox.depth(),
+    }
+    handling_us = (time.perf_counter() - start_time) * 1_000_000
 
-    bot.send_message(message.chat.id, ping_text)
+    bot.send_message(message.chat.id, build_ping_text(handling_us, health.results(), queues))
 
 
 
-@bot.message_handler(commands=['help'])
+@router.command('help')
 def handle_help(message):
     """Обработка команды /help"""
     user_info = safe_log_user_info(
@@ -1039,37 +966,10 @@ def handle_help(message):
     )
     bot_logger.info(f"HELP: {user_info}")
 
-    help_text = (
-        "📖 Справка по использованию бота:\n\n"
-        "Команды:\n"
-        "• /start - начало работы с ботом\n"
-        "• /help - эта справка\n"
-        "• /about - информация о боте\n"
-        "• /ping - проверка работоспособности\n"
-        "• /weather - Актуальная погода\n"
-        "• /echo - повторяет ваш текст с разными вариантами\n"
-        "• /sum X Y Z - вычисляет сумму чисел\n"
-        "   Пример: /sum 5 10 15\n\n"
-        "*Команды заметок:*\n"
-        "• /note_add - добавить заметку\n"
-        "• /note_list - список всех заметок\n"
-        "• /note_find - найти заметку по словам\n"
-        "• /note_edit - редактор заметок\n"
-        "• /note_del - удалить заметку\n"
-        "• /note_count - сколько всего заметок\n"
-        "• /note_export - скачать файл с заметками\n\n"
-        "Кнопки:\n"
-        "• О боте - информация о боте\n"
-        "• Погода Москва - текущая погода\n"
-        "• Помощь - эта справка\n"
-        "• Эхо команда - запуск команды эхо\n"  # Добавлено
-        "• Скрыть клавиатуру - скрыть reply-клавиатуру"
-    )
-
-    bot.send_message(message.chat.id, help_text)
+    bot.send_message(message.chat.id, HELP_TEXT)
 
 
-@bot.message_handler(commands=['about'])
+@router.command('about')
 def handle_about(message):
     """Обработка команды /about"""
     user_info = safe_log_user_info(
@@ -1080,20 +980,10 @@ def handle_about(message):
     )
     bot_logger.info(f"ABOUT: {user_info}")
 
-    about_text = (
-        "🤖 Информация о боте\n\n"
-        "Это демонстрационный бот, созданный с использованием:\n"
-        "• pyTelegramBotAPI (TeleBot)\n"
-        "• Open-Meteo API для данных о погоде\n"
-        "• Long Polling для получения обновлений\n\n"
-        "Бот предназначен для обучения и демонстрации возможностей.\n\n"
-        "📊 Логирование: все действия записываются в файл logs/bot.log"
-    )
-
-    bot.send_message(message.chat.id, about_text)
+    bot.send_message(message.chat.id, ABOUT_TEXT)
 
 
-@bot.message_handler(commands=['sum'])
+@router.command('sum')
 def handle_sum(message):
     """Обработка команды /sum - вычисление суммы чисел"""
     user_info = safe_log_user_info(
@@ -1118,12 +1008,7 @@ def handle_sum(message):
             return
 
         # Преобразуем аргументы в целые числа
-        numbers = [int(arg) for arg in args]
-        total = sum(numbers)
-
-        # Формируем красивый ответ
-        numbers_str = " + ".join(map(str, numbers))
-        result_text = f"🔢 Результат: {numbers_str} = {total}"
+        numbers, total, result_text = calculate_sum(args)
 
         bot_logger.info(f"SUM_CALCULATED: {user_info}, numbers={numbers}, total={total}")
         bot.send_message(message.chat.id, result_text)
@@ -1141,7 +1026,7 @@ def handle_sum(message):
 
 
 # Обработчики текстовых сообщений (reply-кнопки)
-@bot.message_handler(func=lambda message: message.text == "❓ О боте")
+@router.text("❓ О боте")
 def handle_about_button(message):
     """Обработка кнопки 'О боте'"""
     user_info = safe_log_user_info(
@@ -1154,7 +1039,7 @@ def handle_about_button(message):
     handle_about(message)
 
 
-@bot.message_handler(func=lambda message: message.text == "☀️ Погода Москва")
+@router.text("☀️ Погода Москва")
 def handle_weather_button(message):
     """Обработка кнопки 'Погода Москва'"""
     user_info = safe_log_user_info(
@@ -1170,7 +1055,62 @@ def handle_weather_button(message):
     bot.send_message(message.chat.id, weather_info)
 
 
-@bot.message_handler(func=lambda message: message.text == "🤝 Помощь")
+@bot.message_handler(content_types=['location'])
+@timed_handler
+def handle_location(message):
+    """Погода в присланной геопозиции (кнопка 'Погода рядом' или вложение)"""
+    user_info = safe_log_user_info(
+        message.from_user.id,
+        message.from_user.username,
+        'weather_location'
+    )
+    bot_logger.info(f"WEATHER_LOCATION: {user_info}")
+
+    latitude, longitude = message.location.latitude, message.location.longitude
+    weather_info = get_weather_location(latitude, longitude)
+    bot.send_message(
+        message.chat.id,
+        weather_info,
+        reply_markup=create_forecast_keyboard(*forecast_cell(latitude, longitude))
+    )
+
+
+@router.command('forecast')
+def handle_forecast(message):
+    """Обработка команды /forecast [завтра|неделя] [город] - прогноз погоды"""
+    user_info = safe_log_user_info(
+        message.from_user.id,
+        message.from_user.username,
+        'forecast',
+        message.text
+    )
+    bot_logger.info(f"FORECAST: {user_info}")
+
+    variant, city = parse_forecast_args(message.text)
+    forecast_text, cell = get_forecast_city(city or "Москва", variant)
+    bot.send_message(
+        message.chat.id,
+        forecast_text,
+        reply_markup=create_forecast_keyboard(*cell, variant) if cell else None
+    )
+
+
+@callbacks.route('forecast')
+def handle_forecast_variant(call, variant, latitude, longitude, shown=None):
+    """Переключение варианта прогноза кнопками под сообщением"""
+    if shown or variant not in FORECAST_VARIANTS:
+        return
+
+    latitude, longitude = float(latitude), float(longitude)
+    bot.edit_message_text(
+        get_forecast_cell(latitude, longitude, variant),
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=create_forecast_keyboard(latitude, longitude, variant)
+    )
+
+
+@router.text("🤝 Помощь")
 def handle_help_button(message):
     """Обработка кнопки 'Помощь'"""
     user_info = safe_log_user_info(
@@ -1190,21 +1130,8 @@ def handle_help_button(message):
 # def handle_note_add_command(message):
 #     notes_handler.register_handlers()
 
-@bot.message_handler(commands=['note_list'])
-def handle_note_list_command(message):
-    notes_handler.handle_note_list(message)
-
-@bot.message_handler(commands=['note_find'])
-def handle_note_find_command(message):
-    notes_handler.handle_note_find(message)
-
-@bot.message_handler(commands=['note_count'])
-def handle_note_count_command(message):
-    notes_handler.handle_note_count(message)
-
-@bot.message_handler(commands=['note_export'])
-def handle_note_export_command(message):
-    notes_handler.handle_note_export(message)
+# Команды /note_list, /note_find, /note_count, /note_export регистрирует
+# notes_handler.register_handlers()
 
 # Регистрируем reply-кнопки заметок
 # @bot.message_handler(func=lambda message: message.text == "📝 Новая заметка")
@@ -1234,7 +1161,7 @@ def handle_note_export_command(message):
 # @bot.message_handler(func=lambda message: message.text == "🔙 Главное меню")
 # def handle_back_to_main_button(message):
 #     notes_handler.handle_back_to_main(message)
-@bot.message_handler(func=lambda message: True)
+@router.fallback
 def handle_other_messages(message):
     """Обработка всех остальных сообщений"""
     user_info = safe_log_user_info(
@@ -1245,49 +1172,42 @@ def handle_other_messages(message):
     )
     bot_logger.info(f"UNKNOWN_COMMAND: {user_info}")
 
-    response = (
-        "Я не понимаю эту команду. 😕\n\n"
-        "Используйте команды из меню или кнопки ниже.\n"
-        "Для справки нажмите /help"
-    )
     bot.send_message(
         message.chat.id,
-        response
+        UNKNOWN_COMMAND_TEXT
+    )
+
+
+# Все текстовые сообщения и callback-запросы идут через таблицы маршрутов
+router.install(bot)
+callbacks.install()
+
+
+def run_webhook():
+    """Прием обновлений через webhook вместо long polling"""
+    server = WebhookServer(
+        create_bot_dispatch(bot),
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET_TOKEN or None
     )
 
+    # Без публичного адреса webhook не регистрируется - локальная проверка
+    if WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET_TOKEN or None
+        )
+        bot_logger.info(f"Webhook зарегистрирован: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
 
-# Вспомогательные функции
-def test_api_connection():
-    """Проверка доступности Open-Meteo API"""
+    bot_logger.info(f"Запуск webhook-сервера на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}...")
     try:
-        params = {
-            "latitude": MOSCOW_COORDS["latitude"],
-            "longitude": MOSCOW_COORDS["longitude"],
-            "current": "temperature_2m"
-        }
-        response = requests.get(OPEN_METEO_URL, params=params, timeout=5)
-        return response.status_code == 200
-    except:
-        return False
-
-
-# Переменная для отслеживания времени запуска
-_start_time = datetime.now()
-
-
-def get_bot_uptime():
-    """Получение времени работы бота"""
-    uptime = datetime.now() - _start_time
-    days = uptime.days
-    hours, remainder = divmod(uptime.seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-
-    if days > 0:
-        return f"{days}д {hours}ч {minutes}м"
-    elif hours > 0:
-        return f"{hours}ч {minutes}м {seconds}с"
-    else:
-        return f"{minutes}м {seconds}с"
+        server.serve_forever()
+    finally:
+        server.server_close()
+        bot_logger.info(f"Статистика webhook: {server.get_stats()}")
 
 
 def main():
@@ -1295,7 +1215,7 @@ def main():
     bot_logger.info("=" * 50)
     bot_logger.info("Запуск телеграм-бота...")
 
-
+    metrics_server = None
     try:
         # Получаем информацию о боте для логирования
         bot_info = bot.get_me()
@@ -1303,16 +1223,25 @@ def main():
         bot_logger.info(f"Имя бота: {bot_info.first_name}")
         bot_logger.info(f"ID бота: {bot_info.id}")
         bot_logger.info(f"Логирование: файл logs/bot.log")
-        bot_logger.info(f"База данных: notes.db")
+        bot_logger.info(f"База данных: {DB_NAME} (пул соединений: {DB_POOL_SIZE})")
 
+        if WEATHER_PREFETCH_ENABLED:
+            weather_prefetcher.start()
+        health.start()
+        if METRICS_ENABLED:
+            metrics_server = start_metrics_server(METRICS_HOST, METRICS_PORT)
 
-        # Запуск long polling
-        bot_logger.info("Запуск Long Polling...")
-        bot.infinity_polling(
-            timeout=60,
-            long_polling_timeout=60,
-            logger_level=logging.INFO  # Теперь logging доступен
-        )
+        if BOT_MODE == 'webhook':
+            run_webhook()
+        else:
+            # Запуск long polling
+            bot_logger.info("Запуск Long Polling...")
+            bot.remove_webhook()
+            bot.infinity_polling(
+                timeout=60,
+                long_polling_timeout=60,
+                logger_level=logging.INFO  # Теперь logging доступен
+            )
 
     except telebot.apihelper.ApiException as e:
         bot_logger.error(f"Ошибка API Telegram: {str(e)[:200]}")
@@ -1321,6 +1250,30 @@ def main():
     except Exception as e:
         bot_logger.error(f"Неожиданная ошибка при запуске: {str(e)[:200]}")
     finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        handler_pool.close()
+        outbox.close()
+        bot_logger.info(f"Соединения Bot API: {connection_stats(telegram_session())}")
+        bot_logger.info(f"Соединения Open-Meteo: {connection_stats(open_meteo_session)}")
+        bot_logger.info(f"Клиент Open-Meteo: {open_meteo_client.stats()}")
+        health.stop()
+        bot_logger.info(f"Фоновые проверки: {health.stats()}")
+        weather_prefetcher.stop()
+        bot_logger.info(f"Фоновое обновление погоды: {weather_prefetcher.stats()}")
+        bot_logger.info(f"Статистика кэша погоды: {weather_cache.stats()}")
+        bot_logger.info(f"Пакетные запросы погоды: {weather_batcher.stats()}")
+        bot_logger.info(f"Статистика кэша прогнозов: {forecast_cache.stats()}")
+        bot_logger.info(f"Пакетные запросы прогнозов: {forecast_batcher.stats()}")
+        forecast_cache.close()
+        weather_cache.close()
+        bot_logger.info(f"Статистика callback-запросов: {callbacks.stats()}")
+        bot_logger.info(f"Статистика пула БД: {db.get_pool_stats()}")
+        if db.get_cache_stats() is not None:
+            bot_logger.info(f"Статистика кэша заметок: {db.get_cache_stats()}")
+        if db.get_writer_stats() is not None:
+            bot_logger.info(f"Статистика потока записи БД: {db.get_writer_stats()}")
+        db.close()
         bot_logger.info("Бот остановлен")
         bot_logger.info("=" * 50)
 
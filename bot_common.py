@@ -0,0 +1,199 @@
+"""Общие части синхронного (bot.py) и асинхронного (async_bot.py) рантаймов
+
+Тексты ответов, создание базы данных из конфигурации и вспомогательные
+функции, не зависящие от того, как бот получает обновления.
+"""
+import time
+from datetime import datetime
+
+from telebot import apihelper
+
+from config import (
+    BOT_TOKEN, HEALTH_CHECK_INTERVAL,
+    DB_NAME, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL,
+    DB_PRAGMAS, DB_WRITE_MODE, DB_GROUP_COMMIT_INTERVAL_MS,
+    DB_GROUP_COMMIT_MAX_BATCH, DB_WRITE_QUEUE_SIZE,
+    NOTES_CACHE_ENABLED, NOTES_CACHE_MAX_ENTRIES, NOTES_CACHE_TTL
+)
+from database import Database
+from health import HealthProber
+from weather import check_api_connection
+
+# Переменная для отслеживания времени запуска
+_start_time = datetime.now()
+
+
+WELCOME_TEXT = (
+    "👋 *Привет! Я умный бот с заметками.*\n\n"
+    "*Основные возможности:*\n"
+    "• 📝 Система заметок с поиском и категориями\n"
+    "• 🌤 Погода в Москве, других городах и по геопозиции\n"
+    "• 🔢 Математические вычисления\n"
+    "• 🔄 Эхо-команда с разными вариантами\n"
+    "• 📊 Логирование всех действий\n\n"
+    "*Команды заметок:*\n"
+    "/note_add - добавить заметку\n"
+    "/note_list - список заметок\n"
+    "/note_find - поиск по заметкам\n"
+    "/note_count - статистика\n\n"
+    "Для получения полного списка команд и возможностей\n"
+    "Воспользуйтесь командой /help\n"
+    "или используйте Используйте кнопки ниже ⬇️"
+)
+
+HELP_TEXT = (
+    "📖 Справка по использованию бота:\n\n"
+    "Команды:\n"
+    "• /start - начало работы с ботом\n"
+    "• /help - эта справка\n"
+    "• /about - информация о боте\n"
+    "• /ping - проверка работоспособности\n"
+    "• /weather - Актуальная погода в Москве\n"
+    "• /weather <город> - погода в городе\n"
+    "   Пример: /weather Казань\n"
+    "• /forecast [завтра|неделя] [город] - прогноз погоды\n"
+    "   Пример: /forecast завтра Казань\n"
+    "• /echo - повторяет ваш текст с разными вариантами\n"
+    "• /sum X Y Z - вычисляет сумму чисел\n"
+    "   Пример: /sum 5 10 15\n\n"
+    "*Команды заметок:*\n"
+    "• /note_add - добавить заметку\n"
+    "• /note_list - список всех заметок\n"
+    "• /note_find - найти заметку по словам\n"
+    "• /note_edit - редактор заметок\n"
+    "• /note_del - удалить заметку\n"
+    "• /note_count - сколько всего заметок\n"
+    "• /note_export - скачать файл с заметками\n"
+    "• /note_import - загрузить заметки из файла (JSON, CSV, TXT)\n\n"
+    "Кнопки:\n"
+    "• О боте - информация о боте\n"
+    "• Погода Москва - текущая погода\n"
+    "• Погода рядом - погода по вашей геопозиции\n"
+    "• Помощь - эта справка\n"
+    "• Эхо команда - запуск команды эхо\n"  # Добавлено
+    "• Скрыть клавиатуру - скрыть reply-клавиатуру"
+)
+
+ABOUT_TEXT = (
+    "🤖 Информация о боте\n\n"
+    "Это демонстрационный бот, созданный с использованием:\n"
+    "• pyTelegramBotAPI (TeleBot)\n"
+    "• Open-Meteo API для данных о погоде\n"
+    "• Long Polling для получения обновлений\n\n"
+    "Бот предназначен для обучения и демонстрации возможностей.\n\n"
+    "📊 Логирование: все действия записываются в файл logs/bot.log"
+)
+
+ECHO_INSTRUCTIONS = (
+    "📝 Команда Эхо\n\n"
+    "Отправьте мне текст, и я его повторю.\n"
+    "Вы можете:\n"
+    "• Отправить любой текст\n"
+    "• Использовать кнопки ниже для примеров\n"
+    "• Нажать 'Отменить эхо' для выхода\n\n"
+    "Что вы хотите, чтобы я повторил?"
+)
+
+UNKNOWN_COMMAND_TEXT = (
+    "Я не понимаю эту команду. 😕\n\n"
+    "Используйте команды из меню или кнопки ниже.\n"
+    "Для справки нажмите /help"
+)
+
+
+def create_database():
+    """Создание базы данных заметок по настройкам из config"""
+    return Database(
+        DB_NAME,
+        pool_size=DB_POOL_SIZE,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+        pragmas=DB_PRAGMAS,
+        write_mode=DB_WRITE_MODE,
+        group_commit_interval_ms=DB_GROUP_COMMIT_INTERVAL_MS,
+        group_commit_max_batch=DB_GROUP_COMMIT_MAX_BATCH,
+        write_queue_size=DB_WRITE_QUEUE_SIZE,
+        cache_enabled=NOTES_CACHE_ENABLED,
+        cache_max_entries=NOTES_CACHE_MAX_ENTRIES,
+        cache_ttl=NOTES_CACHE_TTL
+    )
+
+
+def get_bot_uptime():
+    """Получение времени работы бота"""
+    uptime = datetime.now() - _start_time
+    days = uptime.days
+    hours, remainder = divmod(uptime.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+
+    if days > 0:
+        return f"{days}д {hours}ч {minutes}м"
+    elif hours > 0:
+        return f"{hours}ч {minutes}м {seconds}с"
+    else:
+        return f"{minutes}м {seconds}с"
+
+
+# Фоновые проверки и их названия в ответе на /ping
+HEALTH_CHECK_TITLES = {
+    'open_meteo': "API погоды",
+    'telegram': "Telegram API",
+    'sqlite': "База данных",
+}
+
+
+def create_health_prober(db):
+    """Фоновые проверки для /ping: Open-Meteo, Bot API и соединение с SQLite"""
+    prober = HealthProber(interval=HEALTH_CHECK_INTERVAL)
+    prober.add_check('open_meteo', check_api_connection)
+    prober.add_check('telegram', lambda: apihelper.get_me(BOT_TOKEN))
+    prober.add_check('sqlite', db.check_connection)
+    return prober
+
+
+def format_check_result(result, now):
+    """Состояние зависимости по последней фоновой проверке"""
+    if result is None:
+        return "проверяется ⏳"
+    age = max(0, int(now - result.checked_at))
+    if result.ok:
+        return f"доступно ✅ ({result.latency_ms:.1f} мс, {age} с назад)"
+    return f"недоступно ❌ ({age} с назад)"
+
+
+def build_ping_text(handling_us, health_results, queues):
+    """Текст ответа на /ping
+
+    handling_us - время обработки команды в процессе бота, мкс;
+    health_results - последние результаты фоновых проверок;
+    queues - глубина очередей: {название: число задач}.
+    """
+    now = time.time()
+    lines = [
+        "🏓 Pong!\n",
+        f"• Обработка: {handling_us:.0f} мкс",
+        "• Очереди: " + ", ".join(f"{name} {depth}" for name, depth in queues.items()),
+    ]
+    for name, title in HEALTH_CHECK_TITLES.items():
+        lines.append(f"• {title}: {format_check_result(health_results.get(name), now)}")
+    lines.append(f"• Бот запущен: {get_bot_uptime()}")
+    lines.append(f"• Текущее время: {datetime.now().strftime('%H:%M:%S')}")
+    return "\n".join(lines)
+
+
+def calculate_sum(args):
+    """Сумма аргументов /sum X Y Z: (числа, сумма, текст ответа)
+
+    ValueError, если среди аргументов есть не целые числа.
+    """
+    numbers = [int(arg) for arg in args]
+    total = sum(numbers)
+
+    # Формируем красивый ответ
+    numbers_str = " + ".join(map(str, numbers))
+    return numbers, total, f"🔢 Результат: {numbers_str} = {total}"
+
+
+def build_echo_preview(text):
+    """Текст подтверждения эхо с обрезанным превью"""
+    return f"📝 Ваш текст ({len(text)} символов):\n\n`{text[:100]}{'...' if len(text) > 100 else ''}`\n\nВыберите действие:"
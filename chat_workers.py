@@ -0,0 +1,202 @@
+import logging
+import queue
+import threading
+import time
+
+import telebot
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.workers')
+
+
+class ChatWorkerPool:
+    """Пул обработчиков с порядком внутри чата
+
+    Задачи раскладываются по workers очередям по ключу (ID чата): у
+    каждой очереди свой поток, поэтому задачи одного чата выполняются
+    строго последовательно и в порядке поступления, а разные чаты -
+    параллельно. Долгая задача (например, экспорт) задерживает только
+    чаты своей очереди.
+    """
+
+    def __init__(self, workers=4, queue_size=100):
+        self.workers = max(1, int(workers))
+        self._stop = object()
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._stats = [
+            {
+                'tasks': 0,
+                'errors': 0,
+                'max_depth': 0,
+                'wait_time_total': 0.0,
+                'busy_time_total': 0.0,
+            }
+            for _ in range(self.workers)
+        ]
+
+        self._threads = []
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, args=(index,), name=f'chat-worker-{index}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f"Пул обработчиков: {self.workers} очередей по {queue_size} задач")
+
+    def shard(self, key):
+        """Номер очереди для ключа"""
+        return hash(key) % self.workers
+
+    def submit(self, key, func, *args, on_start=None, **kwargs):
+        """Постановка задачи в очередь ключа
+
+        Если очередь заполнена, вызывающий поток ждет - так поток приема
+        обновлений притормаживает вместо неограниченного роста очередей.
+        on_start() вызывается в потоке очереди перед запуском задачи.
+        """
+        index = self.shard(key)
+        task_queue = self._queues[index]
+        task_queue.put((time.monotonic(), on_start, func, args, kwargs))
+
+        depth = task_queue.qsize()
+        with self._lock:
+            stats = self._stats[index]
+            stats['max_depth'] = max(stats['max_depth'], depth)
+
+    def _run(self, index):
+        """Основной цикл потока очереди"""
+        task_queue = self._queues[index]
+        while True:
+            item = task_queue.get()
+            if item is self._stop:
+                break
+
+            enqueued_at, on_start, func, args, kwargs = item
+            start = time.monotonic()
+            failed = False
+            if on_start is not None:
+                try:
+                    on_start()
+                except Exception as e:
+                    logger.warning(f"Ошибка on_start в очереди {index}: {e}")
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                failed = True
+                logger.error(f"Ошибка обработчика в очереди {index}: {e}", exc_info=True)
+
+            with self._lock:
+                stats = self._stats[index]
+                stats['tasks'] += 1
+                stats['errors'] += failed
+                stats['wait_time_total'] += start - enqueued_at
+                stats['busy_time_total'] += time.monotonic() - start
+
+    def close(self, timeout=10.0):
+        """Остановка потоков после выполнения уже поставленных задач"""
+        for task_queue in self._queues:
+            task_queue.put(self._stop)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        logger.info(f"Пул обработчиков остановлен: {self.stats()}")
+
+    def queue_depths(self):
+        """Текущая глубина каждой очереди"""
+        return [task_queue.qsize() for task_queue in self._queues]
+
+    def stats(self):
+        """Статистика по очередям: глубина, задачи, ожидание и время работы"""
+        with self._lock:
+            per_queue = [dict(stats) for stats in self._stats]
+
+        for stats, depth in zip(per_queue, self.queue_depths()):
+            stats['depth'] = depth
+            tasks = stats['tasks']
+            stats['avg_wait_ms'] = stats.pop('wait_time_total') * 1000 / tasks if tasks else 0.0
+            stats['avg_busy_ms'] = stats.pop('busy_time_total') * 1000 / tasks if tasks else 0.0
+
+        return {
+            'workers': self.workers,
+            'depth': sum(stats['depth'] for stats in per_queue),
+            'tasks': sum(stats['tasks'] for stats in per_queue),
+            'errors': sum(stats['errors'] for stats in per_queue),
+            'queues': per_queue,
+        }
+
+
+def update_chat_id(update):
+    """ID чата обновления (для обновлений без чата - ID пользователя)"""
+    for name in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, name, None)
+        if message is not None:
+            return message.chat.id
+
+    call = getattr(update, 'callback_query', None)
+    if call is not None:
+        if call.message is not None:
+            return call.message.chat.id
+        return call.from_user.id
+
+    for name in ('inline_query', 'chosen_inline_result', 'shipping_query',
+                 'pre_checkout_query', 'poll_answer', 'my_chat_member',
+                 'chat_member', 'chat_join_request'):
+        event = getattr(update, name, None)
+        if event is None:
+            continue
+        chat = getattr(event, 'chat', None)
+        if chat is not None:
+            return chat.id
+        user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+        if user is not None:
+            return user.id
+
+    return 0
+
+
+class ChatOrderedTeleBot(telebot.TeleBot):
+    """TeleBot, обрабатывающий обновления в ChatWorkerPool
+
+    Стандартный многопоточный режим TeleBot выбирает обработчик в потоке
+    приема, а выполняет его в общем пуле: два быстрых сообщения одного
+    чата могут выполниться одновременно или не по порядку, а фильтры
+    состояний (user_states) проверяются до того, как предыдущий
+    обработчик успел сменить состояние. Здесь в очередь чата уходит
+    обновление целиком - и выбор обработчика, и его выполнение идут
+    последовательно в потоке этого чата.
+    """
+
+    def __init__(self, token, pool, **kwargs):
+        # last_update_id меняют и поток приема, и потоки очередей
+        self._update_id_lock = threading.Lock()
+        self._last_update_id = 0
+        self.pool = pool
+        super().__init__(token, threaded=False, **kwargs)
+
+    @property
+    def last_update_id(self):
+        return self._last_update_id
+
+    @last_update_id.setter
+    def last_update_id(self, value):
+        # Смещение getUpdates только растет: очередь, обработавшая старое
+        # обновление позже, не должна вернуть его назад
+        with self._update_id_lock:
+            if value > self._last_update_id:
+                self._last_update_id = value
+
+    def process_new_updates(self, updates, on_start=None):
+        """Раскладка обновлений по очередям чатов
+
+        on_start() вызывается в потоке очереди перед обработкой каждого
+        обновления (задержка webhook до обработчика).
+        """
+        for update in updates:
+            # Смещение сдвигаем сразу, до обработки в очереди
+            self.last_update_id = update.update_id
+            self.pool.submit(
+                update_chat_id(update), telebot.TeleBot.process_new_updates, self, [update],
+                on_start=on_start
+            )
@@ -0,0 +1,313 @@
+"""Проверки корректности хранения заметок
+
+Бенчмарки меряют скорость, здесь - что ускорения не сломали данные.
+Каждая проверка работает на своей временной базе; при расхождении
+печатается FAIL с описанием и код возврата 1.
+
+Запуск:
+    python checks.py          # все проверки
+    python checks.py ids
+    python checks.py pages
+    python checks.py stats
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+from db_writer import WRITE_MODE_GROUP, WRITE_MODE_SYNC
+
+
+class CheckFailed(AssertionError):
+    """Проверка обнаружила расхождение"""
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+def _stored_ids(db_path, user_id):
+    """Локальные ID заметок пользователя прямо из файла базы"""
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            'SELECT note_local_id FROM notes WHERE user_id = ? ORDER BY note_local_id', (user_id,)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def check_local_ids(tmp, users=3, tasks=300, threads=8):
+    """Локальные ID: свои у каждого пользователя, без пропусков и повторов
+
+    Два объекта Database на одном файле (как два процесса бота) пишут
+    одиночные и пакетные заметки из нескольких потоков. Для каждого
+    пользователя выданные ID должны составить ровно 1..N и совпасть с
+    сохраненными; после удаления последней заметки ID не используется
+    повторно.
+    """
+    for write_mode in (WRITE_MODE_SYNC, WRITE_MODE_GROUP):
+        db_path = os.path.join(tmp, f'ids-{write_mode}.db')
+        databases = [Database(db_path, write_mode=write_mode, cache_enabled=False) for _ in range(2)]
+        rng = random.Random(3)
+        plan = [
+            (rng.choice(databases), rng.randint(1, users), rng.choice((1, 1, 1, rng.randint(2, 20))))
+            for _ in range(tasks)
+        ]
+
+        def write(task):
+            db, user_id, count = task
+            if count == 1:
+                return user_id, [db.add_note(user_id, "Заметка", "текст")]
+            ids = db.add_notes_bulk(user_id, [{'title': "Пакет", 'content': "текст"}] * count)
+            return user_id, list(ids) if ids is not None else [None]
+
+        issued = {user_id: [] for user_id in range(1, users + 1)}
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for user_id, ids in executor.map(write, plan):
+                issued[user_id].extend(ids)
+
+        for user_id, ids in issued.items():
+            expect(None not in ids, f"{write_mode}: запись заметки пользователя {user_id} не удалась")
+            expected = list(range(1, len(ids) + 1))
+            expect(sorted(ids) == expected,
+                   f"{write_mode}: ID пользователя {user_id} с пропусками или повторами")
+            expect(_stored_ids(db_path, user_id) == expected,
+                   f"{write_mode}: сохраненные ID пользователя {user_id} не совпадают с выданными")
+
+        # Удаленный ID не возвращается: следующая заметка получает N+1
+        db = databases[0]
+        last_id = len(issued[1])
+        expect(db.delete_note(1, last_id), f"{write_mode}: заметка {last_id} не удалена")
+        expect(db.add_note(1, "После удаления", "текст") == last_id + 1,
+               f"{write_mode}: ID удаленной заметки выдан повторно")
+
+        for db in databases:
+            db.close()
+
+    return f"{tasks} записей из {threads} потоков в двух объектах Database, режимы sync и group"
+
+
+# Больше страниц при листании не бывает - иначе курсор зациклился
+MAX_PAGES = 1000
+
+
+def _walk_forward(db, user_id, page_size, category=None, between_pages=None):
+    """Листание next_cursor от первой страницы; (ID по порядку, последняя страница)"""
+    page = db.get_user_notes_page(user_id, page_size, category=category)
+    expect(page['prev_cursor'] is None, "у первой страницы есть prev_cursor")
+    seen = [note['id'] for note in page['notes']]
+    for _ in range(MAX_PAGES):
+        if page['next_cursor'] is None:
+            break
+        if between_pages is not None:
+            between_pages(len(seen))
+        page = db.get_user_notes_page(user_id, page_size, after_local_id=page['next_cursor'], category=category)
+        expect(page['notes'], "next_cursor указывает на пустую страницу")
+        seen.extend(note['id'] for note in page['notes'])
+    else:
+        raise CheckFailed(f"next_cursor не довел до последней страницы за {MAX_PAGES} страниц")
+    return seen, page
+
+
+def _walk_backward(db, user_id, page_size, page, category=None):
+    """Листание prev_cursor от страницы page к первой; ID в порядке списка"""
+    seen = [note['id'] for note in page['notes']]
+    for _ in range(MAX_PAGES):
+        if page['prev_cursor'] is None:
+            break
+        page = db.get_user_notes_page(user_id, page_size, before_local_id=page['prev_cursor'], category=category)
+        expect(page['notes'], "prev_cursor указывает на пустую страницу")
+        seen[:0] = [note['id'] for note in page['notes']]
+    else:
+        raise CheckFailed(f"prev_cursor не довел до первой страницы за {MAX_PAGES} страниц")
+    return seen
+
+
+def check_pagination(tmp, notes=57):
+    """Курсоры next/prev: каждая заметка ровно один раз, в том числе при изменениях
+
+    Листание вперед и обратно для разных размеров страницы и с фильтром
+    категории. Затем между страницами добавляется заметка и удаляются
+    уже показанная и еще не показанная: проход вперед не должен дать
+    повторов, пропусков существовавших заметок и удаленную непоказанную,
+    а обратный проход - вернуть текущий список целиком.
+    """
+    db = Database(os.path.join(tmp, 'pages.db'))
+    user_id = 1
+    db.add_notes_bulk(user_id, [
+        {'title': f"Заметка {number}", 'content': "текст", 'category': ('work', 'home')[number % 2]}
+        for number in range(notes)
+    ])
+    db.add_note(2, "Чужая заметка", "текст")
+
+    categories = {None: list(range(notes, 0, -1))}
+    for category, parity in (('work', 1), ('home', 0)):
+        categories[category] = [local_id for local_id in categories[None] if local_id % 2 == parity]
+
+    for page_size in (1, 7, 10, notes, notes + 10):
+        for category, expected in categories.items():
+            label = f"страница {page_size}, категория {category}"
+            forward, last_page = _walk_forward(db, user_id, page_size, category)
+            expect(forward == expected, f"{label}: проход вперед {forward} вместо {expected}")
+            expect(_walk_backward(db, user_id, page_size, last_page, category) == expected,
+                   f"{label}: обратный проход не совпал с проходом вперед")
+
+    # Изменения между страницами: после первой страницы добавляем новую
+    # заметку, удаляем показанную и еще не показанную
+    page_size = 10
+    initial = categories[None]
+    shown_deleted, unseen_deleted = initial[3], initial[-5]
+    added = []
+
+    def mutate(shown):
+        if shown == page_size:
+            added.append(db.add_note(user_id, "Новая", "текст"))
+            expect(db.delete_note(user_id, shown_deleted), "показанная заметка не удалена")
+            expect(db.delete_note(user_id, unseen_deleted), "непоказанная заметка не удалена")
+
+    forward, last_page = _walk_forward(db, user_id, page_size, between_pages=mutate)
+    expect(len(forward) == len(set(forward)), f"повторы при изменениях между страницами: {forward}")
+    expect(forward == [local_id for local_id in initial if local_id != unseen_deleted],
+           "проход вперед при изменениях: пропущены или лишние заметки")
+
+    current = added + [local_id for local_id in initial if local_id not in (shown_deleted, unseen_deleted)]
+    expect(_walk_backward(db, user_id, page_size, last_page) == current,
+           "обратный проход после изменений не вернул текущий список")
+
+    db.close()
+    return f"{notes} заметок, 5 размеров страницы, 3 фильтра, изменения между страницами"
+
+
+def check_note_stats(tmp, operations=2000, users=5):
+    """Счетчики триггеров совпадают с пересчетом rebuild_note_stats()
+
+    Случайные добавления (по одной и пакетами, в пакетах - с исходным
+    updated_at, как при импорте), изменения содержания и категории и
+    удаления у нескольких пользователей, содержание с многобайтными
+    символами; в конце один пользователь удаляет все заметки, другой
+    переносит все в одну категорию (строки опустевших категорий должны
+    исчезнуть), у третьего updated_at заметок сдвигается назад.
+    Расхождений быть не должно, включая last_modified; затем счетчики
+    портятся вручную - rebuild_note_stats() обязан их найти.
+    """
+    categories = ('general', 'work', 'home', 'идеи')
+    words = ('текст', 'note', 'заметка', '📝', 'a' * 50)
+
+    for write_mode in (WRITE_MODE_SYNC, WRITE_MODE_GROUP):
+        db_path = os.path.join(tmp, f'stats-{write_mode}.db')
+        db = Database(db_path, write_mode=write_mode)
+        rng = random.Random(8)
+        existing = {user_id: [] for user_id in range(1, users + 1)}
+
+        def content():
+            return ' '.join(rng.choice(words) for _ in range(rng.randint(0, 8)))
+
+        def imported_at():
+            # Прошлое и будущее относительно CURRENT_TIMESTAMP; None - текущее время
+            if rng.random() < 0.3:
+                return None
+            return f'{rng.choice((2001, 2024, 2099))}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} 12:00:00'
+
+        for _ in range(operations):
+            user_id = rng.randint(1, users)
+            notes = existing[user_id]
+            action = rng.random()
+            if action < 0.35 or not notes:
+                notes.append(db.add_note(user_id, "Заметка", content(), category=rng.choice(categories)))
+            elif action < 0.45:
+                ids = db.add_notes_bulk(user_id, [
+                    {'title': "Пакет", 'content': content(), 'category': rng.choice(categories),
+                     'updated_at': imported_at()}
+                    for _ in range(rng.randint(2, 10))
+                ])
+                expect(ids is not None, f"{write_mode}: пакетная запись не удалась")
+                notes.extend(ids)
+            elif action < 0.75:
+                db.update_note(
+                    user_id, rng.choice(notes),
+                    content=content() if rng.random() < 0.7 else None,
+                    category=rng.choice(categories) if rng.random() < 0.5 else None
+                )
+            else:
+                local_id = notes.pop(rng.randrange(len(notes)))
+                expect(db.delete_note(user_id, local_id), f"{write_mode}: заметка {local_id} не удалена")
+
+        # Опустевшие категории: удалением и переносом
+        for local_id in existing[1]:
+            expect(db.delete_note(1, local_id), f"{write_mode}: заметка {local_id} не удалена")
+        existing[1] = []
+        for local_id in existing[2]:
+            db.update_note(2, local_id, category='general')
+
+        # Сдвиг updated_at назад, в том числе у заметки с максимумом
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('''
+                UPDATE notes SET updated_at = '2000-01-01 00:00:00'
+                WHERE user_id = 3 AND note_local_id % 2 = 0
+            ''')
+            conn.execute('''
+                UPDATE notes SET updated_at = '2000-01-02 00:00:00'
+                WHERE user_id = 3 AND updated_at = (SELECT MAX(updated_at) FROM notes WHERE user_id = 3)
+            ''')
+
+        report = db.rebuild_note_stats()
+        expect(report is not None, f"{write_mode}: rebuild_note_stats завершился ошибкой")
+        expect(not report['mismatches'],
+               f"{write_mode}: счетчики триггеров расходятся с пересчетом: {report['mismatches']}")
+        for user_id, notes in existing.items():
+            expect(db.get_notes_count(user_id) == len(notes),
+                   f"{write_mode}: get_notes_count({user_id}) не совпадает с числом заметок")
+
+        # Проверка самой проверки: испорченные счетчики должны найтись
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('UPDATE user_note_stats SET note_count = note_count + 1 WHERE user_id = 3')
+            conn.execute('UPDATE user_note_category_stats SET content_bytes = content_bytes + 1 '
+                         'WHERE user_id = 4')
+            conn.execute("UPDATE user_note_stats SET last_modified = '1999-01-01 00:00:00' WHERE user_id = 5")
+        report = db.rebuild_note_stats()
+        expect(report is not None and (3, None) in report['mismatches'] and (5, None) in report['mismatches']
+               and any(user_id == 4 for user_id, _ in report['mismatches']),
+               f"{write_mode}: rebuild_note_stats не нашел испорченные счетчики")
+        expect(not db.rebuild_note_stats()['mismatches'], f"{write_mode}: пересчет не исправил счетчики")
+
+        db.close()
+
+    return f"{operations} случайных операций у {users} пользователей, режимы sync и group"
+
+
+CHECKS = {
+    'ids': check_local_ids,
+    'pages': check_pagination,
+    'stats': check_note_stats,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверки корректности хранения заметок")
+    parser.add_argument('check', nargs='?', choices=sorted(CHECKS), help="одна проверка (по умолчанию все)")
+    args = parser.parse_args()
+
+    failed = False
+    for name, check in CHECKS.items():
+        if args.check and name != args.check:
+            continue
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                details = check(tmp)
+            except CheckFailed as e:
+                failed = True
+                print(f"{name}: FAIL - {e}")
+                continue
+        print(f"{name}: OK ({details}, {time.perf_counter() - start:.1f} с)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Предохранитель (circuit breaker) для обращений к внешнему сервису
+
+closed - запросы идут как обычно; после failure_threshold ошибок подряд
+предохранитель размыкается (open) и recovery_timeout секунд отклоняет
+запросы сразу, не занимая поток ожиданием заведомо недоступного
+сервиса. Затем half-open: пропускается half_open_max_calls пробных
+запросов; успех замыкает цепь, ошибка снова размыкает ее.
+"""
+import logging
+import threading
+import time
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.circuit')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонен: предохранитель разомкнут"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name}: предохранитель разомкнут, повтор через {retry_after:.0f} с")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Предохранитель: before_call() перед запросом, record_success()/record_failure() после"""
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, int(half_open_max_calls))
+
+        self._state = CLOSED
+        self._failures = 0          # ошибок подряд в состоянии closed
+        self._opened_at = 0.0
+        self._half_open_calls = 0   # пробных запросов в работе
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'rejected': 0,
+        }
+        self._transitions = {}
+
+    def before_call(self):
+        """Разрешение на запрос; CircuitOpenError, если цепь разомкнута"""
+        with self._lock:
+            if self._state == OPEN:
+                retry_after = self._opened_at + self.recovery_timeout - time.monotonic()
+                if retry_after > 0:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, retry_after)
+                self._transition(HALF_OPEN)
+
+            if self._state == HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    # Пробный запрос уже идет - остальные ждут его результата снаружи
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self._half_open_calls += 1
+
+            self._stats['calls'] += 1
+
+    def record_success(self):
+        """Запрос выполнен (сервис ответил)"""
+        with self._lock:
+            self._stats['successes'] += 1
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._half_open_calls -= 1
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        """Запрос не выполнен: сеть, таймаут, 5xx"""
+        with self._lock:
+            self._stats['failures'] += 1
+            if self._state == HALF_OPEN:
+                self._half_open_calls -= 1
+                self._open()
+            elif self._state == CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open()
+
+    def _open(self):
+        """Размыкание цепи (под self._lock)"""
+        self._opened_at = time.monotonic()
+        self._failures = 0
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        """Смена состояния с записью в лог и счетчиком переходов (под self._lock)"""
+        name = f"{self._state}->{state}"
+        self._transitions[name] = self._transitions.get(name, 0) + 1
+        self._state = state
+        if state == HALF_OPEN:
+            self._half_open_calls = 0
+
+        if state == OPEN:
+            logger.warning(f"Предохранитель {self.name}: {name}, запросы отклоняются "
+                           f"{self.recovery_timeout:.0f} с")
+        else:
+            logger.info(f"Предохранитель {self.name}: {name}")
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def stats(self):
+        """Статистика: состояние, запросы, ошибки, отклоненные, переходы между состояниями"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self._state
+            stats['transitions'] = dict(self._transitions)
+        return stats
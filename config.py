@@ -57,6 +57,130 @@ bot_logger.setLevel(logging.INFO)
 OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
 MOSCOW_COORDS = {"latitude": 55.7558, "longitude": 37.6173}
 
+# Кэш погоды: TTL записи, сек (блок current обновляется раз в 15 минут);
+# до WEATHER_MAX_STALE сек устаревшая запись отдается сразу, пока идет
+# обновление
+WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', '600'))
+WEATHER_MAX_STALE = float(os.getenv('WEATHER_MAX_STALE', '3600'))
+
+# Фоновое обновление кэша погоды: за WEATHER_PREFETCH_LEAD сек до
+# истечения TTL (со случайным сдвигом до WEATHER_PREFETCH_JITTER сек), не
+# больше WEATHER_PREFETCH_CALLS_PER_HOUR запросов к API в час. Москва
+# обновляется всегда, WEATHER_PREFETCH_LOCATIONS - дополнительные точки
+# в виде "широта,долгота;широта,долгота"
+WEATHER_PREFETCH_ENABLED = os.getenv('WEATHER_PREFETCH_ENABLED', '1').lower() not in ('0', 'false', 'no')
+WEATHER_PREFETCH_LOCATIONS = [
+    tuple(float(part) for part in location.split(','))
+    for location in os.getenv('WEATHER_PREFETCH_LOCATIONS', '').split(';') if location.strip()
+]
+WEATHER_PREFETCH_LEAD = float(os.getenv('WEATHER_PREFETCH_LEAD', '60'))
+WEATHER_PREFETCH_JITTER = float(os.getenv('WEATHER_PREFETCH_JITTER', '30'))
+WEATHER_PREFETCH_CALLS_PER_HOUR = int(os.getenv('WEATHER_PREFETCH_CALLS_PER_HOUR', '60'))
+
+# Погода по городам и геопозиции: координаты округляются до сетки с шагом
+# WEATHER_GRID_STEP градусов (одна запись кэша на ячейку); промахи по
+# разным ячейкам за WEATHER_BATCH_WINDOW_MS мс уходят одним запросом, не
+# больше WEATHER_BATCH_MAX_POINTS точек в запросе
+WEATHER_GRID_STEP = float(os.getenv('WEATHER_GRID_STEP', '0.1'))
+WEATHER_BATCH_WINDOW_MS = float(os.getenv('WEATHER_BATCH_WINDOW_MS', '50'))
+WEATHER_BATCH_MAX_POINTS = int(os.getenv('WEATHER_BATCH_MAX_POINTS', '50'))
+
+# Прогноз (/forecast): почасовой ответ на FORECAST_DAYS суток хранится
+# FORECAST_CACHE_TTL сек (модели обновляются раз в час), устаревший
+# отдается сразу до FORECAST_MAX_STALE сек
+FORECAST_DAYS = int(os.getenv('FORECAST_DAYS', '7'))
+FORECAST_CACHE_TTL = float(os.getenv('FORECAST_CACHE_TTL', '1800'))
+FORECAST_MAX_STALE = float(os.getenv('FORECAST_MAX_STALE', '21600'))
+
+# Способ получения обновлений: polling (long polling) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# Webhook: публичный адрес (WEBHOOK_URL + WEBHOOK_PATH регистрируется в
+# Telegram; пустой - не регистрировать, для локальной проверки) и адрес
+# встроенного HTTP-сервера
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+
+# Пул обработчиков: обновления раскладываются по HANDLER_WORKERS очередям
+# по ID чата (в чате - строго по порядку, разные чаты - параллельно)
+HANDLER_WORKERS = int(os.getenv('HANDLER_WORKERS', '4'))
+HANDLER_QUEUE_SIZE = int(os.getenv('HANDLER_QUEUE_SIZE', '100'))
+
+# Очередь исходящих сообщений: лимиты Telegram - около 30 сообщений в
+# секунду на бота и 1 в секунду на чат (OUTBOX_CHAT_BURST - допустимый
+# всплеск), при 429 запрос повторяется после retry_after
+OUTBOX_GLOBAL_RATE = float(os.getenv('OUTBOX_GLOBAL_RATE', '30'))
+OUTBOX_CHAT_RATE = float(os.getenv('OUTBOX_CHAT_RATE', '1'))
+OUTBOX_CHAT_BURST = int(os.getenv('OUTBOX_CHAT_BURST', '3'))
+OUTBOX_SENDERS = int(os.getenv('OUTBOX_SENDERS', '4'))
+OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', '5'))
+
+# HTTP-сессии с пулом keep-alive соединений: размер пула на хост,
+# повторы с экспоненциальной задержкой (HTTP_BACKOFF * 2^n сек) и
+# таймауты подключения/чтения, сек. TELEGRAM_POOL_SIZE - соединений к
+# Bot API (потоки обработчиков, отправки и прием обновлений)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.5'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '16'))
+
+# Open-Meteo: бюджет времени на запрос вместе с повторами, сек
+# (OPEN_METEO_PING_DEADLINE - для проверки доступности в /ping) и
+# предохранитель: после CIRCUIT_FAILURE_THRESHOLD ошибок подряд запросы
+# CIRCUIT_RECOVERY_TIMEOUT сек отклоняются сразу, затем пропускается
+# CIRCUIT_HALF_OPEN_CALLS пробных запросов
+OPEN_METEO_DEADLINE = float(os.getenv('OPEN_METEO_DEADLINE', '4'))
+OPEN_METEO_PING_DEADLINE = float(os.getenv('OPEN_METEO_PING_DEADLINE', '2'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT', '30'))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_CALLS', '1'))
+
+# Фоновые проверки Open-Meteo, Bot API и SQLite для /ping, раз в сек
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '30'))
+
+# Метрики в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics
+# (по умолчанию только локально)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Конфигурация базы данных
+DB_NAME = os.getenv('DB_NAME', 'notes.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '60'))
+
+# Режим записи: sync - запись в потоке обработчика, group - выделенный
+# поток записи, объединяющий операции в одну транзакцию
+DB_WRITE_MODE = os.getenv('DB_WRITE_MODE', 'sync')
+DB_GROUP_COMMIT_INTERVAL_MS = float(os.getenv('DB_GROUP_COMMIT_INTERVAL_MS', '5'))
+DB_GROUP_COMMIT_MAX_BATCH = int(os.getenv('DB_GROUP_COMMIT_MAX_BATCH', '100'))
+DB_WRITE_QUEUE_SIZE = int(os.getenv('DB_WRITE_QUEUE_SIZE', '1000'))
+
+# Кэш чтений заметок (сбрасывается при добавлении, изменении и удалении)
+NOTES_CACHE_ENABLED = os.getenv('NOTES_CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+NOTES_CACHE_MAX_ENTRIES = int(os.getenv('NOTES_CACHE_MAX_ENTRIES', '10000'))
+NOTES_CACHE_TTL = float(os.getenv('NOTES_CACHE_TTL', '300'))
+
+# Потоки для запросов к SQLite в асинхронном рантайме (async_bot.py);
+# 0 - по размеру пула соединений
+ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', '0'))
+
+# Профиль производительности SQLite (пустые значения - настройки по умолчанию)
+DB_PRAGMAS = {
+    'journal_mode': os.getenv('DB_JOURNAL_MODE') or None,
+    'synchronous': os.getenv('DB_SYNCHRONOUS') or None,
+    'busy_timeout': os.getenv('DB_BUSY_TIMEOUT_MS') or None,
+    'cache_size': os.getenv('DB_CACHE_SIZE') or None,
+    'mmap_size': os.getenv('DB_MMAP_SIZE') or None,
+    'temp_store': os.getenv('DB_TEMP_STORE') or None,
+}
+
 
 # Функция для безопасного логирования сообщений пользователя
 def safe_log_user_info(user_id, username=None, action=None, message_preview=None):
@@ -1,132 +1,912 @@
 import sqlite3
 import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
 import json
 
+from db_writer import (
+    GroupCommitWriter, run_in_transaction, WRITE_MODE_GROUP, WRITE_MODE_SYNC
+)
+from metrics import registry, instrument_methods
+from note_cache import NoteCache, MISS
+from note_model import note_row_factory
+
 # Настройка логгера
 logger = logging.getLogger('telegram_bot.database')
 
+# Время методов Database и исключения, вышедшие из них (ошибки, которые
+# метод сам записал в лог и вернул None/[], сюда не попадают)
+db_method_duration = registry.histogram(
+    'bot_db_method_duration_seconds', "Время выполнения метода Database", ('method',)
+)
+db_method_errors = registry.counter(
+    'bot_db_method_errors_total', "Исключения из методов Database", ('method',)
+)
+
+
+# Профиль производительности по умолчанию (применяется к каждому соединению)
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',       # читатели не блокируются писателем
+    'synchronous': 'NORMAL',     # в режиме WAL безопасно и без fsync на каждый commit
+    'busy_timeout': 5000,        # мс ожидания блокировки вместо "database is locked"
+    'cache_size': -16000,        # отрицательное значение - размер в КиБ (~16 МБ)
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Допустимые значения строковых PRAGMA (подставляются в SQL напрямую)
+_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA', '0', '1', '2', '3'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY', '0', '1', '2'},
+}
+_PRAGMA_INTEGERS = {'busy_timeout', 'cache_size', 'mmap_size'}
+
+
+def build_pragmas(overrides=None):
+    """Сборка профиля PRAGMA из значений по умолчанию и переопределений
+
+    Значения None в overrides пропускаются, неизвестные или недопустимые
+    значения приводят к ValueError.
+    """
+    pragmas = dict(DEFAULT_PRAGMAS)
+    for name, value in (overrides or {}).items():
+        if value is None:
+            continue
+        if name in _PRAGMA_INTEGERS:
+            pragmas[name] = int(value)
+        elif name in _PRAGMA_CHOICES:
+            value = str(value).upper()
+            if value not in _PRAGMA_CHOICES[name]:
+                raise ValueError(f"Недопустимое значение PRAGMA {name}: {value}")
+            pragmas[name] = value
+        else:
+            raise ValueError(f"Неизвестная PRAGMA: {name}")
+    return pragmas
+
+
+def apply_pragmas(conn, pragmas):
+    """Применение профиля PRAGMA к соединению"""
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+# Окончания, отбрасываемые при построении префиксного запроса к FTS5:
+# "работа", "работой", "работы" сводятся к префиксу "работ*"
+_RU_ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ать', 'ять', 'ить',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ам', 'ям', 'ах', 'ях',
+    'ом', 'ем', 'ов', 'ев', 'ую', 'юю', 'ые', 'ие', 'ых', 'их',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+], key=len, reverse=True)
+_CYRILLIC_RE = re.compile('[а-яё]')
+_WORD_RE = re.compile(r'\w+')
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+
+
+def _stem_for_prefix(word):
+    """Грубое отсечение русского окончания для префиксного поиска"""
+    if len(word) < 5 or not _CYRILLIC_RE.search(word):
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[:-len(ending)]
+    return word
+
+
+def build_fts_query(search_text):
+    """Преобразование пользовательского запроса в выражение FTS5 MATCH
+
+    Текст в кавычках ищется как точная фраза, остальные слова - по
+    префиксу основы, все условия объединяются через AND. Возвращает
+    None, если в запросе нет ни одного слова.
+    """
+    terms = []
+
+    for phrase in _PHRASE_RE.findall(search_text):
+        words = _WORD_RE.findall(phrase.lower())
+        if words:
+            terms.append('"' + ' '.join(words) + '"')
+
+    for word in _WORD_RE.findall(_PHRASE_RE.sub(' ', search_text).lower()):
+        terms.append(f'"{_stem_for_prefix(word)}"*')
+
+    return ' AND '.join(terms) if terms else None
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Ограниченный пул долгоживущих соединений SQLite
+
+    Соединения создаются лениво (не больше size штук) и переиспользуются
+    между запросами, поэтому горячие пути не платят за открытие файла,
+    разбор схемы и холодный кэш страниц на каждый вызов.
+    """
+
+    def __init__(self, db_name, size=5, timeout=30.0, health_check_interval=60.0,
+                 pragmas=None):
+        self.db_name = db_name
+        self.pragmas = pragmas or {}
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # Статистика для подбора размера пула под нагрузкой
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self):
+        """Открытие нового соединения"""
+        conn = sqlite3.connect(self.db_name, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            apply_pragmas(conn, self.pragmas)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _is_healthy(self, conn):
+        """Проверка, что соединение еще живо"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        """Закрытие испорченного соединения и освобождение слота"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['discarded'] += 1
+
+    def acquire(self):
+        """Получение соединения из пула"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Пул соединений закрыт")
+
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    self._stats['created'] += 1
+                    create = True
+                else:
+                    create = False
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                last_used = time.monotonic()
+            else:
+                # Все соединения заняты - ждем освобождения
+                wait_start = time.monotonic()
+                try:
+                    conn, last_used = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"Нет свободных соединений в пуле за {self.timeout} с"
+                    )
+                waited = time.monotonic() - wait_start
+                with self._lock:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += waited
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+        # Проверяем соединение, если оно долго простаивало
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            logger.warning("Соединение из пула не прошло проверку, переоткрываем")
+            self._discard(conn)
+            return self.acquire()
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+        return conn
+
+    def release(self, conn):
+        """Возврат соединения в пул"""
+        if self._closed:
+            self._discard(conn)
+            return
 
+        try:
+            # Незавершенная транзакция не должна утечь к следующему вызову
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: соединение возвращается в пул по выходу"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Закрытие всех простаивающих соединений пула"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._created -= 1
+        logger.info("Пул соединений закрыт")
+
+    def stats(self):
+        """Статистика пула: выдачи, ожидания и время ожидания"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        stats['wait_time_avg'] = (
+            stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        )
+        return stats
+
+
+# Служебные методы без обращения к данным не замеряются
+@instrument_methods(db_method_duration, db_method_errors, exclude=(
+    'get_connection', 'get_effective_settings', 'log_effective_settings', 'invalidate_user_cache',
+    'get_cache_stats', 'get_pool_stats', 'get_writer_stats', 'close'
+))
 class Database:
-    def __init__(self, db_name='notes.db'):
-        """Инициализация базы данных"""
+    def __init__(self, db_name='notes.db', pool_size=5, pool_timeout=30.0,
+                 pool_health_check_interval=60.0, pragmas=None,
+                 write_mode=WRITE_MODE_SYNC, group_commit_interval_ms=5,
+                 group_commit_max_batch=100, write_queue_size=1000,
+                 cache_enabled=True, cache_max_entries=10000, cache_ttl=300.0):
+        """Инициализация базы данных
+
+        write_mode='group' включает выделенный поток записи с групповой
+        фиксацией транзакций, 'sync' - запись в потоке вызывающего.
+        cache_enabled включает кэш чтений заметок (сбрасывается записью).
+        """
         self.db_name = db_name
+        self.pragmas = build_pragmas(pragmas)
+        self.fts_enabled = False
+        self.pool = ConnectionPool(
+            db_name,
+            size=pool_size,
+            timeout=pool_timeout,
+            health_check_interval=pool_health_check_interval,
+            pragmas=self.pragmas
+        )
         self.init_database()
+        self.log_effective_settings()
+
+        if write_mode == WRITE_MODE_GROUP:
+            self.writer = GroupCommitWriter(
+                self.pool,
+                interval_ms=group_commit_interval_ms,
+                max_batch=group_commit_max_batch,
+                queue_size=write_queue_size
+            )
+            logger.info(
+                f"Групповая фиксация записи: до {group_commit_max_batch} операций "
+                f"или {group_commit_interval_ms} мс на транзакцию"
+            )
+        elif write_mode == WRITE_MODE_SYNC:
+            self.writer = None
+        else:
+            raise ValueError(f"Неизвестный режим записи: {write_mode}")
+
+        self.cache = NoteCache(cache_max_entries, cache_ttl) if cache_enabled else None
 
     def get_connection(self):
-        """Получение соединения с базой данных"""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Получение соединения из пула (используется как контекстный менеджер)"""
+        return self.pool.connection()
+
+    def check_connection(self):
+        """Проверка доступности базы: SELECT 1 на соединении из пула (исключение при ошибке)"""
+        with self.get_connection() as conn:
+            conn.execute('SELECT 1').fetchone()
+
+    def get_effective_settings(self):
+        """Фактические значения PRAGMA, прочитанные из соединения"""
+        settings = {}
+        with self.get_connection() as conn:
+            for name in self.pragmas:
+                row = conn.execute(f'PRAGMA {name}').fetchone()
+                settings[name] = row[0] if row else None
+        return settings
+
+    def log_effective_settings(self):
+        """Запись в лог действующего профиля производительности"""
+        try:
+            settings = self.get_effective_settings()
+            logger.info(
+                "Профиль SQLite: " + ", ".join(f"{k}={v}" for k, v in settings.items())
+            )
+            if str(settings.get('journal_mode', '')).upper() != str(self.pragmas.get('journal_mode', '')).upper():
+                logger.warning(
+                    f"journal_mode={self.pragmas.get('journal_mode')} не применен "
+                    f"(фактически {settings.get('journal_mode')})"
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось прочитать настройки SQLite: {e}")
+
+    def submit_write(self, op, on_commit=None):
+        """Выполнение операции записи op(cursor), возвращает Future
+
+        В режиме групповой фиксации операция ставится в очередь потока
+        записи, иначе выполняется сразу в отдельной транзакции. on_commit()
+        вызывается после фиксации, до того как Future получит результат.
+        """
+        if self.writer is not None:
+            return self.writer.submit(op, on_commit)
+
+        future = Future()
+        try:
+            with self.get_connection() as conn:
+                (result, error), = run_in_transaction(conn, [op])
+        except Exception as e:
+            future.set_exception(e)
+            return future
+
+        if on_commit is not None:
+            on_commit()
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        return future
+
+    def _read_through(self, user_id, key, load):
+        """Чтение через кэш: при промахе вызывается load() и результат кэшируется"""
+        if self.cache is None:
+            return load()
+
+        value = self.cache.get(user_id, key)
+        if value is not MISS:
+            return value
+
+        generation = self.cache.generation(user_id)
+        value = load()
+        self.cache.set(user_id, key, value, generation)
+        return value
+
+    def invalidate_user_cache(self, user_id):
+        """Сброс кэша заметок пользователя (для записей в обход Database)"""
+        if self.cache is not None:
+            self.cache.invalidate_user(user_id)
+
+    def get_cache_stats(self):
+        """Статистика кэша заметок (None, если кэш выключен)"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def get_pool_stats(self):
+        """Статистика пула соединений"""
+        return self.pool.stats()
+
+    def get_writer_stats(self):
+        """Статистика потока записи (None в синхронном режиме)"""
+        return self.writer.stats() if self.writer is not None else None
+
+    def close(self):
+        """Закрытие всех соединений с базой данных"""
+        if self.writer is not None:
+            self.writer.close()
+        self.pool.close()
 
     def init_database(self):
         """Инициализация таблиц базы данных"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
 
-            # Таблица пользователей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                # Таблица пользователей
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        user_id INTEGER PRIMARY KEY,
+                        username TEXT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+
+                # Таблица заметок с составным ключом
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS notes (
+                        user_id INTEGER NOT NULL,
+                        note_local_id INTEGER NOT NULL,
+                        title TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        tags TEXT,
+                        category TEXT DEFAULT 'general',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, note_local_id)
+                    )
+                ''')
+
+                # Удаляем старый индекс если он есть и создаем новый
+                cursor.execute('DROP INDEX IF EXISTS idx_user_id')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_user_id ON notes(user_id)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_created_at ON notes(created_at)')
+                # Постраничный просмотр по категории - один проход по диапазону индекса
+                cursor.execute(
+                    'CREATE INDEX IF NOT EXISTS idx_notes_user_category '
+                    'ON notes(user_id, category, note_local_id)'
                 )
-            ''')
 
-            # Таблица заметок с составным ключом
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notes (
-                    user_id INTEGER NOT NULL,
-                    note_local_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    tags TEXT,
-                    category TEXT DEFAULT 'general',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, note_local_id)
-                )
-            ''')
+                # Счетчик локальных ID заметок: одна строка на пользователя,
+                # выдача ID - O(1) без MAX по заметкам пользователя
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS user_note_seq (
+                        user_id INTEGER PRIMARY KEY,
+                        last_local_id INTEGER NOT NULL
+                    )
+                ''')
+
+                # Заполняем счетчики для заметок, созданных до появления таблицы
+                cursor.execute('''
+                    INSERT OR IGNORE INTO user_note_seq (user_id, last_local_id)
+                    SELECT user_id, MAX(note_local_id)
+                    FROM notes
+                    GROUP BY user_id
+                ''')
+
+                conn.commit()
 
-            # Удаляем старый индекс если он есть и создаем новый
-            cursor.execute('DROP INDEX IF EXISTS idx_user_id')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_user_id ON notes(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_created_at ON notes(created_at)')
+                self.fts_enabled = self._init_search_index(cursor)
+                conn.commit()
 
-            conn.commit()
-            logger.info("База данных инициализирована успешно")
+                self._init_note_stats(cursor)
+                conn.commit()
+                logger.info("База данных инициализирована успешно")
 
         except Exception as e:
             logger.error(f"Ошибка инициализации БД: {e}")
             raise
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-    def add_or_update_user(self, user_id, username=None, first_name=None, last_name=None):
-        """Добавление или обновление информации о пользователе"""
+    def _init_search_index(self, cursor):
+        """Создание полнотекстового индекса FTS5 и триггеров синхронизации
+
+        Возвращает False, если SQLite собран без FTS5 - тогда поиск
+        работает через LIKE.
+        """
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+        )
+        index = cursor.fetchone()
+
+        # Индекс старых версий схемы без ключа владельца: MATCH в нем
+        # проходит по заметкам всех пользователей, пересоздаем
+        if index is not None and 'user_key' not in index['sql']:
+            for trigger in ('notes_fts_ai', 'notes_fts_ad', 'notes_fts_au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute('DROP TABLE notes_fts')
+            index = None
+            logger.info("Полнотекстовый индекс заметок будет перестроен с ключом пользователя")
+
+        # Источник индекса - заметки с ключом владельца 'u<user_id>'. Ключ
+        # индексируется, поэтому условие user_key : u<id> отбирает заметки
+        # пользователя по самому индексу, до ранжирования
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS notes_fts_source AS
+            SELECT rowid AS note_rowid, title, content, 'u' || user_id AS user_key
+            FROM notes
+        ''')
+
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            # unicode61 приводит к нижнему регистру и кириллицу ("Работа" = "работа"),
+            # префиксные индексы ускоряют запросы вида "работ*"
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                    title,
+                    content,
+                    user_key,
+                    content='notes_fts_source',
+                    content_rowid='note_rowid',
+                    tokenize='unicode61 remove_diacritics 0',
+                    prefix='2 3 4'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 недоступен, поиск будет работать через LIKE: {e}")
+            return False
+
+        # Флаг отложенной индексации для пакетной вставки: FTS5 сбрасывает
+        # буфер терминов на каждой точке сохранения, а тело триггера
+        # открывает ее на каждую строку. add_notes_bulk выключает
+        # триггер внутри своей транзакции и индексирует порцию одним INSERT
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notes_fts_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                deferred INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO notes_fts_state (id) VALUES (1)')
+
+        # Триггер вставки из старых версий схемы не учитывает флаг
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'notes_fts_ai'"
+        )
+        trigger = cursor.fetchone()
+        if trigger is not None and 'notes_fts_state' not in trigger['sql']:
+            cursor.execute('DROP TRIGGER notes_fts_ai')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes
+            WHEN (SELECT deferred FROM notes_fts_state) = 0
+            BEGIN
+                INSERT INTO notes_fts (rowid, title, content, user_key)
+                VALUES (new.rowid, new.title, new.content, 'u' || new.user_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content, user_key)
+                VALUES ('delete', old.rowid, old.title, old.content, 'u' || old.user_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF user_id, title, content ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content, user_key)
+                VALUES ('delete', old.rowid, old.title, old.content, 'u' || old.user_id);
+                INSERT INTO notes_fts (rowid, title, content, user_key)
+                VALUES (new.rowid, new.title, new.content, 'u' || new.user_id);
+            END
+        ''')
+
+        if index is None:
+            # Однократное заполнение индекса для уже существующих заметок
+            cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+            logger.info("Полнотекстовый индекс заметок построен")
+
+        return True
+
+    def rebuild_search_index(self):
+        """Полное перестроение полнотекстового индекса"""
+        if not self.fts_enabled:
+            return False
+        try:
+            with self.get_connection() as conn:
+                conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+                conn.commit()
+                logger.info("Полнотекстовый индекс заметок перестроен")
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка перестроения полнотекстового индекса: {e}")
+            return False
+
+    def _init_note_stats(self, cursor):
+        """Создание таблиц статистики заметок и поддерживающих их триггеров
+
+        user_note_stats - итоги по пользователю, user_note_category_stats -
+        разбивка по категориям. Статистика читается по первичному ключу
+        вместо COUNT(*) по заметкам. last_modified - MAX(updated_at)
+        заметок пользователя, как в пересчете _recompute_note_stats().
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_note_stats'"
+        )
+        stats_exist = cursor.fetchone() is not None
+
+        # Триггеры старых версий схемы ставили last_modified = CURRENT_TIMESTAMP
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'notes_stats_ai'"
+        )
+        trigger = cursor.fetchone()
+        stale_triggers = trigger is not None and 'updated_at' not in trigger['sql']
+        if stale_triggers:
+            for name in ('notes_stats_ai', 'notes_stats_ad', 'notes_stats_au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_note_stats (
+                user_id INTEGER PRIMARY KEY,
+                note_count INTEGER NOT NULL DEFAULT 0,
+                content_bytes INTEGER NOT NULL DEFAULT 0,
+                last_modified TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_note_category_stats (
+                user_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                note_count INTEGER NOT NULL DEFAULT 0,
+                content_bytes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, category)
+            )
+        ''')
+
+        # length(CAST(... AS BLOB)) - размер содержания в байтах UTF-8.
+        # last_modified: новая или измененная заметка сдвигает максимум
+        # updated_at (импорт сохраняет исходное время, поэтому max, а не
+        # присваивание). Максимум ищется по заметкам заново, только если
+        # удалена или сдвинута назад заметка, на которой он держался.
+        # Скалярный max() с NULL дает NULL - отсюда COALESCE
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_stats_ai AFTER INSERT ON notes BEGIN
+                INSERT INTO user_note_stats (user_id, note_count, content_bytes, last_modified)
+                VALUES (new.user_id, 1, length(CAST(new.content AS BLOB)), new.updated_at)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    note_count = note_count + 1,
+                    content_bytes = content_bytes + excluded.content_bytes,
+                    last_modified = COALESCE(
+                        max(last_modified, excluded.last_modified), last_modified, excluded.last_modified
+                    );
+
+                INSERT INTO user_note_category_stats (user_id, category, note_count, content_bytes)
+                VALUES (new.user_id, COALESCE(new.category, ''), 1, length(CAST(new.content AS BLOB)))
+                ON CONFLICT(user_id, category) DO UPDATE SET
+                    note_count = note_count + 1,
+                    content_bytes = content_bytes + excluded.content_bytes;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_stats_ad AFTER DELETE ON notes BEGIN
+                UPDATE user_note_stats SET
+                    note_count = note_count - 1,
+                    content_bytes = content_bytes - length(CAST(old.content AS BLOB)),
+                    last_modified = CASE
+                        WHEN old.updated_at < last_modified THEN last_modified
+                        ELSE (SELECT MAX(updated_at) FROM notes WHERE user_id = old.user_id)
+                    END
+                WHERE user_id = old.user_id;
+
+                UPDATE user_note_category_stats SET
+                    note_count = note_count - 1,
+                    content_bytes = content_bytes - length(CAST(old.content AS BLOB))
+                WHERE user_id = old.user_id AND category = COALESCE(old.category, '');
+
+                DELETE FROM user_note_category_stats
+                WHERE user_id = old.user_id AND category = COALESCE(old.category, '')
+                AND note_count <= 0;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_stats_au AFTER UPDATE ON notes BEGIN
+                UPDATE user_note_stats SET
+                    content_bytes = content_bytes
+                        - length(CAST(old.content AS BLOB))
+                        + length(CAST(new.content AS BLOB)),
+                    last_modified = CASE
+                        WHEN new.updated_at >= old.updated_at OR old.updated_at < last_modified
+                        THEN COALESCE(max(last_modified, new.updated_at), last_modified, new.updated_at)
+                        ELSE (SELECT MAX(updated_at) FROM notes WHERE user_id = new.user_id)
+                    END
+                WHERE user_id = new.user_id;
+
+                UPDATE user_note_category_stats SET
+                    note_count = note_count - 1,
+                    content_bytes = content_bytes - length(CAST(old.content AS BLOB))
+                WHERE user_id = old.user_id AND category = COALESCE(old.category, '');
+
+                DELETE FROM user_note_category_stats
+                WHERE user_id = old.user_id AND category = COALESCE(old.category, '')
+                AND note_count <= 0;
+
+                INSERT INTO user_note_category_stats (user_id, category, note_count, content_bytes)
+                VALUES (new.user_id, COALESCE(new.category, ''), 1, length(CAST(new.content AS BLOB)))
+                ON CONFLICT(user_id, category) DO UPDATE SET
+                    note_count = note_count + 1,
+                    content_bytes = content_bytes + excluded.content_bytes;
+            END
+        ''')
+
+        if not stats_exist or stale_triggers:
+            # Однократное заполнение для уже существующих заметок
+            self._recompute_note_stats(cursor)
+            logger.info("Статистика заметок построена")
+
+    def _recompute_note_stats(self, cursor):
+        """Пересчет таблиц статистики по таблице заметок"""
+        cursor.execute('DELETE FROM user_note_stats')
+        cursor.execute('DELETE FROM user_note_category_stats')
+        cursor.execute('''
+            INSERT INTO user_note_stats (user_id, note_count, content_bytes, last_modified)
+            SELECT user_id, COUNT(*), COALESCE(SUM(length(CAST(content AS BLOB))), 0),
+                   MAX(updated_at)
+            FROM notes
+            GROUP BY user_id
+        ''')
+        cursor.execute('''
+            INSERT INTO user_note_category_stats (user_id, category, note_count, content_bytes)
+            SELECT user_id, COALESCE(category, ''), COUNT(*),
+                   COALESCE(SUM(length(CAST(content AS BLOB))), 0)
+            FROM notes
+            GROUP BY user_id, COALESCE(category, '')
+        ''')
+
+    def rebuild_note_stats(self):
+        """Пересчет статистики заметок с нуля с проверкой согласованности
+
+        Возвращает словарь: users - число пользователей со статистикой,
+        mismatches - список (user_id, category) с расхождениями до пересчета
+        (category None - расхождение в итогах пользователя, включая
+        last_modified).
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+
+                cursor.execute('''
+                    SELECT user_id, note_count, content_bytes, last_modified
+                    FROM user_note_stats
+                ''')
+                stored_totals = {row['user_id']: (row['note_count'], row['content_bytes'], row['last_modified'])
+                                 for row in cursor.fetchall()}
+                cursor.execute('''
+                    SELECT user_id, category, note_count, content_bytes
+                    FROM user_note_category_stats
+                ''')
+                stored_categories = {(row['user_id'], row['category']): (row['note_count'], row['content_bytes'])
+                                     for row in cursor.fetchall()}
+
+                self._recompute_note_stats(cursor)
+
+                cursor.execute('SELECT user_id, note_count, content_bytes, last_modified FROM user_note_stats')
+                actual_totals = {row['user_id']: (row['note_count'], row['content_bytes'], row['last_modified'])
+                                 for row in cursor.fetchall()}
+                cursor.execute('''
+                    SELECT user_id, category, note_count, content_bytes
+                    FROM user_note_category_stats
+                ''')
+                actual_categories = {(row['user_id'], row['category']): (row['note_count'], row['content_bytes'])
+                                     for row in cursor.fetchall()}
+
+                conn.commit()
 
+        except Exception as e:
+            logger.error(f"Ошибка пересчета статистики заметок: {e}")
+            return None
+
+        # Пользователь без заметок может остаться с нулевой строкой итогов
+        mismatches = [
+            (user_id, None)
+            for user_id in stored_totals.keys() | actual_totals.keys()
+            if stored_totals.get(user_id, (0, 0, None)) != actual_totals.get(user_id, (0, 0, None))
+        ]
+        mismatches += [
+            key
+            for key in stored_categories.keys() | actual_categories.keys()
+            if stored_categories.get(key) != actual_categories.get(key)
+        ]
+
+        if self.cache is not None:
+            self.cache.clear()
+
+        if mismatches:
+            logger.warning(f"Статистика заметок пересчитана, расхождений: {len(mismatches)}")
+        else:
+            logger.info("Статистика заметок пересчитана, расхождений нет")
+
+        return {'users': len(actual_totals), 'mismatches': sorted(mismatches, key=str)}
+
+    def add_or_update_user_future(self, user_id, username=None, first_name=None, last_name=None):
+        """Добавление или обновление пользователя, возвращает Future"""
+        def op(cursor):
             cursor.execute('''
                 INSERT OR REPLACE INTO users 
                 (user_id, username, first_name, last_name, updated_at)
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
             ''', (user_id, username, first_name, last_name))
 
-            conn.commit()
             logger.info(f"Пользователь {user_id} обновлен в БД")
             return True
 
+        return self.submit_write(op)
+
+    def add_or_update_user(self, user_id, username=None, first_name=None, last_name=None):
+        """Добавление или обновление информации о пользователе"""
+        try:
+            return self.add_or_update_user_future(user_id, username, first_name, last_name).result()
+
         except Exception as e:
             logger.error(f"Ошибка добавления пользователя {user_id}: {e}")
             return False
-        finally:
-            if 'conn' in locals():
-                conn.close()
+
+    def _allocate_local_ids(self, cursor, user_id, count=1):
+        """Резервирование count локальных ID в текущей транзакции
+
+        Возвращает первый зарезервированный ID. Должен вызываться внутри
+        транзакции, открытой через BEGIN IMMEDIATE, чтобы конкурентные
+        вставки одного пользователя не получили одинаковые ID.
+        """
+        cursor.execute('''
+            INSERT INTO user_note_seq (user_id, last_local_id)
+            VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE
+            SET last_local_id = last_local_id + excluded.last_local_id
+        ''', (user_id, count))
+
+        cursor.execute(
+            'SELECT last_local_id FROM user_note_seq WHERE user_id = ?',
+            (user_id,)
+        )
+        return cursor.fetchone()['last_local_id'] - count + 1
 
     def get_next_local_id(self, user_id):
-        """Получение следующего локального ID для пользователя"""
+        """Получение следующего локального ID для пользователя (без резервирования)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
 
-            cursor.execute('''
-                SELECT COALESCE(MAX(note_local_id), 0) as max_id 
-                FROM notes 
-                WHERE user_id = ?
-            ''', (user_id,))
+                cursor.execute('''
+                    SELECT last_local_id
+                    FROM user_note_seq
+                    WHERE user_id = ?
+                ''', (user_id,))
 
-            result = cursor.fetchone()
-            max_id = result['max_id'] if result else 0
+                result = cursor.fetchone()
+                last_id = result['last_local_id'] if result else 0
 
-            return max_id + 1
+                return last_id + 1
 
         except Exception as e:
             logger.error(f"Ошибка получения следующего ID для пользователя {user_id}: {e}")
             return 1
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-    def add_note(self, user_id, title, content, tags=None, category='general'):
-        """Добавление новой заметки с локальным ID"""
-        try:
-            # Сначала добавляем/обновляем пользователя
-            self.add_or_update_user(user_id)
+    def add_note_future(self, user_id, title, content, tags=None, category='general'):
+        """Добавление новой заметки, возвращает Future с локальным ID
 
-            # Получаем следующий локальный ID
-            note_local_id = self.get_next_local_id(user_id)
+        Пользователь, выделение ID и сама заметка записываются одной
+        транзакцией - один commit на заметку (или на пачку в режиме
+        групповой фиксации).
+        """
+        tags_json = json.dumps(tags) if tags else None
 
-            conn = self.get_connection()
-            cursor = conn.cursor()
+        def op(cursor):
+            # Пользователь нужен для внешних связей, но его данные не трогаем
+            cursor.execute(
+                'INSERT OR IGNORE INTO users (user_id) VALUES (?)',
+                (user_id,)
+            )
 
-            tags_json = json.dumps(tags) if tags else None
+            note_local_id = self._allocate_local_ids(cursor, user_id)
 
             cursor.execute('''
                 INSERT INTO notes 
@@ -134,226 +914,435 @@ class Database:
                 VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
             ''', (user_id, note_local_id, title, content, tags_json, category))
 
-            conn.commit()
-
             logger.info(f"Заметка добавлена: user={user_id}, local_id={note_local_id}")
             return note_local_id  # Возвращаем локальный ID
 
+        return self.submit_write(op, on_commit=lambda: self.invalidate_user_cache(user_id))
+
+    def add_note(self, user_id, title, content, tags=None, category='general'):
+        """Добавление новой заметки с локальным ID"""
+        try:
+            return self.add_note_future(user_id, title, content, tags, category).result()
+
         except Exception as e:
             logger.error(f"Ошибка добавления заметки: {e}")
             return None
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-    def get_user_notes(self, user_id, limit=50, offset=0, category=None):
-        """Получение списка заметок пользователя"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+    def add_notes_bulk_future(self, user_id, notes):
+        """Пакетное добавление заметок, возвращает Future с range локальных ID
 
-            query = '''
-                SELECT user_id, note_local_id, title, content, tags, category,
-                       created_at, updated_at
-                FROM notes 
-                WHERE user_id = ?
-            '''
-            params = [user_id]
+        notes - последовательность словарей с ключами title и content и
+        необязательными tags, category, created_at, updated_at (метки
+        времени сохраняются, если заданы - например, при импорте).
+        Локальные ID резервируются одним обновлением счетчика, строки
+        вставляются одним executemany в одной транзакции, полнотекстовый
+        индекс пополняется одним запросом на всю порцию.
+        """
+        notes = list(notes)
 
-            if category:
-                query += ' AND category = ?'
-                params.append(category)
+        def op(cursor):
+            if not notes:
+                return range(0)
 
-            query += ' ORDER BY note_local_id DESC LIMIT ? OFFSET ?'
-            params.extend([limit, offset])
+            cursor.execute(
+                'INSERT OR IGNORE INTO users (user_id) VALUES (?)',
+                (user_id,)
+            )
 
-            cursor.execute(query, params)
-            notes = cursor.fetchall()
+            first_id = self._allocate_local_ids(cursor, user_id, len(notes))
+            last_id = first_id + len(notes) - 1
 
-            # Преобразуем в словари и добавляем поле id (это будет note_local_id)
-            result = []
-            for note in notes:
-                note_dict = dict(note)
-                # Для совместимости со старым кодом добавляем поле id
-                note_dict['id'] = note_dict['note_local_id']
-                result.append(note_dict)
+            if self.fts_enabled:
+                cursor.execute('UPDATE notes_fts_state SET deferred = 1')
 
-            return result
+            cursor.executemany('''
+                INSERT INTO notes
+                (user_id, note_local_id, title, content, tags, category, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?,
+                        COALESCE(?, CURRENT_TIMESTAMP),
+                        COALESCE(?, ?, CURRENT_TIMESTAMP))
+            ''', (
+                (
+                    user_id,
+                    first_id + i,
+                    note['title'],
+                    note['content'],
+                    json.dumps(note['tags']) if note.get('tags') else None,
+                    note.get('category') or 'general',
+                    note.get('created_at'),
+                    note.get('updated_at'),
+                    note.get('created_at'),
+                )
+                for i, note in enumerate(notes)
+            ))
 
-        except Exception as e:
-            logger.error(f"Ошибка получения заметок пользователя {user_id}: {e}")
-            return []
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            if self.fts_enabled:
+                # Индексируем всю порцию одним запросом
+                cursor.execute('''
+                    INSERT INTO notes_fts (rowid, title, content, user_key)
+                    SELECT rowid, title, content, 'u' || user_id
+                    FROM notes
+                    WHERE user_id = ? AND note_local_id BETWEEN ? AND ?
+                ''', (user_id, first_id, last_id))
+                cursor.execute('UPDATE notes_fts_state SET deferred = 0')
 
-    def get_note_by_id(self, user_id, note_local_id):
-        """Получение конкретной заметки по локальному ID"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            logger.info(f"Заметки добавлены пакетом: user={user_id}, local_id={first_id}..{last_id}")
+            return range(first_id, last_id + 1)
 
-            cursor.execute('''
-                SELECT user_id, note_local_id, title, content, tags, category,
-                       created_at, updated_at
-                FROM notes 
-                WHERE user_id = ? AND note_local_id = ?
-            ''', (user_id, note_local_id))
+        return self.submit_write(op, on_commit=lambda: self.invalidate_user_cache(user_id))
 
-            note = cursor.fetchone()
-            if note:
-                note_dict = dict(note)
-                note_dict['id'] = note_dict['note_local_id']  # Для совместимости
-                return note_dict
-            return None
+    def add_notes_bulk(self, user_id, notes):
+        """Пакетное добавление заметок, возвращает range локальных ID или None"""
+        try:
+            return self.add_notes_bulk_future(user_id, notes).result()
 
         except Exception as e:
-            logger.error(f"Ошибка получения заметки {note_local_id}: {e}")
+            logger.error(f"Ошибка пакетного добавления заметок: {e}")
             return None
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-    def search_notes(self, user_id, search_text, search_in_content=True):
-        """Поиск заметок по тексту"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            search_pattern = f'%{search_text}%'
+    def get_user_notes(self, user_id, limit=50, offset=0, category=None):
+        """Получение списка заметок пользователя"""
+        def load():
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = note_row_factory
 
-            if search_in_content:
                 query = '''
                     SELECT user_id, note_local_id, title, content, tags, category,
                            created_at, updated_at
                     FROM notes 
-                    WHERE user_id = ? 
-                    AND (title LIKE ? OR content LIKE ?)
-                    ORDER BY note_local_id DESC
+                    WHERE user_id = ?
                 '''
-                cursor.execute(query, (user_id, search_pattern, search_pattern))
-            else:
+                params = [user_id]
+
+                if category:
+                    query += ' AND category = ?'
+                    params.append(category)
+
+                query += ' ORDER BY note_local_id DESC LIMIT ? OFFSET ?'
+                params.extend([limit, offset])
+
+                cursor.execute(query, params)
+                return cursor.fetchall()
+
+        try:
+            return self._read_through(user_id, ('list', limit, offset, category), load)
+
+        except Exception as e:
+            logger.error(f"Ошибка получения заметок пользователя {user_id}: {e}")
+            return []
+
+    def get_user_notes_page(self, user_id, page_size=10, after_local_id=None,
+                            before_local_id=None, category=None):
+        """Страница заметок пользователя с курсорной (keyset) пагинацией
+
+        Заметки идут от новых к старым. after_local_id - следующая страница
+        (заметки старше курсора), before_local_id - предыдущая (новее
+        курсора). Каждая страница - один проход по диапазону индекса,
+        независимо от глубины листания.
+
+        Возвращает словарь с ключами notes, next_cursor и prev_cursor;
+        курсор равен None, если в этом направлении заметок больше нет.
+        """
+        backward = before_local_id is not None
+
+        def load():
+            page = {'notes': [], 'next_cursor': None, 'prev_cursor': None}
+
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = note_row_factory
+
                 query = '''
                     SELECT user_id, note_local_id, title, content, tags, category,
                            created_at, updated_at
                     FROM notes 
-                    WHERE user_id = ? AND title LIKE ?
-                    ORDER BY note_local_id DESC
+                    WHERE user_id = ?
                 '''
-                cursor.execute(query, (user_id, search_pattern))
+                params = [user_id]
+
+                if category:
+                    query += ' AND category = ?'
+                    params.append(category)
+
+                if backward:
+                    query += ' AND note_local_id > ? ORDER BY note_local_id ASC'
+                    params.append(before_local_id)
+                else:
+                    if after_local_id is not None:
+                        query += ' AND note_local_id < ?'
+                        params.append(after_local_id)
+                    query += ' ORDER BY note_local_id DESC'
+
+                # Берем на одну запись больше, чтобы узнать, есть ли еще страница
+                query += ' LIMIT ?'
+                params.append(page_size + 1)
+
+                cursor.execute(query, params)
+                notes = cursor.fetchall()
+
+                has_more = len(notes) > page_size
+                notes = notes[:page_size]
+                if backward:
+                    notes.reverse()
+
+                page['notes'] = notes
+
+                if page['notes']:
+                    first_id = page['notes'][0]['id']
+                    last_id = page['notes'][-1]['id']
+                    if backward:
+                        page['next_cursor'] = last_id
+                        page['prev_cursor'] = first_id if has_more else None
+                    else:
+                        page['next_cursor'] = last_id if has_more else None
+                        page['prev_cursor'] = first_id if after_local_id is not None else None
+
+                return page
+
+        try:
+            return self._read_through(
+                user_id, ('page', page_size, after_local_id, before_local_id, category), load
+            )
+
+        except Exception as e:
+            logger.error(f"Ошибка получения страницы заметок пользователя {user_id}: {e}")
+            return {'notes': [], 'next_cursor': None, 'prev_cursor': None}
+
+    def get_note_by_id(self, user_id, note_local_id):
+        """Получение конкретной заметки по локальному ID"""
+        def load():
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = note_row_factory
+
+                cursor.execute('''
+                    SELECT user_id, note_local_id, title, content, tags, category,
+                           created_at, updated_at
+                    FROM notes 
+                    WHERE user_id = ? AND note_local_id = ?
+                ''', (user_id, note_local_id))
+
+                return cursor.fetchone()
 
-            notes = cursor.fetchall()
+        try:
+            return self._read_through(user_id, ('note', note_local_id), load)
 
-            # Преобразуем и добавляем поле id
-            result = []
-            for note in notes:
-                note_dict = dict(note)
-                note_dict['id'] = note_dict['note_local_id']
-                result.append(note_dict)
+        except Exception as e:
+            logger.error(f"Ошибка получения заметки {note_local_id}: {e}")
+            return None
 
-            return result
+    def search_notes(self, user_id, search_text, search_in_content=True):
+        """Поиск заметок по тексту
+
+        Использует полнотекстовый индекс с ранжированием bm25 (совпадения в
+        заголовке весят больше) и добавляет к каждой заметке поле
+        'snippet' - фрагмент содержания с выделенными совпадениями.
+        """
+        fts_query = build_fts_query(search_text) if self.fts_enabled else None
+        if not fts_query:
+            return self._search_notes_like(user_id, search_text, search_in_content)
+
+        if not search_in_content:
+            fts_query = f'title : ({fts_query})'
+        # Сначала отбор по владельцу: без него MATCH и bm25 проходят по
+        # совпадениям всех пользователей
+        fts_query = f'user_key : u{int(user_id)} AND ({fts_query})'
+
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = note_row_factory
+
+                cursor.execute('''
+                    SELECT n.user_id, n.note_local_id, n.title, n.content, n.tags, n.category,
+                           n.created_at, n.updated_at,
+                           snippet(notes_fts, 1, '«', '»', '…', 12) AS snippet
+                    FROM notes_fts
+                    JOIN notes n ON n.rowid = notes_fts.rowid
+                    WHERE notes_fts MATCH ? AND n.user_id = ?
+                    ORDER BY bm25(notes_fts, 10.0, 1.0, 0.0), n.note_local_id DESC
+                ''', (fts_query, user_id))
+
+                return cursor.fetchall()
 
         except Exception as e:
             logger.error(f"Ошибка поиска заметок: {e}")
             return []
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-    def update_note(self, user_id, note_local_id, title=None, content=None, tags=None, category=None):
-        """Обновление заметки"""
+    def _search_notes_like(self, user_id, search_text, search_in_content=True):
+        """Поиск заметок через LIKE (запасной вариант без FTS5)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = note_row_factory
+
+                search_pattern = f'%{search_text}%'
+
+                if search_in_content:
+                    query = '''
+                        SELECT user_id, note_local_id, title, content, tags, category,
+                               created_at, updated_at
+                        FROM notes 
+                        WHERE user_id = ? 
+                        AND (title LIKE ? OR content LIKE ?)
+                        ORDER BY note_local_id DESC
+                    '''
+                    cursor.execute(query, (user_id, search_pattern, search_pattern))
+                else:
+                    query = '''
+                        SELECT user_id, note_local_id, title, content, tags, category,
+                               created_at, updated_at
+                        FROM notes 
+                        WHERE user_id = ? AND title LIKE ?
+                        ORDER BY note_local_id DESC
+                    '''
+                    cursor.execute(query, (user_id, search_pattern))
+
+                return cursor.fetchall()
 
-            # Получаем текущие данные заметки
-            current_note = self.get_note_by_id(user_id, note_local_id)
-            if not current_note:
-                return False
+        except Exception as e:
+            logger.error(f"Ошибка поиска заметок: {e}")
+            return []
 
-            # Обновляем только переданные поля
-            new_title = title if title is not None else current_note['title']
-            new_content = content if content is not None else current_note['content']
-            new_tags = json.dumps(tags) if tags is not None else current_note['tags']
-            new_category = category if category is not None else current_note['category']
+    def update_note_future(self, user_id, note_local_id, title=None, content=None, tags=None, category=None):
+        """Обновление заметки, возвращает Future с признаком успеха"""
+        # Обновляем только переданные поля одним запросом, без
+        # повторного чтения заметки через второе соединение пула
+        new_tags = json.dumps(tags) if tags is not None else None
 
+        def op(cursor):
             cursor.execute('''
                 UPDATE notes 
-                SET title = ?, content = ?, tags = ?, category = ?, updated_at = CURRENT_TIMESTAMP
+                SET title = COALESCE(?, title),
+                    content = COALESCE(?, content),
+                    tags = COALESCE(?, tags),
+                    category = COALESCE(?, category),
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE user_id = ? AND note_local_id = ?
-            ''', (new_title, new_content, new_tags, new_category, user_id, note_local_id))
+            ''', (title, content, new_tags, category, user_id, note_local_id))
+
+            updated = cursor.rowcount > 0
+            if updated:
+                logger.info(f"Заметка {note_local_id} пользователя {user_id} обновлена")
+            return updated
 
-            conn.commit()
-            logger.info(f"Заметка {note_local_id} пользователя {user_id} обновлена")
-            return cursor.rowcount > 0
+        return self.submit_write(op, on_commit=lambda: self.invalidate_user_cache(user_id))
+
+    def update_note(self, user_id, note_local_id, title=None, content=None, tags=None, category=None):
+        """Обновление заметки"""
+        try:
+            return self.update_note_future(
+                user_id, note_local_id, title, content, tags, category
+            ).result()
 
         except Exception as e:
             logger.error(f"Ошибка обновления заметки {note_local_id}: {e}")
             return False
-        finally:
-            if 'conn' in locals():
-                conn.close()
-
-    def delete_note(self, user_id, note_local_id):
-        """Удаление заметки"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
 
+    def delete_note_future(self, user_id, note_local_id):
+        """Удаление заметки, возвращает Future с признаком успеха"""
+        def op(cursor):
             cursor.execute('''
                 DELETE FROM notes 
                 WHERE user_id = ? AND note_local_id = ?
             ''', (user_id, note_local_id))
 
-            conn.commit()
             deleted = cursor.rowcount > 0
-
             if deleted:
                 logger.info(f"Заметка {note_local_id} пользователя {user_id} удалена")
-
             return deleted
 
+        return self.submit_write(op, on_commit=lambda: self.invalidate_user_cache(user_id))
+
+    def delete_note(self, user_id, note_local_id):
+        """Удаление заметки"""
+        try:
+            return self.delete_note_future(user_id, note_local_id).result()
+
         except Exception as e:
             logger.error(f"Ошибка удаления заметки {note_local_id}: {e}")
             return False
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
     def get_notes_count(self, user_id, category=None):
         """Получение количества заметок пользователя"""
+        def load():
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+
+                # Счетчики поддерживаются триггерами - чтение по первичному ключу
+                if category:
+                    cursor.execute('''
+                        SELECT note_count as count 
+                        FROM user_note_category_stats 
+                        WHERE user_id = ? AND category = ?
+                    ''', (user_id, category))
+                else:
+                    cursor.execute('''
+                        SELECT note_count as count 
+                        FROM user_note_stats 
+                        WHERE user_id = ?
+                    ''', (user_id,))
+
+                result = cursor.fetchone()
+                return result['count'] if result else 0
+
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            return self._read_through(user_id, ('count', category), load)
+
+        except Exception as e:
+            logger.error(f"Ошибка получения количества заметок: {e}")
+            return 0
+
+    def get_note_stats(self, user_id):
+        """Статистика заметок пользователя
+
+        Возвращает словарь: total, content_bytes, last_modified и categories
+        (категория -> количество заметок, по убыванию количества).
+        """
+        def load():
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
 
-            if category:
-                cursor.execute('''
-                    SELECT COUNT(*) as count 
-                    FROM notes 
-                    WHERE user_id = ? AND category = ?
-                ''', (user_id, category))
-            else:
                 cursor.execute('''
-                    SELECT COUNT(*) as count 
-                    FROM notes 
+                    SELECT note_count, content_bytes, last_modified
+                    FROM user_note_stats
                     WHERE user_id = ?
                 ''', (user_id,))
+                totals = cursor.fetchone()
 
-            result = cursor.fetchone()
-            return result['count'] if result else 0
+                cursor.execute('''
+                    SELECT category, note_count
+                    FROM user_note_category_stats
+                    WHERE user_id = ? AND note_count > 0
+                    ORDER BY note_count DESC, category
+                ''', (user_id,))
+                categories = {row['category']: row['note_count'] for row in cursor.fetchall()}
 
-        except Exception as e:
-            logger.error(f"Ошибка получения количества заметок: {e}")
-            return 0
-        finally:
-            if 'conn' in locals():
-                conn.close()
+                return {
+                    'total': totals['note_count'] if totals else 0,
+                    'content_bytes': totals['content_bytes'] if totals else 0,
+                    'last_modified': totals['last_modified'] if totals else None,
+                    'categories': categories,
+                }
 
-    def get_all_user_notes(self, user_id):
-        """Получение всех заметок пользователя (для экспорта)"""
         try:
-            conn = self.get_connection()
+            return self._read_through(user_id, ('stats',), load)
+
+        except Exception as e:
+            logger.error(f"Ошибка получения статистики заметок пользователя {user_id}: {e}")
+            return {'total': 0, 'content_bytes': 0, 'last_modified': None, 'categories': {}}
+
+    def iter_user_notes(self, user_id, chunk_size=500):
+        """Потоковое чтение всех заметок пользователя (для экспорта)
+
+        Генератор читает заметки порциями по chunk_size через fetchmany,
+        поэтому в памяти одновременно находится не больше одной порции.
+        Соединение занято, пока генератор не исчерпан или не закрыт.
+        """
+        with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = note_row_factory
 
             cursor.execute('''
                 SELECT user_id, note_local_id, title, content, tags, category,
@@ -363,20 +1352,40 @@ class Database:
                 ORDER BY note_local_id
             ''', (user_id,))
 
-            notes = cursor.fetchall()
-
-            # Преобразуем и добавляем поле id
-            result = []
-            for note in notes:
-                note_dict = dict(note)
-                note_dict['id'] = note_dict['note_local_id']
-                result.append(note_dict)
+            while True:
+                notes = cursor.fetchmany(chunk_size)
+                if not notes:
+                    break
+                yield from notes
 
-            return result
+    def get_all_user_notes(self, user_id):
+        """Получение всех заметок пользователя списком"""
+        try:
+            return list(self.iter_user_notes(user_id))
 
         except Exception as e:
             logger.error(f"Ошибка получения всех заметок пользователя {user_id}: {e}")
             return []
-        finally:
-            if 'conn' in locals():
-                conn.close()
\ No newline at end of file
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных заметок")
+    parser.add_argument('command', choices=['rebuild-stats'])
+    parser.add_argument('--db', default='notes.db', help="Файл базы данных")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    db = Database(args.db)
+    try:
+        if args.command == 'rebuild-stats':
+            report = db.rebuild_note_stats()
+            if report is None:
+                raise SystemExit(1)
+            print(f"Пользователей: {report['users']}, расхождений: {len(report['mismatches'])}")
+            for user_id, category in report['mismatches']:
+                print(f"  user_id={user_id} category={category if category is not None else '(итого)'}")
+    finally:
+        db.close()
@@ -0,0 +1,194 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.database.writer')
+
+# Режимы записи в базу данных
+WRITE_MODE_SYNC = 'sync'
+WRITE_MODE_GROUP = 'group'
+
+
+class WriteQueueFullError(sqlite3.OperationalError):
+    """Очередь записи переполнена"""
+
+
+class WriterClosedError(sqlite3.OperationalError):
+    """Поток записи остановлен"""
+
+
+def run_in_transaction(conn, operations):
+    """Выполнение операций записи в одной транзакции
+
+    Каждая операция - функция op(cursor) -> результат, выполняется внутри
+    своей точки сохранения: ошибка одной операции откатывает только ее, а
+    остальные фиксируются общим commit. Возвращает список пар
+    (результат, исключение) в порядке операций.
+    """
+    cursor = conn.cursor()
+    outcomes = []
+
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for op in operations:
+            cursor.execute('SAVEPOINT write_op')
+            try:
+                outcomes.append((op(cursor), None))
+                cursor.execute('RELEASE write_op')
+            except Exception as e:
+                cursor.execute('ROLLBACK TO write_op')
+                cursor.execute('RELEASE write_op')
+                outcomes.append((None, e))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return outcomes
+
+
+class GroupCommitWriter:
+    """Выделенный поток записи с групповой фиксацией транзакций
+
+    Операции из всех потоков-обработчиков складываются в ограниченную
+    очередь; поток записи собирает их в пачки (до max_batch операций или
+    interval_ms миллисекунд ожидания) и фиксирует каждую пачку одним
+    commit. Так число fsync и захватов блокировки записи SQLite растет с
+    числом пачек, а не операций.
+    """
+
+    def __init__(self, pool, interval_ms=5, max_batch=100, queue_size=1000,
+                 submit_timeout=5.0):
+        self.pool = pool
+        self.interval = interval_ms / 1000
+        self.max_batch = max(1, int(max_batch))
+        self.submit_timeout = submit_timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = object()
+        self._lock = threading.Lock()
+        # Проверка _closed и постановка в очередь идут под одной
+        # блокировкой: после сигнала остановки операции в очередь не попадают
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._stopping = False
+        self._stats = {
+            'batches': 0,
+            'operations': 0,
+            'failed_operations': 0,
+            'commit_errors': 0,
+            'max_batch': 0,
+            'commit_time_total': 0.0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, op, on_commit=None):
+        """Постановка операции в очередь, возвращает Future с ее результатом
+
+        on_commit() вызывается после фиксации пачки, до того как Future
+        получит результат. После close() Future сразу завершается
+        ошибкой WriterClosedError.
+        """
+        future = Future()
+        with self._submit_lock:
+            if self._closed:
+                future.set_exception(WriterClosedError("Поток записи остановлен"))
+                return future
+            try:
+                self._queue.put((op, future, on_commit), timeout=self.submit_timeout)
+            except queue.Full:
+                future.set_exception(WriteQueueFullError(
+                    f"Очередь записи переполнена ({self._queue.maxsize} операций)"
+                ))
+        return future
+
+    def _collect_batch(self, first):
+        """Сбор пачки: ждем новые операции не дольше interval"""
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._stop:
+                # Завершаемся после этой пачки; вернуть сигнал в очередь
+                # нельзя - она ограничена и поток записи сам ее разбирает
+                self._stopping = True
+                break
+            batch.append(item)
+
+        return batch
+
+    def _commit_batch(self, batch):
+        """Фиксация пачки и передача результатов в Future"""
+        start = time.monotonic()
+        try:
+            with self.pool.connection() as conn:
+                outcomes = run_in_transaction(conn, [op for op, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Ошибка фиксации пачки из {len(batch)} операций: {e}")
+            with self._lock:
+                self._stats['commit_errors'] += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        elapsed = time.monotonic() - start
+        failed = 0
+        for (_, future, on_commit), (result, error) in zip(batch, outcomes):
+            if on_commit is not None:
+                try:
+                    on_commit()
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика фиксации: {e}")
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['operations'] += len(batch)
+            self._stats['failed_operations'] += failed
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['commit_time_total'] += elapsed
+
+    def _run(self):
+        """Основной цикл потока записи"""
+        while not self._stopping:
+            item = self._queue.get()
+            if item is self._stop:
+                break
+            self._commit_batch(self._collect_batch(item))
+
+    def close(self, timeout=10.0):
+        """Остановка потока записи после фиксации уже поставленных операций"""
+        with self._submit_lock:
+            if not self._closed:
+                self._closed = True
+                # Поток записи разбирает очередь, место для сигнала освободится
+                self._queue.put(self._stop)
+        self._thread.join(timeout)
+        logger.info(f"Поток записи остановлен: {self.stats()}")
+
+    def stats(self):
+        """Статистика: размеры пачек, глубина очереди, время фиксации"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_size'] = self._queue.maxsize
+        stats['avg_batch'] = stats['operations'] / stats['batches'] if stats['batches'] else 0.0
+        stats['avg_commit_ms'] = (
+            stats['commit_time_total'] * 1000 / stats['batches'] if stats['batches'] else 0.0
+        )
+        return stats
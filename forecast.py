@@ -0,0 +1,308 @@
+"""Прогноз погоды: почасовой ответ Open-Meteo в массивах NumPy
+
+По каждой ячейке сетки хранится один ответ с почасовыми рядами на
+FORECAST_DAYS суток. Сводки по суткам (минимум, максимум, среднее,
+сумма осадков) считаются сразу при загрузке через reduceat по границам
+суток, лучшее время для прогулки - скользящим окном по тем же массивам.
+Все варианты /forecast (сегодня, завтра, 7 дней) для всех пользователей
+в ячейке отдаются из одной записи кэша до ее истечения.
+"""
+import logging
+import time
+
+import numpy as np
+import requests
+
+from circuit_breaker import CircuitOpenError
+from config import (
+    FORECAST_CACHE_TTL, FORECAST_MAX_STALE, FORECAST_DAYS,
+    WEATHER_GRID_STEP, WEATHER_BATCH_WINDOW_MS, WEATHER_BATCH_MAX_POINTS
+)
+from locations import find_city, grid_cell, where_for_cell
+from open_meteo import open_meteo_client
+from weather import WEATHER_DESCRIPTIONS, format_age, format_unavailable
+from weather_batch import WeatherBatcher
+from weather_cache import WeatherCache
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.forecast')
+
+# Почасовые ряды прогноза
+HOURLY_FIELDS = (
+    "temperature_2m", "precipitation", "precipitation_probability", "weather_code", "wind_speed_10m"
+)
+
+# Варианты прогноза и их названия в тексте ответа
+FORECAST_VARIANTS = {
+    "today": "на сегодня",
+    "tomorrow": "на завтра",
+    "week": "на 7 дней",
+}
+
+# Слова варианта в /forecast [вариант] [город]
+VARIANT_ALIASES = {
+    "сегодня": "today",
+    "today": "today",
+    "завтра": "tomorrow",
+    "tomorrow": "tomorrow",
+    "неделя": "week",
+    "неделю": "week",
+    "week": "week",
+    "7": "week",
+}
+
+# Лучшее время для прогулки: длительность окна, дневные часы [с, до) и
+# температура, отклонение от которой ухудшает оценку часа
+BEST_WINDOW_HOURS = 3
+DAYTIME_HOURS = (8, 22)
+COMFORT_TEMPERATURE = 20.0
+
+WEEKDAYS = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
+
+def _column(hourly, name, length):
+    """Почасовой ряд как массив float (пропуски - nan)"""
+    values = hourly.get(name)
+    if values is None:
+        return np.full(length, np.nan)
+    return np.array(values, dtype=float)
+
+
+class Forecast:
+    """Почасовой прогноз по точке в массивах NumPy
+
+    time - начало каждого часа по местному времени точки; сводка по
+    суткам (daily) считается один раз при создании.
+    """
+
+    def __init__(self, hourly, utc_offset_seconds=0):
+        self.time = np.array(hourly["time"], dtype="datetime64[m]")
+        length = len(self.time)
+        self.temperature = _column(hourly, "temperature_2m", length)
+        self.precipitation = _column(hourly, "precipitation", length)
+        self.probability = _column(hourly, "precipitation_probability", length)
+        self.weather_code = _column(hourly, "weather_code", length)
+        self.wind_speed = _column(hourly, "wind_speed_10m", length)
+        self.utc_offset = int(utc_offset_seconds)
+
+        # Границы суток: индексы первого часа каждых суток и конца суток
+        self.days, self.day_starts = np.unique(self.time.astype("datetime64[D]"), return_index=True)
+        self.day_ends = np.append(self.day_starts[1:], length)
+        self.daily = self._aggregate_days()
+
+    def _aggregate_days(self):
+        """Сводка по всем суткам сразу: reduceat по границам суток"""
+        starts = self.day_starts
+        known = ~np.isnan(self.temperature)
+        temperature_sum = np.add.reduceat(np.where(known, self.temperature, 0.0), starts)
+        temperature_count = np.add.reduceat(known.astype(int), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            temperature_mean = temperature_sum / temperature_count
+
+        return {
+            "temperature_min": np.fmin.reduceat(self.temperature, starts),
+            "temperature_max": np.fmax.reduceat(self.temperature, starts),
+            "temperature_mean": temperature_mean,
+            "precipitation": np.add.reduceat(np.nan_to_num(self.precipitation), starts),
+            "precipitation_probability": np.fmax.reduceat(self.probability, starts),
+            "wind_speed_max": np.fmax.reduceat(self.wind_speed, starts),
+            # Как daily weather_code у Open-Meteo: самое сильное явление за сутки
+            "weather_code": np.fmax.reduceat(self.weather_code, starts),
+        }
+
+    def local_now(self):
+        """Текущее время в часовом поясе точки"""
+        return np.datetime64(int(time.time()) + self.utc_offset, "s").astype("datetime64[m]")
+
+    def day_index(self, offset=0):
+        """Индекс суток: offset 0 - сегодня, 1 - завтра; None - вне прогноза"""
+        day = self.local_now().astype("datetime64[D]") + np.timedelta64(offset, "D")
+        index = int(np.searchsorted(self.days, day))
+        if index < len(self.days) and self.days[index] == day:
+            return index
+        return None
+
+    def best_window(self, day, hours=BEST_WINDOW_HOURS):
+        """Лучшие hours часов подряд днем в сутки day (dict) или None
+
+        Оценка часа складывается из вероятности и количества осадков,
+        отклонения от комфортной температуры и ветра; меньше - лучше.
+        Прошедшие часы не рассматриваются.
+        """
+        start, end = self.day_starts[day], self.day_ends[day]
+        if end - start < hours:
+            return None
+
+        times = self.time[start:end]
+        hour_of_day = (times - times.astype("datetime64[D]")).astype("timedelta64[h]").astype(int)
+        score = (
+            self.probability[start:end] / 25
+            + self.precipitation[start:end] * 2
+            + np.abs(self.temperature[start:end] - COMFORT_TEMPERATURE) / 5
+            + self.wind_speed[start:end] / 10
+        )
+        usable = (
+            (hour_of_day >= DAYTIME_HOURS[0]) & (hour_of_day < DAYTIME_HOURS[1])
+            & (times + np.timedelta64(1, "h") > self.local_now())
+            & ~np.isnan(score)
+        )
+        score = np.where(usable, score, np.inf)
+
+        windows = np.lib.stride_tricks.sliding_window_view(score, hours).sum(axis=1)
+        best = int(np.argmin(windows))
+        if not np.isfinite(windows[best]):
+            return None
+
+        first = start + best
+        return {
+            "start": self.time[first],
+            "end": self.time[first + hours - 1] + np.timedelta64(1, "h"),
+            "temperature": float(np.nanmean(self.temperature[first:first + hours])),
+            "precipitation_probability": float(np.nanmax(self.probability[first:first + hours])),
+        }
+
+
+def fetch_forecast_batch(points, fields=HOURLY_FIELDS):
+    """Почасовой прогноз по списку точек одним запросом (None - по точке нет данных)"""
+    params = {
+        "latitude": ",".join(str(latitude) for latitude, _ in points),
+        "longitude": ",".join(str(longitude) for _, longitude in points),
+        "hourly": list(fields),
+        "forecast_days": FORECAST_DAYS,
+        # Сутки прогноза - по местному времени каждой точки
+        "timezone": "auto"
+    }
+
+    data = open_meteo_client.get(params)
+    # По одной точке Open-Meteo отвечает объектом, по нескольким - списком
+    if isinstance(data, dict):
+        data = [data]
+    if len(data) != len(points):
+        raise ValueError(f"Open-Meteo вернул {len(data)} ответов на {len(points)} точек")
+
+    results = [
+        Forecast(location["hourly"], location.get("utc_offset_seconds", 0))
+        if location.get("hourly") else None
+        for location in data
+    ]
+    logger.info(f"Получен прогноз по {len(points)} точкам")
+    return results
+
+
+# Один почасовой ответ на ячейку: модели обновляются раз в час
+forecast_cache = WeatherCache(ttl=FORECAST_CACHE_TTL, max_stale=FORECAST_MAX_STALE)
+forecast_batcher = WeatherBatcher(
+    fetch_forecast_batch,
+    window=WEATHER_BATCH_WINDOW_MS / 1000,
+    max_batch=WEATHER_BATCH_MAX_POINTS
+)
+
+
+def forecast_cell(latitude, longitude):
+    """Ячейка сетки, по которой хранится прогноз (и строятся кнопки вариантов)"""
+    return grid_cell(latitude, longitude, WEATHER_GRID_STEP)
+
+
+def parse_forecast_args(text):
+    """Вариант и город из '/forecast [сегодня|завтра|неделя] [город]'"""
+    args = text.split(maxsplit=2)[1:]
+    variant = "today"
+    if args and args[0].lower() in VARIANT_ALIASES:
+        variant = VARIANT_ALIASES[args.pop(0).lower()]
+    city = " ".join(args).strip() or None
+    return variant, city
+
+
+def _format_date(day):
+    return day.astype(object).strftime("%d.%m")
+
+
+def _format_time(moment):
+    return moment.astype(object).strftime("%H:%M")
+
+
+def format_day(forecast, day, where, variant):
+    """Прогноз на одни сутки с лучшим временем для прогулки"""
+    daily = forecast.daily
+    weather_desc = WEATHER_DESCRIPTIONS.get(int(np.nan_to_num(daily["weather_code"][day])), "неизвестно")
+
+    text = (
+        f"📅 Прогноз {where} {FORECAST_VARIANTS[variant]} ({_format_date(forecast.days[day])}):\n"
+        f"• Температура: от {daily['temperature_min'][day]:.1f} до {daily['temperature_max'][day]:.1f}°C, "
+        f"в среднем {daily['temperature_mean'][day]:.1f}°C\n"
+        f"• Осадки: {daily['precipitation'][day]:.1f} мм, "
+        f"вероятность до {np.nan_to_num(daily['precipitation_probability'][day]):.0f}%\n"
+        f"• Ветер: до {daily['wind_speed_max'][day]:.1f} км/ч\n"
+        f"• Погода: {weather_desc}"
+    )
+
+    window = forecast.best_window(day)
+    if window is not None:
+        text += (
+            f"\n\n🚶 Лучшее время для прогулки: {_format_time(window['start'])}–{_format_time(window['end'])} "
+            f"(около {window['temperature']:.0f}°C, осадки до {window['precipitation_probability']:.0f}%)"
+        )
+    else:
+        text += "\n\n🚶 Подходящего времени для прогулки в этот день уже нет"
+    return text
+
+
+def format_week(forecast, where):
+    """Прогноз по дням: строка на сутки"""
+    daily = forecast.daily
+    # 1970-01-01 - четверг, поэтому +3 дает номер дня недели с понедельника
+    weekdays = (forecast.days.astype(int) + 3) % 7
+
+    lines = [f"📅 Прогноз {where} {FORECAST_VARIANTS['week']}:"]
+    for day in range(len(forecast.days)):
+        weather_desc = WEATHER_DESCRIPTIONS.get(int(np.nan_to_num(daily["weather_code"][day])), "неизвестно")
+        lines.append(
+            f"{WEEKDAYS[weekdays[day]]} {_format_date(forecast.days[day])}: "
+            f"{daily['temperature_min'][day]:.0f}…{daily['temperature_max'][day]:.0f}°C, "
+            f"{daily['precipitation'][day]:.1f} мм, {weather_desc}"
+        )
+    return "\n".join(lines)
+
+
+def get_forecast(latitude, longitude, where, variant="today"):
+    """Текст прогноза для точки; where - 'в Москве', 'рядом с вами'"""
+    cell = forecast_cell(latitude, longitude)
+    try:
+        cached = forecast_cache.get(cell, lambda: forecast_batcher.fetch(*cell, HOURLY_FIELDS))
+        forecast = cached.value
+
+        if variant == "week":
+            text = format_week(forecast, where)
+        else:
+            day = forecast.day_index(1 if variant == "tomorrow" else 0)
+            if day is None:
+                return "Прогноз на эти сутки пока недоступен. Попробуйте позже."
+            text = format_day(forecast, day, where, variant)
+
+        if cached.stale:
+            text += f"\n\n⏳ Прогноз получен {format_age(cached.age)} назад"
+        return text
+
+    except CircuitOpenError as e:
+        return format_unavailable(e)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка при запросе прогноза: {str(e)[:100]}...")
+        return "Ошибка при получении прогноза. Сервис временно недоступен."
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка в get_forecast: {str(e)[:100]}...")
+        return "Произошла непредвиденная ошибка."
+
+
+def get_forecast_city(name, variant="today"):
+    """Прогноз по городу из таблицы и ячейка для кнопок (None - город не найден)"""
+    found = find_city(name)
+    if found is None:
+        return f"🤷 Город «{name[:50]}» не найден. Попробуйте /forecast Москва", None
+    _, where, latitude, longitude = found
+    return get_forecast(latitude, longitude, where, variant), forecast_cell(latitude, longitude)
+
+
+def get_forecast_cell(latitude, longitude, variant):
+    """Прогноз по ячейке из callback-данных кнопки варианта"""
+    where = where_for_cell(latitude, longitude, WEATHER_GRID_STEP) or "рядом с вами"
+    return get_forecast(latitude, longitude, where, variant)
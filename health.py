@@ -0,0 +1,112 @@
+"""Фоновые проверки зависимостей бота для /ping
+
+Проверка Open-Meteo, Bot API и SQLite выполняется в фоне раз в interval
+секунд; результат (доступность, задержка, время проверки, ошибка)
+хранится в памяти. /ping только читает последние результаты и не
+обращается к внешним сервисам.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.health')
+
+# Результат проверки: checked_at - time.time() окончания проверки
+CheckResult = namedtuple('CheckResult', ['ok', 'latency_ms', 'checked_at', 'error'])
+
+
+class HealthProber:
+    """Периодические проверки: add_check(name, func), где func() падает при недоступности
+
+    Проверки одного раунда выполняются параллельно, чтобы медленная
+    зависимость не задерживала результаты остальных.
+    """
+
+    def __init__(self, interval=30.0):
+        self.interval = interval
+        self._checks = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._stats = {
+            'rounds': 0,
+            'failures': 0,
+        }
+
+    def add_check(self, name, func):
+        """Регистрация проверки (до start)"""
+        self._checks[name] = func
+
+    def start(self):
+        """Запуск фоновых проверок; первый раунд - сразу"""
+        if self._thread is not None or not self._checks:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self._checks), thread_name_prefix='health-check'
+        )
+        self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+        self._thread.start()
+        logger.info(f"Фоновые проверки ({', '.join(self._checks)}) раз в {self.interval:.0f} с")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        """Один раунд всех проверок"""
+        if self._executor is None:
+            for name, func in self._checks.items():
+                self._check(name, func)
+        else:
+            futures = [self._executor.submit(self._check, name, func) for name, func in self._checks.items()]
+            for future in futures:
+                future.result()
+        with self._lock:
+            self._stats['rounds'] += 1
+
+    def _check(self, name, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            result = CheckResult(False, (time.perf_counter() - start) * 1000, time.time(), str(e)[:100])
+        else:
+            result = CheckResult(True, (time.perf_counter() - start) * 1000, time.time(), None)
+
+        with self._lock:
+            previous = self._results.get(name)
+            self._results[name] = result
+            if not result.ok:
+                self._stats['failures'] += 1
+
+        # В лог - только смена состояния, а не каждый раунд
+        if not result.ok and (previous is None or previous.ok):
+            logger.warning(f"Проверка {name} не пройдена: {result.error}")
+        elif result.ok and previous is not None and not previous.ok:
+            logger.info(f"Проверка {name} снова пройдена ({result.latency_ms:.1f} мс)")
+
+    def results(self):
+        """Последние результаты: {имя: CheckResult}; проверок, не выполнявшихся ни разу, нет"""
+        with self._lock:
+            return dict(self._results)
+
+    def stop(self, timeout=5.0):
+        """Остановка фоновых проверок"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        """Статистика: раунды, неудачные проверки, последнее состояние каждой проверки"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['status'] = {name: result.ok for name, result in self._results.items()}
+        return stats
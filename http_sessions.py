@@ -0,0 +1,155 @@
+"""Общие HTTP-сессии с пулом keep-alive соединений
+
+requests.get() без сессии открывает новое TCP+TLS соединение на каждый
+запрос. Здесь одна сессия на сервис: соединения к Open-Meteo и к Bot API
+переиспользуются между запросами и потоками. Повторы подключения к Bot
+API делает urllib3, повторы запросов к Open-Meteo - клиент open_meteo.py
+в пределах бюджета времени на запрос. Счетчики соединений показывают,
+сколько запросов обошлось без нового TLS-рукопожатия. Время запросов
+к Bot API по методам (sendMessage, getUpdates) пишется в метрики.
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (
+    HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF, HTTP_CONNECT_TIMEOUT, TELEGRAM_POOL_SIZE
+)
+from metrics import registry
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.http')
+
+telegram_request_duration = registry.histogram(
+    'bot_telegram_request_duration_seconds', "Время HTTP-запроса к Bot API", ('method',)
+)
+telegram_request_errors = registry.counter(
+    'bot_telegram_request_errors_total', "Запросы к Bot API с ошибкой сети или ответом не 200", ('method',)
+)
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter со счетчиками запросов и открытых соединений
+
+    urllib3 сам считает их в каждом пуле (num_requests, num_connections);
+    при вытеснении пула из PoolManager его счетчики сохраняются здесь.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._closed_requests = 0
+        self._closed_connections = 0
+
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+
+        def dispose_pool(pool):
+            with self._lock:
+                self._closed_requests += pool.num_requests
+                self._closed_connections += pool.num_connections
+            dispose(pool)
+
+        pools.dispose_func = dispose_pool
+
+    def connection_counts(self):
+        """(запросов, открыто соединений) за все время"""
+        pools = self.poolmanager.pools
+        with self._lock:
+            requests_count = self._closed_requests
+            connections = self._closed_connections
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        return requests_count, connections
+
+
+def create_session(pool_size, retry):
+    """Сессия с пулом pool_size соединений на хост и политикой повторов retry"""
+    session = requests.Session()
+    adapter = CountingHTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def connection_stats(session):
+    """Запросы, новые соединения (TLS-рукопожатия) и доля переиспользованных"""
+    requests_count = connections = 0
+    for adapter in set(session.adapters.values()):
+        if isinstance(adapter, CountingHTTPAdapter):
+            adapter_requests, adapter_connections = adapter.connection_counts()
+            requests_count += adapter_requests
+            connections += adapter_connections
+
+    reused = max(0, requests_count - connections)
+    return {
+        'requests': requests_count,
+        'connections': connections,
+        'reused': reused,
+        'reuse_ratio': round(reused / requests_count, 3) if requests_count else 0.0,
+    }
+
+
+# Open-Meteo: без повторов urllib3 - их делает OpenMeteoClient, укладывая
+# все попытки в бюджет времени запроса
+open_meteo_session = create_session(HTTP_POOL_SIZE, Retry(total=0, read=False))
+
+_telegram_session = None
+_telegram_lock = threading.Lock()
+
+
+def telegram_session():
+    """Сессия Bot API для telebot.apihelper и скачивания файлов
+
+    Повторяются только ошибки подключения: запрос еще не отправлен, а
+    sendMessage после ошибки чтения мог уже дойти до Telegram.
+    Пул рассчитан на все потоки, одновременно обращающиеся к Bot API.
+    """
+    global _telegram_session
+    with _telegram_lock:
+        if _telegram_session is None:
+            _telegram_session = create_session(
+                TELEGRAM_POOL_SIZE,
+                Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, status=0,
+                      other=0, backoff_factor=HTTP_BACKOFF)
+            )
+        return _telegram_session
+
+
+def send_telegram_request(method, url, **kwargs):
+    """Отправка запроса apihelper через общую сессию с замером по методу Bot API"""
+    # URL вида .../bot<токен>/sendMessage - в метку идет только метод
+    api_method = url.rsplit('/', 1)[-1]
+    start = time.perf_counter()
+    try:
+        response = telegram_session().request(method, url, **kwargs)
+    except Exception:
+        telegram_request_errors.labels(api_method).inc()
+        raise
+    finally:
+        telegram_request_duration.labels(api_method).observe(time.perf_counter() - start)
+
+    if response.status_code != 200:
+        telegram_request_errors.labels(api_method).inc()
+    return response
+
+
+def configure_telebot():
+    """Общая сессия для всех запросов TeleBot вместо сессии на каждый поток"""
+    from telebot import apihelper
+
+    apihelper.session = telegram_session()
+    # Запросы методов Bot API идут через send_telegram_request - с метриками
+    apihelper.CUSTOM_REQUEST_SENDER = send_telegram_request
+    # Сессия общая и долгоживущая - пересоздавать ее раз в 10 минут незачем
+    apihelper.SESSION_TIME_TO_LIVE = None
+    apihelper.CONNECT_TIMEOUT = HTTP_CONNECT_TIMEOUT
+    logger.info(f"Сессия Bot API: пул {TELEGRAM_POOL_SIZE} соединений, "
+                f"повторов подключения: {HTTP_RETRIES}")
@@ -16,6 +16,8 @@ def create_main_keyboard():
     ]
 
     keyboard.add(*buttons)
+    # Telegram сам отправит геопозицию пользователя сообщением
+    keyboard.add(types.KeyboardButton("📍 Погода рядом", request_location=True))
     return keyboard
 
 
@@ -80,4 +82,21 @@ def create_note_categories_keyboard():
     ]
 
     keyboard.add(*buttons)
-    return keyboard
\ No newline at end of file
+    return keyboard
+
+
+def create_forecast_keyboard(latitude, longitude, selected=None):
+    """Inline-кнопки вариантов прогноза для ячейки сетки"""
+    keyboard = types.InlineKeyboardMarkup(row_width=3)
+
+    buttons = []
+    for variant, label in (("today", "Сегодня"), ("tomorrow", "Завтра"), ("week", "7 дней")):
+        callback_data = f"forecast:{variant}:{latitude}:{longitude}"
+        if variant == selected:
+            # Повторное нажатие на показанный вариант только отвечает на запрос
+            label = f"• {label} •"
+            callback_data += ":shown"
+        buttons.append(types.InlineKeyboardButton(f"📅 {label}", callback_data=callback_data))
+
+    keyboard.add(*buttons)
+    return keyboard
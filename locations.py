@@ -0,0 +1,82 @@
+"""Координаты для погоды: локальная таблица городов и сетка кэша
+
+Город из /weather <город> ищется в таблице без обращения к внешнему
+геокодеру. Координаты (города или присланной геопозиции) округляются до
+узла сетки: соседние пользователи попадают в одну запись кэша погоды, и
+запросов к API столько, сколько различных ячеек, а не пользователей.
+"""
+
+# Город: (где - для текста ответа, широта, долгота)
+CITIES = {
+    "Москва": ("в Москве", 55.7558, 37.6173),
+    "Санкт-Петербург": ("в Санкт-Петербурге", 59.9386, 30.3141),
+    "Новосибирск": ("в Новосибирске", 55.0084, 82.9357),
+    "Екатеринбург": ("в Екатеринбурге", 56.8389, 60.6057),
+    "Казань": ("в Казани", 55.7887, 49.1221),
+    "Нижний Новгород": ("в Нижнем Новгороде", 56.2965, 43.9361),
+    "Челябинск": ("в Челябинске", 55.1644, 61.4368),
+    "Самара": ("в Самаре", 53.1959, 50.1002),
+    "Омск": ("в Омске", 54.9885, 73.3242),
+    "Ростов-на-Дону": ("в Ростове-на-Дону", 47.2357, 39.7015),
+    "Уфа": ("в Уфе", 54.7388, 55.9721),
+    "Красноярск": ("в Красноярске", 56.0153, 92.8932),
+    "Воронеж": ("в Воронеже", 51.6720, 39.1843),
+    "Пермь": ("в Перми", 58.0105, 56.2502),
+    "Волгоград": ("в Волгограде", 48.7080, 44.5133),
+    "Краснодар": ("в Краснодаре", 45.0355, 38.9753),
+    "Сочи": ("в Сочи", 43.6028, 39.7342),
+    "Калининград": ("в Калининграде", 54.7104, 20.4522),
+    "Ярославль": ("в Ярославле", 57.6261, 39.8845),
+    "Иркутск": ("в Иркутске", 52.2870, 104.3050),
+    "Владивосток": ("во Владивостоке", 43.1155, 131.8855),
+    "Мурманск": ("в Мурманске", 68.9585, 33.0827),
+}
+
+# Сокращения и другие написания
+CITY_ALIASES = {
+    "мск": "Москва",
+    "moscow": "Москва",
+    "спб": "Санкт-Петербург",
+    "питер": "Санкт-Петербург",
+    "петербург": "Санкт-Петербург",
+    "saint petersburg": "Санкт-Петербург",
+    "нск": "Новосибирск",
+    "екб": "Екатеринбург",
+    "нн": "Нижний Новгород",
+    "ростов": "Ростов-на-Дону",
+}
+
+
+def normalize_city_name(name):
+    """Ключ поиска: нижний регистр, е вместо ё, дефисы и пробелы схлопнуты"""
+    name = name.lower().replace("ё", "е").replace("-", " ")
+    return " ".join(name.split())
+
+
+_CITY_INDEX = {normalize_city_name(city): city for city in CITIES}
+_CITY_INDEX.update({normalize_city_name(alias): city for alias, city in CITY_ALIASES.items()})
+
+
+def find_city(name):
+    """(название, где, широта, долгота) или None, если города нет в таблице"""
+    city = _CITY_INDEX.get(normalize_city_name(name))
+    if city is None:
+        return None
+    where, latitude, longitude = CITIES[city]
+    return city, where, latitude, longitude
+
+
+def grid_cell(latitude, longitude, step):
+    """Центр ячейки сетки с шагом step градусов (0.1 - около 11 км по широте)"""
+    return (
+        round(round(latitude / step) * step, 4),
+        round(round(longitude / step) * step, 4),
+    )
+
+
+def where_for_cell(latitude, longitude, step):
+    """'в Москве', если ячейка сетки совпадает с ячейкой города из таблицы, иначе None"""
+    for where, city_latitude, city_longitude in CITIES.values():
+        if grid_cell(city_latitude, city_longitude, step) == (latitude, longitude):
+            return where
+    return None
@@ -0,0 +1,346 @@
+import asyncio
+import collections
+import logging
+import threading
+import time
+
+from metrics import handler_duration, handler_errors
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.router')
+
+
+def _add_route(table, key, handler, kind):
+    if key in table:
+        raise ValueError(f"Повторная регистрация маршрута ({kind}): {key}")
+    table[key] = handler
+
+
+def extract_command(text):
+    """Имя команды из текста (/note_edit@bot 5 -> note_edit) или None"""
+    if not text or not text.startswith('/'):
+        return None
+    return text.split(maxsplit=1)[0][1:].split('@', 1)[0]
+
+
+class MessageRouter:
+    """Таблица маршрутов текстовых сообщений
+
+    Вместо цепочки message_handler с лямбдами, которые TeleBot проверяет
+    по очереди для каждого сообщения, обработчик находится поиском в
+    словарях, порядок проверки:
+
+    1. команда (/start, /note_add@bot) - таблица команд;
+    2. состояние пользователя с захватом ввода (ввод заголовка заметки,
+       ID, поискового запроса) - таблица состояний;
+    3. точный текст reply-кнопки - таблица текстов;
+    4. состояние без захвата ввода (ожидание текста эхо) - кнопки в
+       этом состоянии по-прежнему работают;
+    5. обработчик по умолчанию.
+
+    Состояния хранятся у владельцев (NotesHandler.user_states и т.п.),
+    роутер опрашивает их через функции-источники source(user_id),
+    заданные при регистрации.
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self._texts = {}
+        self._states = {}
+        self._state_sources = []
+        self._fallback = None
+
+    def command(self, *commands):
+        """Декоратор: обработчик команд (без '/')"""
+        def decorator(handler):
+            for command in commands:
+                _add_route(self._commands, command, handler, 'команда')
+            return handler
+        return decorator
+
+    def text(self, *texts):
+        """Декоратор: обработчик точного текста сообщения (reply-кнопки)"""
+        def decorator(handler):
+            for text in texts:
+                _add_route(self._texts, text, handler, 'текст')
+            return handler
+        return decorator
+
+    def state(self, source, *states, capture=True):
+        """Декоратор: обработчик состояний, возвращаемых source(user_id)
+
+        capture=True - состояние перехватывает любой текст, кроме команд;
+        capture=False - сначала проверяются тексты кнопок.
+        """
+        if source not in self._state_sources:
+            self._state_sources.append(source)
+
+        def decorator(handler):
+            for state in states:
+                _add_route(self._states, state, (handler, capture), 'состояние')
+            return handler
+        return decorator
+
+    def fallback(self, handler):
+        """Декоратор: обработчик сообщений без маршрута"""
+        self._fallback = handler
+        return handler
+
+    def resolve(self, message):
+        """Обработчик для сообщения (None, если нет ни маршрута, ни fallback)"""
+        text = message.text
+
+        command = extract_command(text)
+        if command is not None:
+            handler = self._commands.get(command)
+            if handler is not None:
+                return handler
+
+        deferred = None
+        if self._states:
+            user_id = message.from_user.id
+            for source in self._state_sources:
+                entry = self._states.get(source(user_id))
+                if entry is None:
+                    continue
+                handler, capture = entry
+                if capture:
+                    return handler
+                deferred = deferred or handler
+
+        handler = self._texts.get(text)
+        if handler is not None:
+            return handler
+
+        return deferred or self._fallback
+
+    def _resolve_logged(self, message):
+        handler = self.resolve(message)
+        if handler is None:
+            logger.debug(f"Нет маршрута для сообщения: user_id={message.from_user.id}")
+        return handler
+
+    def dispatch(self, message):
+        """Вызов обработчика сообщения; время и исключения - в метрики по имени обработчика"""
+        handler = self._resolve_logged(message)
+        if handler is None:
+            return
+        start = time.perf_counter()
+        try:
+            handler(message)
+        except Exception:
+            handler_errors.labels('message', handler.__name__).inc()
+            raise
+        finally:
+            handler_duration.labels('message', handler.__name__).observe(time.perf_counter() - start)
+
+    async def dispatch_async(self, message):
+        """dispatch для AsyncTeleBot: корутина обработчика ожидается"""
+        handler = self._resolve_logged(message)
+        if handler is None:
+            return
+        start = time.perf_counter()
+        try:
+            await handler(message)
+        except Exception:
+            handler_errors.labels('message', handler.__name__).inc()
+            raise
+        finally:
+            handler_duration.labels('message', handler.__name__).observe(time.perf_counter() - start)
+
+    def install(self, bot, asynchronous=False):
+        """Регистрация роутера в боте одним обработчиком текстовых сообщений"""
+        bot.register_message_handler(
+            self.dispatch_async if asynchronous else self.dispatch,
+            content_types=['text']
+        )
+
+    def routes_count(self):
+        """Размеры таблиц маршрутов"""
+        return {
+            'commands': len(self._commands),
+            'texts': len(self._texts),
+            'states': len(self._states),
+        }
+
+
+# Сколько последних замеров задержки хранить для перцентилей
+CALLBACK_LATENCY_WINDOW = 500
+
+UNKNOWN_CALLBACK_TEXT = "❌ Действие не распознано"
+CALLBACK_ERROR_TEXT = "❌ Ошибка обработки"
+
+
+def split_callback_data(data):
+    """Ключ маршрута и строка аргументов: notes_page:next:5 -> (notes_page, next:5)"""
+    key, _, rest = (data or '').partition(':')
+    return key, rest
+
+
+class CallbackRouter:
+    """Таблица маршрутов callback-запросов inline-кнопок
+
+    Маршрут - часть callback_data до первого ':', аргументы после него
+    разбираются и передаются обработчику: handler(call, *args). Для
+    семейств кнопок без ':' (echo_upper, action_stats) регистрируется
+    префикс до первого '_' - обработчик получает остаток ключа первым
+    аргументом. Точный ключ проверяется раньше семейства.
+
+    На каждый запрос Telegram ждет ровно один answerCallbackQuery:
+    обработчики отвечают через answer(), повторный ответ пропускается,
+    а если обработчик не ответил (или упал), роутер отвечает сам.
+    """
+
+    def __init__(self, bot, asynchronous=False):
+        self.bot = bot
+        self.asynchronous = asynchronous
+        self._routes = {}
+        self._families = {}
+        self._answered = set()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def route(self, *keys, maxsplit=-1):
+        """Декоратор: обработчик callback_data вида key[:арг1[:арг2...]]
+
+        maxsplit ограничивает разбиение аргументов (последний аргумент
+        может сам содержать ':').
+        """
+        def decorator(handler):
+            for key in keys:
+                _add_route(self._routes, key, (handler, maxsplit), 'callback')
+            return handler
+        return decorator
+
+    def family(self, prefix, maxsplit=-1):
+        """Декоратор: обработчик ключей prefix<вариант>, '_' в prefix только в конце"""
+        if prefix.find('_') != len(prefix) - 1:
+            raise ValueError(f"Префикс семейства callback должен оканчиваться первым '_': {prefix}")
+
+        def decorator(handler):
+            _add_route(self._families, prefix, (handler, maxsplit), 'семейство callback')
+            return handler
+        return decorator
+
+    def resolve(self, data):
+        """(имя маршрута для метрик, обработчик, аргументы) или (None, None, None)"""
+        key, rest = split_callback_data(data)
+
+        entry = self._routes.get(key)
+        if entry is not None:
+            handler, maxsplit = entry
+            return key, handler, rest.split(':', maxsplit) if rest else []
+
+        head, sep, variant = key.partition('_')
+        entry = self._families.get(head + sep) if sep else None
+        if entry is not None:
+            handler, maxsplit = entry
+            return head + sep, handler, [variant] + (rest.split(':', maxsplit) if rest else [])
+
+        return None, None, None
+
+    def answer(self, call, text=None, show_alert=False):
+        """Ответ на callback-запрос; повторные ответы на тот же запрос пропускаются
+
+        Для AsyncTeleBot (asynchronous=True) всегда возвращает корутину.
+        """
+        with self._lock:
+            if call.id in self._answered:
+                logger.debug(f"Повторный ответ на callback пропущен: data={call.data}")
+                return asyncio.sleep(0) if self.asynchronous else None
+            self._answered.add(call.id)
+        return self.bot.answer_callback_query(call.id, text, show_alert=show_alert)
+
+    def _begin(self, call):
+        name, handler, args = self.resolve(call.data)
+        logger.info(f"CALLBACK: user_id={call.from_user.id}, data={call.data}, route={name}")
+        return name or 'unknown', handler, args
+
+    def _finish(self, call, name, start, failed):
+        """Метрики маршрута; True, если на запрос еще не ответили"""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            answered = call.id in self._answered
+            self._answered.discard(call.id)
+
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'auto_answered': 0,
+                    'time_total': 0.0,
+                    'max_time': 0.0,
+                    'latencies': collections.deque(maxlen=CALLBACK_LATENCY_WINDOW),
+                }
+            stats['calls'] += 1
+            stats['errors'] += failed
+            stats['auto_answered'] += not answered
+            stats['time_total'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['latencies'].append(elapsed)
+
+        handler_duration.labels('callback', name).observe(elapsed)
+        if failed:
+            handler_errors.labels('callback', name).inc()
+        return not answered
+
+    def _fallback_text(self, handler, failed):
+        if handler is None:
+            return UNKNOWN_CALLBACK_TEXT
+        return CALLBACK_ERROR_TEXT if failed else None
+
+    def dispatch(self, call):
+        """Вызов обработчика callback-запроса и гарантированный ответ"""
+        name, handler, args = self._begin(call)
+        start = time.perf_counter()
+        failed = False
+        try:
+            if handler is not None:
+                handler(call, *args)
+        except Exception as e:
+            failed = True
+            logger.error(f"Ошибка обработчика callback {name}: {e}", exc_info=True)
+        finally:
+            if self._finish(call, name, start, failed):
+                self.bot.answer_callback_query(call.id, self._fallback_text(handler, failed))
+
+    async def dispatch_async(self, call):
+        """dispatch для AsyncTeleBot"""
+        name, handler, args = self._begin(call)
+        start = time.perf_counter()
+        failed = False
+        try:
+            if handler is not None:
+                await handler(call, *args)
+        except Exception as e:
+            failed = True
+            logger.error(f"Ошибка обработчика callback {name}: {e}", exc_info=True)
+        finally:
+            if self._finish(call, name, start, failed):
+                await self.bot.answer_callback_query(call.id, self._fallback_text(handler, failed))
+
+    def install(self):
+        """Регистрация роутера в боте одним обработчиком callback-запросов"""
+        self.bot.register_callback_query_handler(
+            self.dispatch_async if self.asynchronous else self.dispatch,
+            func=lambda call: True
+        )
+
+    def stats(self):
+        """Статистика по маршрутам: вызовы, ошибки, задержка в миллисекундах"""
+        with self._lock:
+            snapshot = {
+                name: (dict(stats), sorted(stats['latencies']))
+                for name, stats in self._stats.items()
+            }
+
+        result = {}
+        for name, (stats, latencies) in snapshot.items():
+            del stats['latencies']
+            time_total = stats.pop('time_total')
+            stats['avg_ms'] = round(time_total * 1000 / stats['calls'], 3)
+            stats['p95_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3)
+            stats['max_ms'] = round(stats.pop('max_time') * 1000, 3)
+            result[name] = stats
+        return result
@@ -0,0 +1,394 @@
+"""Метрики бота в текстовом формате Prometheus
+
+Счетчики, gauge и гистограммы с фиксированными границами корзин: замер
+- это поиск корзины (bisect) и два сложения под блокировкой метки, без
+выделения памяти и без хранения отдельных значений. Экземпляр метки
+(labels(...)) создается один раз и дальше берется из словаря. Gauge
+может считаться функцией в момент чтения (глубина очередей) - тогда на
+горячем пути он не стоит ничего.
+
+Метрики читает локальный HTTP-сервер: GET /metrics.
+
+Стоимость замера:
+    python benchmarks.py metrics
+"""
+import bisect
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин по умолчанию, сек: от обработчика из памяти до запроса к API
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Метрика с набором меток; без меток методы вызываются у самой метрики"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Экземпляр метрики для значений меток (в порядке labelnames)"""
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получено {values}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        """Строки метрики в текстовом формате Prometheus"""
+        lines = [
+            f'# HELP {self.name} {_escape(self.documentation)}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('_lock', '_value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def render(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self._value)}']
+
+
+class Counter(_Metric):
+    """Только растущее значение: запросы, ошибки"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ('_lock', '_value', '_function')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Значение считается вызовом function() при каждом чтении метрик"""
+        self._function = function
+
+    def render(self, name, labelnames, values):
+        value = self._value
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logger.warning(f"Метрика {name}: ошибка вычисления значения: {e}")
+                return []
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(value)}']
+
+
+class Gauge(_Metric):
+    """Текущее значение: глубина очереди, состояние предохранителя"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_upper_bounds', '_counts', '_sum')
+
+    def __init__(self, upper_bounds):
+        self._lock = threading.Lock()
+        self._upper_bounds = upper_bounds
+        # Последняя корзина - +Inf
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        # Корзина le=x включает значение x - отсюда bisect_left
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._upper_bounds + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f'{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}')
+        labels = _format_labels(labelnames, values)
+        lines.append(f'{name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам: задержки"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if not math.isinf(bound)))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class MetricsRegistry:
+    """Набор метрик процесса; имя метрики регистрируется один раз"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Повторная регистрация метрики: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def timed(histogram, errors=None):
+    """Декоратор: время вызова в histogram, исключения - в счетчик errors
+
+    histogram и errors - экземпляры метрики (labels(...) уже выбраны).
+    Для корутин замеряется время до завершения, для генераторов - до
+    конца перебора.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+        elif inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(histogram, errors, exclude=()):
+    """Декоратор класса: timed для каждого публичного метода, метка - имя метода
+
+    histogram и errors - метрики с одной меткой (имя метода).
+    """
+    def decorator(cls):
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not inspect.isfunction(func):
+                continue
+            setattr(cls, name, timed(histogram.labels(name), errors.labels(name))(func))
+        return cls
+    return decorator
+
+
+# Метрики всего процесса
+registry = MetricsRegistry()
+
+# Время обработчиков сообщений и callback-запросов (message_router.py и
+# обработчики вне роутера)
+handler_duration = registry.histogram(
+    'bot_handler_duration_seconds', "Время выполнения обработчика", ('kind', 'handler')
+)
+handler_errors = registry.counter(
+    'bot_handler_errors_total', "Исключения в обработчиках", ('kind', 'handler')
+)
+
+
+def timed_handler(func):
+    """Декоратор обработчика, зарегистрированного в боте напрямую, а не через роутер"""
+    name = func.__name__
+    return timed(handler_duration.labels('message', name), handler_errors.labels('message', name))(func)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """HTTP-сервер метрик в фоновом потоке: GET /metrics"""
+
+    daemon_threads = True
+
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        super().__init__((host, port), _MetricsRequestHandler)
+        self.registry = registry
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        host, port = self.server_address[:2]
+        logger.info(f"Метрики: http://{host}:{port}/metrics")
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
+
+
+def start_metrics_server(host, port):
+    """Запуск сервера метрик; None, если порт занят - бот работает и без него"""
+    try:
+        server = MetricsServer(registry, host, port)
+    except OSError as e:
+        logger.error(f"Сервер метрик не запущен ({host}:{port}): {e}")
+        return None
+    server.start()
+    return server
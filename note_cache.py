@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.database.cache')
+
+# Маркер промаха (None - допустимое закэшированное значение)
+MISS = object()
+
+
+class NoteCache:
+    """Ограниченный LRU-кэш чтений заметок с временем жизни записей
+
+    Ключи группируются по пользователю, чтобы запись в заметки одного
+    пользователя сбрасывала только его записи. Поколение пользователя
+    увеличивается при каждом сбросе: значение, прочитанное из базы до
+    сброса, не попадет в кэш после него.
+
+    Закэшированные значения отдаются без копирования - вызывающий код не
+    должен их изменять.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+
+        self._entries = OrderedDict()   # (user_id, key) -> (value, expires_at)
+        self._user_keys = {}            # user_id -> set(key)
+        self._generations = {}          # user_id -> счетчик сбросов
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def _remove(self, full_key):
+        """Удаление записи вместе со ссылкой в индексе пользователя"""
+        del self._entries[full_key]
+        user_id, key = full_key
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def get(self, user_id, key):
+        """Значение из кэша или MISS"""
+        full_key = (user_id, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return MISS
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(full_key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return MISS
+
+            self._entries.move_to_end(full_key)
+            self._stats['hits'] += 1
+            return value
+
+    def generation(self, user_id):
+        """Текущее поколение записей пользователя"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def set(self, user_id, key, value, generation=None):
+        """Сохранение значения; пропускается, если поколение устарело"""
+        full_key = (user_id, key)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(user_id, 0):
+                return
+
+            if full_key in self._entries:
+                self._entries.move_to_end(full_key)
+            self._entries[full_key] = (value, time.monotonic() + self.ttl)
+            self._user_keys.setdefault(user_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def invalidate_user(self, user_id):
+        """Сброс всех записей пользователя"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in self._user_keys.pop(user_id, ()):
+                del self._entries[(user_id, key)]
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            for user_id in self._user_keys:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self):
+        """Статистика: попадания, промахи, вытеснения, размер"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
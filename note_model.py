@@ -0,0 +1,122 @@
+import json
+from datetime import datetime
+
+# Маркер "еще не декодировано" (None - допустимое значение временной метки)
+_UNSET = object()
+
+# Ключи, доступные через note['...'] - как у прежних словарей заметок
+NOTE_KEYS = ('id', 'user_id', 'note_local_id', 'title', 'content', 'tags',
+             'category', 'created_at', 'updated_at', 'snippet')
+
+# Ключи, значения которых хранятся в сыром виде под другим атрибутом
+_RAW_ATTRS = {
+    'id': 'note_local_id',
+    'tags': '_tags_raw',
+    'created_at': '_created_raw',
+    'updated_at': '_updated_raw',
+}
+
+
+def _parse_timestamp(value):
+    """Разбор метки времени SQLite (CURRENT_TIMESTAMP) в datetime"""
+    return datetime.fromisoformat(value) if value else None
+
+
+class Note:
+    """Компактная запись заметки
+
+    Создается фабрикой строк прямо из кортежа курсора, без промежуточного
+    словаря. Теги и временные метки хранятся как в базе и декодируются
+    при первом обращении к атрибутам tags, created_at и updated_at.
+
+    Доступ по ключу (note['tags'], note.get('snippet')) оставлен для
+    совместимости и возвращает сырые значения столбцов, как прежние
+    словари. Экземпляры могут лежать в кэше и разделяться между
+    потоками - вызывающий код не должен их изменять.
+    """
+
+    __slots__ = ('user_id', 'note_local_id', 'title', 'content', 'category', 'snippet',
+                 '_tags_raw', '_created_raw', '_updated_raw',
+                 '_tags', '_created_at', '_updated_at')
+
+    def __init__(self, user_id, note_local_id, title, content, tags, category,
+                 created_at, updated_at, snippet=None):
+        self.user_id = user_id
+        self.note_local_id = note_local_id
+        self.title = title
+        self.content = content
+        self.category = category
+        self.snippet = snippet
+        self._tags_raw = tags
+        self._created_raw = created_at
+        self._updated_raw = updated_at
+        self._tags = _UNSET
+        self._created_at = _UNSET
+        self._updated_at = _UNSET
+
+    @property
+    def id(self):
+        """Локальный ID заметки (псевдоним note_local_id)"""
+        return self.note_local_id
+
+    @property
+    def tags(self):
+        """Список тегов"""
+        if self._tags is _UNSET:
+            self._tags = json.loads(self._tags_raw) if self._tags_raw else []
+        return self._tags
+
+    @property
+    def created_at(self):
+        """Время создания (datetime)"""
+        if self._created_at is _UNSET:
+            self._created_at = _parse_timestamp(self._created_raw)
+        return self._created_at
+
+    @property
+    def updated_at(self):
+        """Время последнего изменения (datetime)"""
+        if self._updated_at is _UNSET:
+            self._updated_at = _parse_timestamp(self._updated_raw)
+        return self._updated_at
+
+    def __getitem__(self, key):
+        if key not in NOTE_KEYS:
+            raise KeyError(key)
+        return getattr(self, _RAW_ATTRS.get(key, key))
+
+    def __contains__(self, key):
+        return key in NOTE_KEYS and (key != 'snippet' or self.snippet is not None)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None and key == 'snippet' else value
+
+    def keys(self):
+        return [key for key in NOTE_KEYS if key in self]
+
+    def to_dict(self):
+        """Словарь с сырыми значениями столбцов (как dict(row) + 'id')"""
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if not isinstance(other, Note):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Note(user_id={self.user_id!r}, note_local_id={self.note_local_id!r}, title={self.title!r})"
+
+
+def note_row_factory(cursor, row):
+    """Фабрика строк курсора: кортеж сразу превращается в Note
+
+    Ожидает столбцы в порядке user_id, note_local_id, title, content, tags,
+    category, created_at, updated_at и необязательный snippet.
+    """
+    return Note(*row)
@@ -0,0 +1,77 @@
+import gzip
+import io
+import logging
+import tempfile
+from datetime import datetime
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.notes.export')
+
+# Разделитель заметок в текстовом экспорте
+SEPARATOR = "=" * 50
+
+# Сколько байт экспорта держать в памяти, прежде чем сбросить на диск
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def write_notes_export(stream, notes, username=None):
+    """Запись заметок в текстовый поток в формате экспорта
+
+    notes - любой итерируемый источник (например, Database.iter_user_notes),
+    заметки пишутся по одной и не накапливаются. Возвращает количество
+    записанных заметок.
+    """
+    stream.write(f"Экспорт заметок пользователя @{username or 'unknown'}\n")
+    stream.write(f"Дата экспорта: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
+    stream.write(SEPARATOR + "\n\n")
+
+    count = 0
+    for note in notes:
+        stream.write(f"ЗАМЕТКА #{note['id']}\n")
+        stream.write(f"Заголовок: {note['title']}\n")
+        stream.write(f"Категория: {note['category']}\n")
+        stream.write(f"Создана: {note['created_at']}\n")
+        stream.write(f"Обновлена: {note['updated_at']}\n")
+
+        if note.tags:
+            stream.write(f"Теги: {', '.join(note.tags)}\n")
+
+        stream.write("\nСодержание:\n")
+        stream.write(note['content'])
+        stream.write("\n" + SEPARATOR + "\n\n")
+        count += 1
+
+    return count
+
+
+def build_notes_export(notes, username=None, compress=False, spool_max_size=SPOOL_MAX_SIZE):
+    """Потоковая сборка файла экспорта
+
+    Данные пишутся во временный буфер, который держится в памяти до
+    spool_max_size байт и дальше сбрасывается на диск; при compress=True
+    текст сжимается gzip на лету. Возвращает (файл, имя файла, количество
+    заметок); файл открыт на чтение с начала, закрывает его вызывающий.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+
+    try:
+        if compress:
+            raw = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6)
+            filename = 'notes_export.txt.gz'
+        else:
+            raw = buffer
+            filename = 'notes_export.txt'
+
+        text = io.TextIOWrapper(raw, encoding='utf-8', newline='\n')
+        count = write_notes_export(text, notes, username)
+        text.flush()
+        # Отвязываем обертку, чтобы ее закрытие не закрыло буфер
+        text.detach()
+        if compress:
+            raw.close()
+    except Exception:
+        buffer.close()
+        raise
+
+    buffer.seek(0)
+    return buffer, filename, count
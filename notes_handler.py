@@ -1,11 +1,9 @@
 from idlelib.window import register_callback
 
 import telebot
+import tempfile
 
 from telebot import types
-import json
-import os
-import tempfile
 from datetime import datetime
 from config import (
     BOT_TOKEN, bot_logger, OPEN_METEO_URL, MOSCOW_COORDS,
@@ -13,8 +11,13 @@ from config import (
 )
 
 from database import Database
+from notes_export import build_notes_export, SPOOL_MAX_SIZE
+from notes_import import import_notes, ImportFormatError
 import logging
 from keyboards import create_main_keyboard, create_hide_keyboard
+from message_router import MessageRouter, CallbackRouter
+from metrics import timed_handler
+from http_sessions import telegram_session
 
 # Настройка логгера
 logger = logging.getLogger('telegram_bot.notes')
@@ -43,10 +46,84 @@ def escape_markdown(text):
         text = text.replace(char, '\\' + char)
     return text
 
+# Тексты ответов, общие для синхронного и асинхронного рантайма
+NO_DATABASE_TEXT = "❌ База данных не инициализирована"
+
+NO_NOTES_TEXT = (
+    "📭 У вас пока нет заметок.\n"
+    "Добавьте первую заметку командой /note_add"
+)
+
+NOTES_MENU_TEXT = (
+    "📝 *Менеджер заметок*\n\n"
+    "Выберите действие:\n"
+    "• 📝 Новая заметка - добавить заметку\n"
+    "• 📋 Список заметок - просмотреть все\n"
+    "• 🔍 Поиск заметок - найти по тексту\n"
+    "• 📊 Статистика - количество заметок\n"
+    "• 📁 Экспорт заметок - скачать файл\n\n"
+    "Или используйте команды:\n"
+    "/note_add - добавить заметку\n"
+    "/note_list - список заметок\n"
+    "/note_find - поиск заметок\n"
+    "/note_count - статистика\n"
+    "/note_import - импорт из файла"
+)
+
+NOTE_ADD_PROMPT = (
+    "📝 *Добавление новой заметки*\n\n"
+    "Шаг 1/2: Введите *заголовок* заметки:\n"
+    "(не более 100 символов)\n\n"
+    "Или используйте кнопки ниже:"
+)
+
+NOTE_FIND_PROMPT = (
+    "🔍 *Поиск заметок*\n\n"
+    "Введите текст для поиска:\n"
+    "• Поиск ведется по заголовкам и содержанию\n"
+    "• Можно искать по нескольким словам\n"
+    "• Для точного поиска используйте кавычки\n\n"
+    "Пример: `важная встреча`"
+)
+
+NOTE_EDIT_PROMPT = (
+    "✏️ *Редактирование заметки*\n\n"
+    "Введите ID заметки для редактирования.\n"
+    "ID можно узнать командой /note_list\n\n"
+    "Или введите `отмена` для выхода."
+)
+
+NOTE_DEL_PROMPT = (
+    "🗑 *Удаление заметки*\n\n"
+    "Введите ID заметки для удаления.\n"
+    "ID можно узнать командой /note_list\n\n"
+    "Или введите `отмена` для выхода."
+)
+
+NOTE_IMPORT_PROMPT = (
+    "📥 *Импорт заметок*\n\n"
+    "Отправьте файл с заметками:\n"
+    "• JSON - массив объектов или JSON Lines\n"
+    "• CSV - с заголовком (title, content, tags, category)\n"
+    "• TXT - файл экспорта /note_export (в том числе .gz) "
+    "или абзацы через пустую строку\n\n"
+    "Или введите `отмена` для выхода."
+)
+
+INVALID_ID_TEXT = "❌ Неверный формат ID. Введите числовой ID или 'отмена':"
+
+# Ответы, отменяющие ввод ID или ожидание файла
+CANCEL_WORDS = ['отмена', 'cancel', '❌ отмена']
+
+
 class NotesHandler:
-    def __init__(self, bot):
+    def __init__(self, bot, db=None, router=None, callbacks=None):
         self.bot = bot
-        self.db = Database()
+        self.db = db if db is not None else Database()
+        # Таблицы маршрутов текстовых сообщений и callback-запросов
+        # (устанавливаются в бот вызовом install после регистрации всех обработчиков)
+        self.router = router if router is not None else MessageRouter()
+        self.callbacks = callbacks if callbacks is not None else CallbackRouter(bot)
         self.user_states = {}  # Для хранения состояний пользователей
 
         # Определения состояний
@@ -56,6 +133,14 @@ class NotesHandler:
         self.STATE_EDIT_NOTE_FIELD = "edit_note_field"
         self.STATE_DELETE_NOTE_ID = "delete_note_id"
         self.STATE_SEARCH_NOTES = "search_notes"
+        self.STATE_IMPORT_NOTES = "import_notes"
+
+        # Количество заметок на одной странице списка
+        self.NOTES_PAGE_SIZE = 10
+        # С какого количества заметок экспорт сжимается gzip
+        self.EXPORT_COMPRESS_MIN_NOTES = 5000
+        # Максимальный размер файла импорта (ограничение Bot API на скачивание)
+        self.IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
 
 
 
@@ -112,26 +197,183 @@ class NotesHandler:
     def handle_note_list1(self,message):
         """Показ списка заметок"""
         if not self.db:
-            self.bot.send_message(message.chat.id, "❌ База данных не инициализирована")
+            self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
             return
         user_id = message.from_user.id
         logger.info(f"NOTE_LIST запрошен: user_id={user_id}")
 
-        notes = self.db.get_user_notes(user_id, limit=20)
+        response, markup = self.build_notes_page(user_id)
 
-        if not notes:
-            self.bot.send_message(
-                message.chat.id,
-                "📭 У вас пока нет заметок.\n"
-                "Добавьте первую заметку командой /note_add"
-            )
+        if response is None:
+            self.bot.send_message(message.chat.id, NO_NOTES_TEXT)
             return
 
+        self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup
+        )
+
+    def build_notes_page(self, user_id, after_local_id=None, before_local_id=None, category=None):
+        """Формирование текста и inline-навигации для страницы списка заметок
+
+        Возвращает (None, None), если на странице нет заметок.
+        """
+        page = self.db.get_user_notes_page(
+            user_id,
+            page_size=self.NOTES_PAGE_SIZE,
+            after_local_id=after_local_id,
+            before_local_id=before_local_id,
+            category=category
+        )
+        return self.render_notes_page(page, category)
+
+    # Общая логика обработчиков: состояния, проверка ввода, тексты и
+    # клавиатуры. Методы ниже не отправляют сообщений и не обращаются к
+    # базе - их используют и NotesHandler, и AsyncNotesHandler.
+
+    def clear_state(self, user_id):
+        """Сброс состояния пользователя"""
+        self.user_states.pop(user_id, None)
+
+    def get_state(self, user_id):
+        """Текущее состояние пользователя (строка) или None"""
+        state = self.user_states.get(user_id)
+        if isinstance(state, dict):
+            return state.get('state')
+        return state
+
+    @staticmethod
+    def is_cancel(text):
+        """Ответ пользователя отменяет текущую операцию"""
+        return bool(text) and text.lower() in CANCEL_WORDS
+
+    @staticmethod
+    def parse_note_id(text):
+        """ID заметки из текста или None"""
+        try:
+            return int(text.strip())
+        except (ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def command_argument(text):
+        """Аргумент команды (/note_find текст) или None"""
+        args = (text or '').split(maxsplit=1)
+        return args[1] if len(args) > 1 else None
+
+    def begin_note_add(self, user_id):
+        """Переход к вводу заголовка: (текст, клавиатура)"""
+        self.user_states[user_id] = self.STATE_ADD_NOTE_TITLE
+
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+        markup.add(
+            types.KeyboardButton("📝 Пример заголовка"),
+            types.KeyboardButton("❌ Отмена")
+        )
+        return NOTE_ADD_PROMPT, markup
+
+    def begin_note_find(self, user_id):
+        """Переход к вводу поискового запроса: (текст, клавиатура)"""
+        self.user_states[user_id] = self.STATE_SEARCH_NOTES
+
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+        markup.add(
+            types.KeyboardButton("🔙 Назад к заметкам"),
+            types.KeyboardButton("❌ Отмена")
+        )
+        return NOTE_FIND_PROMPT, markup
+
+    def begin_note_import(self, user_id):
+        """Переход к ожиданию файла импорта: (текст, клавиатура)"""
+        self.user_states[user_id] = self.STATE_IMPORT_NOTES
+        return NOTE_IMPORT_PROMPT, self.create_cancel_keyboard()
+
+    def process_note_title(self, user_id, text):
+        """Обработка введенного заголовка: (текст ответа, клавиатура)
+
+        При корректном заголовке пользователь переходит к вводу содержания.
+        """
+        if text == "📝 Пример заголовка":
+            title = "Моя первая заметка"
+        else:
+            title = text.strip()
+
+            if len(title) > 100:
+                return "❌ Заголовок слишком длинный (макс. 100 символов). Попробуйте снова:", None
+
+        # Сохраняем заголовок и переходим к содержанию
+        self.user_states[user_id] = {
+            'state': self.STATE_ADD_NOTE_CONTENT,
+            'temp_data': {'title': title}
+        }
+
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
+        markup.add(
+            types.KeyboardButton("📝 Пример содержания"),
+            # types.KeyboardButton("🏷 Добавить теги"),
+            # types.KeyboardButton("📁 Выбрать категорию"),
+            types.KeyboardButton("❌ Отмена")
+        )
+
+        return (
+            f"📝 *Заголовок сохранен:* {title}\n\n"
+            "Шаг 2/2: Введите *содержание* заметки:\n"
+            "(не более 4000 символов)\n\n"
+            "Или используйте кнопки ниже:"
+        ), markup
+
+    @staticmethod
+    def parse_note_content(text):
+        """Содержание заметки из ввода: (содержание, текст ошибки)"""
+        if text == "📝 Пример содержания":
+            return "Это пример содержания заметки. Здесь можно писать текст, идеи, задачи и т.д.", None
+
+        content = text.strip()
+        if len(content) > 4000:
+            return None, "❌ Содержание слишком длинное (макс. 4000 символов). Попробуйте снова:"
+        return content, None
+
+    def render_note_added(self, note_id, temp_data):
+        """Ответ после добавления заметки: (текст, inline-клавиатура)"""
+        response = (
+            f"✅ *Заметка добавлена!*\n\n"
+            f"*Заголовок:* {temp_data['title']}\n"
+            f"*ID заметки:* `{note_id}`\n"
+            f"*Категория:* {temp_data.get('category', 'общее')}\n\n"
+            f"Просмотреть: /note_list\n"
+            f"Редактировать: /note_edit {note_id}"
+        )
+
+        markup = types.InlineKeyboardMarkup()
+        markup.add(
+            types.InlineKeyboardButton("📋 Меню заметок", callback_data="notes_list"),
+            #types.InlineKeyboardButton("➕ Новая заметка", callback_data="notes_add_new")
+        )
+        return response, markup
+
+    @staticmethod
+    def parse_page_callback(direction, cursor, category=None):
+        """Аргументы build_notes_page из notes_page:<prev|next>:<курсор>[:<категория>]"""
+        cursor_id = int(cursor)
+
+        if direction == "prev":
+            return {'before_local_id': cursor_id, 'category': category}
+        return {'after_local_id': cursor_id, 'category': category}
+
+    def render_notes_page(self, page, category=None):
+        """Текст и inline-навигация для страницы списка заметок
+
+        Возвращает (None, None), если на странице нет заметок.
+        """
+        if not page['notes']:
+            return None, None
+
         response = "📋 *Ваши заметки:*\n\n"
 
-        for i, note in enumerate(notes[:10], 1):  # Показываем первые 10
+        for i, note in enumerate(page['notes'], 1):
 
-            created = datetime.strptime(note['created_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
+            created = note.created_at.strftime('%d.%m.%Y')
             preview = note['content'][:50] + "..." if len(note['content']) > 50 else note['content']
 
             response += f"*{i}. {note['title']}*\n"
@@ -139,34 +381,30 @@ class NotesHandler:
             response += f"   {preview}\n"
             response += f"   ID: `{note['id']}`\n\n"
 
-        if len(notes) > 10:
-            response += f"*... и еще {len(notes) - 10} заметок*\n"
-
         response += "\nИспользуйте /note_find для поиска или /note_del для удаления"
 
-        # Создаем inline-клавиатуру для навигации
-        markup = types.InlineKeyboardMarkup(row_width=3)
-        buttons = [
-            types.InlineKeyboardButton("📥 Экспорт", callback_data="notes_export"),
-            types.InlineKeyboardButton("🔍 Поиск", callback_data="notes_search"),
-            types.InlineKeyboardButton("📊 Статистика", callback_data="notes_stats"),
-            types.InlineKeyboardButton("📌 Закрепить", callback_data="notes_pin_menu"),
-            types.InlineKeyboardButton("🗑 Удалить", callback_data="notes_delete_menu"),
-            types.InlineKeyboardButton("➕ Новая", callback_data="notes_add_new")
-        ]
-        markup.add(*buttons)
-
-        self.bot.send_message(
-            message.chat.id,
-            response
-        )
-
+        # Курсор (ID крайней заметки страницы) передается в callback_data
+        suffix = f":{category}" if category else ""
+        markup = types.InlineKeyboardMarkup(row_width=2)
+        buttons = []
+        if page['prev_cursor'] is not None:
+            buttons.append(types.InlineKeyboardButton(
+                "◀️", callback_data=f"notes_page:prev:{page['prev_cursor']}{suffix}"
+            ))
+        if page['next_cursor'] is not None:
+            buttons.append(types.InlineKeyboardButton(
+                "▶️", callback_data=f"notes_page:next:{page['next_cursor']}{suffix}"
+            ))
+        if buttons:
+            markup.row(*buttons)
+
+        return response, markup
 
     def handle_note_add1(self,message):
         """Начало добавления заметки"""
 
         if not self.db:
-            self.bot.send_message(message.chat.id, "❌ База данных не инициализирована")
+            self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
             return
         user_info = f"user_id={message.from_user.id}, username={message.from_user.username}"
         logger.info(f"NOTE_ADD начато: {user_info}")
@@ -179,52 +417,28 @@ class NotesHandler:
             message.from_user.last_name
         )
 
-        self.user_states[message.from_user.id] = self.STATE_ADD_NOTE_TITLE
-
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(
-            types.KeyboardButton("📝 Пример заголовка"),
-            types.KeyboardButton("❌ Отмена")
-        )
+        response, markup = self.begin_note_add(message.from_user.id)
 
         self.bot.send_message(
             message.chat.id,
-            "📝 *Добавление новой заметки*\n\n"
-            "Шаг 1/2: Введите *заголовок* заметки:\n"
-            "(не более 100 символов)\n\n"
-            "Или используйте кнопки ниже:",
+            response,
             reply_markup=markup
         )
 
     def handle_note_find1(self,message):
         """Поиск заметок"""
         if not self.db:
-            self.bot.send_message(message.chat.id, "❌ База данных не инициализирована")
+            self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
             return
         user_id = message.from_user.id
         logger.info(f"NOTE_FIND начат: user_id={user_id}")
 
-        # Проверяем аргументы команды
-        args = message.text.split(maxsplit=1)
-
-
         # Запрашиваем поисковый запрос
-        self.user_states[user_id] = self.STATE_SEARCH_NOTES
-
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(
-                types.KeyboardButton("🔙 Назад к заметкам"),
-                types.KeyboardButton("❌ Отмена")
-            )
+        response, markup = self.begin_note_find(user_id)
 
         self.bot.send_message(
                 message.chat.id,
-                "🔍 *Поиск заметок*\n\n"
-                "Введите текст для поиска:\n"
-                "• Поиск ведется по заголовкам и содержанию\n"
-                "• Можно искать по нескольким словам\n"
-                "• Для точного поиска используйте кавычки\n\n"
-                "Пример: `важная встреча`"
+                response
             )
 
     def handle_note_count1(self,message):
@@ -232,7 +446,17 @@ class NotesHandler:
         user_id = message.from_user.id
         logger.info(f"NOTE_COUNT запрошен: user_id={user_id}")
 
-        total_count = self.db.get_notes_count(user_id)
+        stats = self.db.get_note_stats(user_id)
+
+        self.bot.send_message(
+            message.chat.id,
+            self.render_note_stats(stats)
+
+        )
+
+    def render_note_stats(self, stats):
+        """Текст статистики заметок"""
+        total_count = stats['total']
 
         response = f"📊 *Статистика заметок*\n\n"
         response += f"Всего заметок: *{total_count}*\n\n"
@@ -240,14 +464,18 @@ class NotesHandler:
         if total_count == 0:
             response += "\n📝 Добавьте первую заметку командой /note_add"
         else:
+            response += "*По категориям:*\n"
+            for category, count in stats['categories'].items():
+                response += f"   📁 {category}: {count}\n"
+            response += f"\nОбъем текста: {stats['content_bytes'] / 1024:.1f} КБ\n"
+            if stats['last_modified']:
+                modified = datetime.strptime(stats['last_modified'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y %H:%M')
+                response += f"Последнее изменение: {modified}\n"
+
             response += f"\n📋 Показать все заметки: /note_list"
             response += f"\n🔍 Поиск по заметкам: /note_find"
 
-        self.bot.send_message(
-            message.chat.id,
-            response
-
-        )
+        return response
 
 
     def handle_note_export1(self,message):
@@ -255,62 +483,179 @@ class NotesHandler:
         user_id = message.from_user.id
         logger.info(f"NOTE_EXPORT запрошен: user_id={user_id}")
 
-        notes = self.db.get_all_user_notes(user_id)
+        total_count = self.db.get_notes_count(user_id)
 
-        if not notes:
+        if not total_count:
             self.bot.send_message(
                 message.chat.id,
                 "📭 Нет заметок для экспорта."
             )
             return
 
-        # Создаем временный файл
-        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8',
-                                         suffix='.txt', delete=False) as f:
-            f.write(f"Экспорт заметок пользователя @{message.from_user.username or 'unknown'}\n")
-            f.write(f"Дата экспорта: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
-            f.write("=" * 50 + "\n\n")
+        # Заметки читаются порциями и сразу пишутся в буфер - весь архив
+        # пользователя в памяти не собирается
+        try:
+            export_file, filename, count = build_notes_export(
+                self.db.iter_user_notes(user_id),
+                message.from_user.username,
+                compress=total_count >= self.EXPORT_COMPRESS_MIN_NOTES
+            )
+        except Exception as e:
+            logger.error(f"Ошибка создания файла экспорта: {e}")
+            self.bot.send_message(
+                message.chat.id,
+                "❌ Ошибка при создании файла экспорта."
+            )
+            return
+
+        def on_sent(future):
+            error = future.exception()
+            if error is None:
+                logger.info(f"NOTE_EXPORT выполнен: user_id={user_id}, notes={count}")
+                return
+            logger.error(f"Ошибка отправки файла: {error}")
+            self.bot.send_message(
+                message.chat.id,
+                "❌ Ошибка при создании файла экспорта."
+            )
+
+        try:
+            # Отправляем файл пользователю; файл закроет очередь отправки
+            # после загрузки, обработчик ее не ждет
+            self.bot.send_document(
+                message.chat.id,
+                export_file,
+                caption=f"📁 Экспорт заметок\nВсего заметок: {count}",
+                visible_file_name=filename
+            ).add_done_callback(on_sent)
 
-            for note in notes:
-                f.write(f"ЗАМЕТКА #{note['id']}\n")
-                f.write(f"Заголовок: {note['title']}\n")
-                f.write(f"Категория: {note['category']}\n")
-                f.write(f"Создана: {note['created_at']}\n")
-                f.write(f"Обновлена: {note['updated_at']}\n")
+        except Exception as e:
+            logger.error(f"Ошибка отправки файла: {e}")
+            self.bot.send_message(
+                message.chat.id,
+                "❌ Ошибка при создании файла экспорта."
+            )
+
+    def handle_note_import1(self, message):
+        """Начало импорта заметок из файла"""
+        user_id = message.from_user.id
+        logger.info(f"NOTE_IMPORT начат: user_id={user_id}")
+
+        response, markup = self.begin_note_import(user_id)
+
+        self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup
+        )
 
-                tags = json.loads(note['tags']) if note['tags'] else []
-                if tags:
-                    f.write(f"Теги: {', '.join(tags)}\n")
+    def download_document(self, document):
+        """Загрузка документа во временный буфер порциями
 
-                f.write("\nСодержание:\n")
-                f.write(note['content'])
-                f.write("\n" + "=" * 50 + "\n\n")
+        Буфер держится в памяти до SPOOL_MAX_SIZE байт и дальше
+        сбрасывается на диск; закрывает его вызывающий.
+        """
+        return self.fetch_file(self.bot.get_file_url(document.file_id))
 
-            temp_file = f.name
+    @staticmethod
+    def fetch_file(file_url):
+        """Скачивание файла по URL во временный буфер (блокирующий вызов)"""
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
 
         try:
-            # Отправляем файл пользователю
-            with open(temp_file, 'rb') as file:
-                self.bot.send_document(
-                    message.chat.id,
-                    file,
-                    caption=f"📁 Экспорт заметок\nВсего заметок: {len(notes)}"
-                )
+            with telegram_session().get(file_url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    buffer.write(chunk)
+        except Exception:
+            buffer.close()
+            raise
+
+        buffer.seek(0)
+        return buffer
+
+    def perform_note_import(self, message):
+        """Импорт заметок из присланного файла"""
+        user_id = message.from_user.id
+        document = message.document
 
-            logger.info(f"NOTE_EXPORT выполнен: user_id={user_id}, notes={len(notes)}")
+        # Очищаем состояние
+        self.clear_state(user_id)
 
-        except Exception as e:
-            logger.error(f"Ошибка отправки файла: {e}")
+        if self.is_too_large(document):
             self.bot.send_message(
                 message.chat.id,
-                "❌ Ошибка при создании файла экспорта."
+                self.render_too_large(),
+                reply_markup=types.ReplyKeyboardRemove()
             )
+            return
+
+        self.bot.send_message(
+            message.chat.id,
+            "⏳ Импортирую заметки...",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+
+        try:
+            upload = self.download_document(document)
+        except Exception as e:
+            # Текст ошибки не логируем: в URL файла содержится токен бота
+            logger.error(f"Ошибка загрузки файла импорта: user_id={user_id}, {type(e).__name__}")
+            self.bot.send_message(message.chat.id, "❌ Не удалось загрузить файл.")
+            return
+
+        # Файл разбирается и пишется в базу порциями - одна транзакция на порцию
+        try:
+            result = import_notes(self.db, user_id, upload, document.file_name)
+        except ImportFormatError as e:
+            logger.warning(f"NOTE_IMPORT: неверный формат файла, user_id={user_id}: {e}")
+            self.bot.send_message(message.chat.id, self.render_import_error(e))
+            return
         finally:
-            # Удаляем временный файл
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+            upload.close()
+
+        self.bot.send_message(message.chat.id, self.render_import_result(result))
+
+        logger.info(f"NOTE_IMPORT выполнен: user_id={user_id}, {result}")
+
+    def is_too_large(self, document):
+        """Файл превышает ограничение на размер импорта"""
+        return bool(document.file_size) and document.file_size > self.IMPORT_MAX_FILE_SIZE
+
+    def render_too_large(self):
+        """Текст отказа для слишком большого файла"""
+        return f"❌ Файл слишком большой (макс. {self.IMPORT_MAX_FILE_SIZE // (1024 * 1024)} МБ)."
+
+    @staticmethod
+    def render_import_error(error):
+        """Текст для файла, который не удалось разобрать"""
+        return (
+            f"❌ Не удалось разобрать файл: {error}\n"
+            "Поддерживаются JSON, CSV и TXT."
+        )
+
+    @staticmethod
+    def render_import_result(result):
+        """Итог импорта по словарю из notes_import.import_notes"""
+        if result['failed']:
+            response = "⚠️ Импорт прерван из-за ошибки записи.\n\n"
+        elif result.get('format_error'):
+            response = (
+                f"⚠️ Файл разобран не полностью: {result['format_error']}\n"
+                "Заметки до места ошибки сохранены - при повторной отправке "
+                "того же файла они добавятся еще раз.\n\n"
+            )
+        elif result['imported']:
+            response = "✅ *Импорт завершен!*\n\n"
+        else:
+            response = "📭 В файле не найдено заметок.\n\n"
+
+        response += f"Импортировано заметок: *{result['imported']}*\n"
+        if result['skipped']:
+            response += f"Пропущено пустых записей: {result['skipped']}\n"
+        if result['imported']:
+            response += "\n📋 Просмотреть: /note_list"
+        return response
 
     def handle_notes_button(self,message):
         """Обработка кнопки 'Заметки'"""
@@ -327,18 +672,7 @@ class NotesHandler:
 
         self.bot.send_message(
             message.chat.id,
-            "📝 *Менеджер заметок*\n\n"
-            "Выберите действие:\n"
-            "• 📝 Новая заметка - добавить заметку\n"
-            "• 📋 Список заметок - просмотреть все\n"
-            "• 🔍 Поиск заметок - найти по тексту\n"
-            "• 📊 Статистика - количество заметок\n"
-            "• 📁 Экспорт заметок - скачать файл\n\n"
-            "Или используйте команды:\n"
-            "/note_add - добавить заметку\n"
-            "/note_list - список заметок\n"
-            "/note_find - поиск заметок\n"
-            "/note_count - статистика",
+            NOTES_MENU_TEXT,
             reply_markup=markup
 
         )
@@ -348,6 +682,7 @@ class NotesHandler:
 
 
         @self.bot.message_handler(func=lambda message: message.text == "🔙 Главное меню")
+        @timed_handler
         def handle_back_to_main_button(message):
             """Обработка кнопки 'Главное меню'"""
             self.bot.send_message(
@@ -359,12 +694,12 @@ class NotesHandler:
     def register_handlers(self):
         """Регистрация обработчиков команд заметок"""
 
-        @self.bot.message_handler(commands=['note_add',"📝 Новая заметка"])
+        @self.router.command('note_add')
         def handle_note_add(message):
             """Начало добавления заметки"""
 
             if not self.db:
-                self.bot.send_message(message.chat.id, "❌ База данных не инициализирована")
+                self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
                 return
             user_info = f"user_id={message.from_user.id}, username={message.from_user.username}"
             logger.info(f"NOTE_ADD начато: {user_info}")
@@ -377,112 +712,59 @@ class NotesHandler:
                 message.from_user.last_name
             )
 
-            self.user_states[message.from_user.id] = self.STATE_ADD_NOTE_TITLE
-
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.add(
-                types.KeyboardButton("📝 Пример заголовка"),
-                types.KeyboardButton("❌ Отмена")
-            )
+            response, markup = self.begin_note_add(message.from_user.id)
 
             self.bot.send_message(
                 message.chat.id,
-                "📝 *Добавление новой заметки*\n\n"
-                "Шаг 1/2: Введите *заголовок* заметки:\n"
-                "(не более 100 символов)\n\n"
-                "Или используйте кнопки ниже:"
+                response
             )
 
-        @self.bot.message_handler(commands=['note_list', '📋 Список заметок'])
+        @self.router.command('note_list')
         def handle_note_list(message):
             """Показ списка заметок"""
             if not self.db:
-                self.bot.send_message(message.chat.id, "❌ База данных не инициализирована")
+                self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
                 return
             user_id = message.from_user.id
             logger.info(f"NOTE_LIST запрошен: user_id={user_id}")
 
-            notes = self.db.get_user_notes(user_id, limit=20)
+            response, markup = self.build_notes_page(user_id)
 
-            if not notes:
-                self.bot.send_message(
-                    message.chat.id,
-                    "📭 У вас пока нет заметок.\n"
-                    "Добавьте первую заметку командой /note_add"
-                )
+            if response is None:
+                self.bot.send_message(message.chat.id, NO_NOTES_TEXT)
                 return
 
-            response = "📋 *Ваши заметки:*\n\n"
-
-            for i, note in enumerate(notes[:10], 1):  # Показываем первые 10
-
-                created = datetime.strptime(note['created_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
-                preview = note['content'][:50] + "..." if len(note['content']) > 50 else note['content']
-
-                response += f"*{i}. {note['title']}*\n"
-                response += f"   📅 {created} | 📁 {note['category']}\n"
-                response += f"   {preview}\n"
-                response += f"   ID: `{note['id']}`\n\n"
-
-            if len(notes) > 10:
-                response += f"*... и еще {len(notes) - 10} заметок*\n"
-
-            response += "\nИспользуйте /note_find для поиска или /note_del для удаления заметок."
-
-            # Создаем inline-клавиатуру для навигации
-            markup = types.InlineKeyboardMarkup(row_width=3)
-            buttons = [
-                types.InlineKeyboardButton("📥 Экспорт", callback_data="notes_export"),
-                types.InlineKeyboardButton("🔍 Поиск", callback_data="notes_search"),
-                types.InlineKeyboardButton("📊 Статистика", callback_data="notes_stats"),
-                types.InlineKeyboardButton("📌 Закрепить", callback_data="notes_pin_menu"),
-                types.InlineKeyboardButton("🗑 Удалить", callback_data="notes_delete_menu"),
-                types.InlineKeyboardButton("➕ Новая", callback_data="notes_add_new")
-            ]
-            markup.add(*buttons)
-
             self.bot.send_message(
                 message.chat.id,
-                response
+                response,
+                reply_markup=markup
             )
 
-        @self.bot.message_handler(commands=['note_find', '🔍 Поиск заметок'])
+        @self.router.command('note_find')
         def handle_note_find(message):
             """Поиск заметок"""
             if not self.db:
-                self.bot.send_message(message.chat.id, "❌ База данных не инициализирована")
+                self.bot.send_message(message.chat.id, NO_DATABASE_TEXT)
                 return
             user_id = message.from_user.id
             logger.info(f"NOTE_FIND начат: user_id={user_id}")
 
             # Проверяем аргументы команды
-            args = message.text.split(maxsplit=1)
+            search_text = self.command_argument(message.text)
 
-            if len(args) > 1:
+            if search_text:
                 # Если поисковый запрос указан сразу
-                search_text = args[1]
                 self.perform_note_search(message, search_text)
             else:
                 # Запрашиваем поисковый запрос
-                self.user_states[user_id] = self.STATE_SEARCH_NOTES
-
-                markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-                markup.add(
-                    types.KeyboardButton("🔙 Назад к заметкам"),
-                    types.KeyboardButton("❌ Отмена")
-                )
+                response, markup = self.begin_note_find(user_id)
 
                 self.bot.send_message(
                     message.chat.id,
-                    "🔍 *Поиск заметок*\n\n"
-                    "Введите текст для поиска:\n"
-                    "• Поиск ведется по заголовкам и содержанию\n"
-                    "• Можно искать по нескольким словам\n"
-                    "• Для точного поиска используйте кавычки\n\n"
-                    "Пример: `важная встреча`"
+                    response
                 )
 
-        @self.bot.message_handler(commands=['note_edit', 'note_edit@TAU_Lab_Bot'])
+        @self.router.command('note_edit')
         def handle_note_edit(message):
             """Редактирование заметки"""
             user_id = message.from_user.id
@@ -506,14 +788,10 @@ class NotesHandler:
 
                 self.bot.send_message(
                     message.chat.id,
-                    "✏️ *Редактирование заметки*\n\n"
-                    "Введите ID заметки для редактирования.\n"
-                    "ID можно узнать командой /note_list\n\n"
-                    "Или введите `отмена` для выхода."
-
+                    NOTE_EDIT_PROMPT
                 )
 
-        @self.bot.message_handler(commands=['note_del', 'note_del@TAU_Lab_Bot'])
+        @self.router.command('note_del')
         def handle_note_del(message):
             """Удаление заметки"""
             user_id = message.from_user.id
@@ -537,109 +815,34 @@ class NotesHandler:
 
                 self.bot.send_message(
                     message.chat.id,
-                    "🗑 *Удаление заметки*\n\n"
-                    "Введите ID заметки для удаления.\n"
-                    "ID можно узнать командой /note_list\n\n"
-                    "Или введите `отмена` для выхода."
-
+                    NOTE_DEL_PROMPT
                 )
 
-        @self.bot.message_handler(commands=['note_count', '📊 Статистика'])
+        @self.router.command('note_count')
         def handle_note_count(message):
             """Показать количество заметок"""
-            user_id = message.from_user.id
-            logger.info(f"NOTE_COUNT запрошен: user_id={user_id}")
-
-            total_count = self.db.get_notes_count(user_id)
-
-
-
-
-            response = f"📊 *Статистика заметок*\n\n"
-            response += f"Всего заметок: *{total_count}*\n\n"
-
-
-
-
-
-            if total_count == 0:
-                response += "\n📝 Добавьте первую заметку командой /note_add"
-            else:
-                response += f"\n📋 Показать все заметки: /note_list"
-                response += f"\n🔍 Поиск по заметкам: /note_find"
-
-            self.bot.send_message(
-                message.chat.id,
-                response
-
-            )
+            self.handle_note_count1(message)
 
-        @self.bot.message_handler(commands=['note_export', '📁 Экспорт заметок'])
+        @self.router.command('note_export')
         def handle_note_export(message):
             """Экспорт заметок в файл"""
-            user_id = message.from_user.id
-            logger.info(f"NOTE_EXPORT запрошен: user_id={user_id}")
-
-            notes = self.db.get_all_user_notes(user_id)
-
-            if not notes:
-                self.bot.send_message(
-                    message.chat.id,
-                    "📭 Нет заметок для экспорта."
-                )
-                return
-
-            # Создаем временный файл
-            with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8',
-                                             suffix='.txt', delete=False) as f:
-                f.write(f"Экспорт заметок пользователя @{message.from_user.username or 'unknown'}\n")
-                f.write(f"Дата экспорта: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
-                f.write("=" * 50 + "\n\n")
-
-                for note in notes:
-                    f.write(f"ЗАМЕТКА #{note['id']}\n")
-                    f.write(f"Заголовок: {note['title']}\n")
-                    f.write(f"Категория: {note['category']}\n")
-                    f.write(f"Создана: {note['created_at']}\n")
-                    f.write(f"Обновлена: {note['updated_at']}\n")
-
-                    tags = json.loads(note['tags']) if note['tags'] else []
-                    if tags:
-                        f.write(f"Теги: {', '.join(tags)}\n")
-
-                    f.write("\nСодержание:\n")
-                    f.write(note['content'])
-                    f.write("\n" + "=" * 50 + "\n\n")
-
-                temp_file = f.name
-
-            try:
-                # Отправляем файл пользователю
-                with open(temp_file, 'rb') as file:
-                    self.bot.send_document(
-                        message.chat.id,
-                        file,
-                        caption=f"📁 Экспорт заметок\nВсего заметок: {len(notes)}"
-                    )
-
-                logger.info(f"NOTE_EXPORT выполнен: user_id={user_id}, notes={len(notes)}")
-
-            except Exception as e:
-                logger.error(f"Ошибка отправки файла: {e}")
-                self.bot.send_message(
-                    message.chat.id,
-                    "❌ Ошибка при создании файла экспорта."
-                )
-            finally:
-                # Удаляем временный файл
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
-
-        @self.bot.message_handler(func=lambda message:
-        message.from_user.id in self.user_states and
-        self.user_states[message.from_user.id] == self.STATE_ADD_NOTE_TITLE)
+            self.handle_note_export1(message)
+
+        @self.router.command('note_import')
+        def handle_note_import(message):
+            """Импорт заметок из файла"""
+            self.handle_note_import1(message)
+
+        @self.bot.message_handler(content_types=['document'], func=lambda message:
+        self.user_states.get(message.from_user.id) == self.STATE_IMPORT_NOTES or
+        (message.caption or '').startswith('/note_import'))
+        @timed_handler
+        def handle_note_import_document(message):
+            """Обработка файла для импорта заметок"""
+            self.perform_note_import(message)
+
+        # Состояния ввода перехватывают любой текст, кроме команд
+        @self.router.state(self.get_state, self.STATE_ADD_NOTE_TITLE)
         def handle_note_title_input(message):
             """Обработка ввода заголовка заметки"""
             user_id = message.from_user.id
@@ -648,52 +851,16 @@ class NotesHandler:
                 self.cancel_note_creation(message)
                 return
 
-            # types.KeyboardButton("🏷 Добавить теги"),
-            # types.KeyboardButton("📁 Выбрать категорию"),
-            # types.KeyboardButton("❌ Отмена")
-
-
-            if message.text == "📝 Пример заголовка":
-                title = "Моя первая заметка"
-
-            else:
-                title = message.text.strip()
-
-                if len(title) > 100:
-                    self.bot.send_message(
-                        message.chat.id,
-                        "❌ Заголовок слишком длинный (макс. 100 символов). Попробуйте снова:"
-                    )
-                    return
-
-            # Сохраняем заголовок и переходим к содержанию
-            self.user_states[user_id] = {
-                'state': self.STATE_ADD_NOTE_CONTENT,
-                'temp_data': {'title': title}
-            }
-
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-            markup.add(
-                types.KeyboardButton("📝 Пример содержания"),
-                # types.KeyboardButton("🏷 Добавить теги"),
-                # types.KeyboardButton("📁 Выбрать категорию"),
-                types.KeyboardButton("❌ Отмена")
-            )
+            response, markup = self.process_note_title(user_id, message.text)
 
             self.bot.send_message(
                 message.chat.id,
-                f"📝 *Заголовок сохранен:* {title}\n\n"
-                "Шаг 2/2: Введите *содержание* заметки:\n"
-                "(не более 4000 символов)\n\n"
-                "Или используйте кнопки ниже:",
+                response,
                 reply_markup=markup
 
             )
 
-        @self.bot.message_handler(func=lambda message:
-        message.from_user.id in self.user_states and
-        isinstance(self.user_states[message.from_user.id], dict) and
-        self.user_states[message.from_user.id].get('state') == self.STATE_ADD_NOTE_CONTENT)
+        @self.router.state(self.get_state, self.STATE_ADD_NOTE_CONTENT)
         def handle_note_content_input(message):
             """Обработка ввода содержания заметки"""
             user_id = message.from_user.id
@@ -703,26 +870,10 @@ class NotesHandler:
                 self.cancel_note_creation(message)
                 return
 
-            if message.text == "📝 Пример содержания":
-                content = "Это пример содержания заметки. Здесь можно писать текст, идеи, задачи и т.д."
-            # elif message.text == "🏷 Добавить теги":
-            #     # Здесь можно реализовать добавление тегов
-            #     self.bot.send_message(
-            #         message.chat.id,
-            #         "Введите теги через запятую (например: работа, важно, проект):"
-            #     )
-            #     # Продолжаем ожидать содержание
-            #     return
-
-            else:
-                content = message.text.strip()
-
-                if len(content) > 4000:
-                    self.bot.send_message(
-                        message.chat.id,
-                        "❌ Содержание слишком длинное (макс. 4000 символов). Попробуйте снова:"
-                    )
-                    return
+            content, error = self.parse_note_content(message.text)
+            if error:
+                self.bot.send_message(message.chat.id, error)
+                return
 
             # Добавляем заметку в БД
             note_id = self.db.add_note(
@@ -735,22 +886,10 @@ class NotesHandler:
 
             if note_id:
                 # Очищаем состояние
-                del self.user_states[user_id]
-
-                response = (
-                    f"✅ *Заметка добавлена!*\n\n"
-                    f"*Заголовок:* {temp_data['title']}\n"
-                    f"*ID заметки:* `{note_id}`\n"
-                    f"*Категория:* {temp_data.get('category', 'общее')}\n\n"
-                    f"Просмотреть: /note_list\n"
-                    f"Редактировать: /note_edit {note_id}"
-                )
+                self.clear_state(user_id)
+
+                response, markup = self.render_note_added(note_id, temp_data)
 
-                markup = types.InlineKeyboardMarkup()
-                markup.add(
-                    types.InlineKeyboardButton("📋 Меню заметок", callback_data="notes_list"),
-                    #types.InlineKeyboardButton("➕ Новая заметка", callback_data="notes_add_new")
-                )
                 markup2 = types.ReplyKeyboardRemove()
                 # markup2.add(
                 #     types.KeyboardButton("📋 Меню заметок"),
@@ -778,49 +917,51 @@ class NotesHandler:
                 )
 
         # Обработчики других состояний
-        @self.bot.message_handler(func=lambda message:
-        message.from_user.id in self.user_states and
-        self.user_states[message.from_user.id] == self.STATE_EDIT_NOTE_ID)
+        @self.router.state(self.get_state, self.STATE_EDIT_NOTE_ID)
         def handle_edit_note_id_input(message):
             """Обработка ввода ID для редактирования"""
             user_id = message.from_user.id
 
-            if message.text.lower() in ['отмена', 'cancel', '❌ отмена']:
+            if self.is_cancel(message.text):
                 self.cancel_operation(message)
                 return
 
-            try:
-                note_id = int(message.text.strip())
-                self.show_note_for_edit(message, note_id)
-            except ValueError:
-                self.bot.send_message(
-                    message.chat.id,
-                    "❌ Неверный формат ID. Введите числовой ID или 'отмена':"
-                )
+            note_id = self.parse_note_id(message.text)
+            if note_id is None:
+                self.bot.send_message(message.chat.id, INVALID_ID_TEXT)
+                return
+
+            self.show_note_for_edit(message, note_id)
 
-        @self.bot.message_handler(func=lambda message:
-        message.from_user.id in self.user_states and
-        self.user_states[message.from_user.id] == self.STATE_DELETE_NOTE_ID)
+        @self.router.state(self.get_state, self.STATE_DELETE_NOTE_ID)
         def handle_delete_note_id_input(message):
             """Обработка ввода ID для удаления"""
             user_id = message.from_user.id
 
-            if message.text.lower() in ['отмена', 'cancel', '❌ отмена']:
+            if self.is_cancel(message.text):
                 self.cancel_operation(message)
                 return
 
-            try:
-                note_id = int(message.text.strip())
-                self.confirm_note_delete(message, note_id)
-            except ValueError:
-                self.bot.send_message(
-                    message.chat.id,
-                    "❌ Неверный формат ID. Введите числовой ID или 'отмена':"
-                )
+            note_id = self.parse_note_id(message.text)
+            if note_id is None:
+                self.bot.send_message(message.chat.id, INVALID_ID_TEXT)
+                return
 
-        @self.bot.message_handler(func=lambda message:
-        message.from_user.id in self.user_states and
-        self.user_states[message.from_user.id] == self.STATE_SEARCH_NOTES)
+            self.confirm_note_delete(message, note_id)
+
+        @self.router.state(self.get_state, self.STATE_IMPORT_NOTES)
+        def handle_import_text_input(message):
+            """Текст вместо файла в режиме импорта"""
+            if self.is_cancel(message.text):
+                self.cancel_operation(message)
+                return
+
+            self.bot.send_message(
+                message.chat.id,
+                "📎 Отправьте файл с заметками (JSON, CSV или TXT) или введите 'отмена':"
+            )
+
+        @self.router.state(self.get_state, self.STATE_SEARCH_NOTES)
         def handle_search_input(message):
             """Обработка поискового запроса"""
             user_id = message.from_user.id
@@ -871,9 +1012,7 @@ class NotesHandler:
 
     def cancel_note_creation(self, message):
         """Отмена создания заметки"""
-        user_id = message.from_user.id
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.clear_state(message.from_user.id)
 
         self.bot.send_message(
             message.chat.id,
@@ -882,9 +1021,7 @@ class NotesHandler:
 
     def cancel_operation(self, message):
         """Отмена текущей операции"""
-        user_id = message.from_user.id
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.clear_state(message.from_user.id)
 
         self.bot.send_message(
             message.chat.id,
@@ -896,14 +1033,21 @@ class NotesHandler:
         user_id = message.from_user.id
 
         # Очищаем состояние
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.clear_state(user_id)
 
         notes = self.db.search_notes(user_id, search_text)
 
+        self.bot.send_message(
+            message.chat.id,
+            self.render_search_results(search_text, notes)
+        )
+
+        logger.info(f"NOTE_SEARCH выполнен: user_id={user_id}, query='{search_text}', found={len(notes)}")
+
+    def render_search_results(self, search_text, notes):
+        """Текст результатов поиска"""
         if not notes:
-            self.bot.send_message(
-                message.chat.id,
+            return (
                 f"🔍 *Результаты поиска по запросу:* `{search_text}`\n\n"
                 "❌ Заметки не найдены.\n\n"
                 "Попробуйте:\n"
@@ -911,14 +1055,17 @@ class NotesHandler:
                 "• Использовать другие ключевые слова\n"
                 "• Просмотреть все заметки: /note_list"
             )
-            return
 
         response = f"🔍 *Результаты поиска по запросу:* `{search_text}`\n\n"
         response += f"Найдено заметок: *{len(notes)}*\n\n"
 
         for i, note in enumerate(notes[:5], 1):  # Показываем первые 5
-            created = datetime.strptime(note['created_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
-            preview = note['content'][:100] + "..." if len(note['content']) > 100 else note['content']
+            created = note.created_at.strftime('%d.%m.%Y')
+            # Фрагмент с подсвеченными совпадениями из полнотекстового индекса
+            if note.get('snippet'):
+                preview = note['snippet']
+            else:
+                preview = note['content'][:100] + "..." if len(note['content']) > 100 else note['content']
 
             response += f"*{i}. {note['title']}*\n"
             response += f"   📅 {created} | 📁 {note['category']}\n"
@@ -929,14 +1076,12 @@ class NotesHandler:
             response += f"*... и еще {len(notes) - 5} заметок*\n"
 
         response += "\nДля просмотра всех заметок используйте /note_list или для удаления /note_del"
+        return response
 
-        self.bot.send_message(
-            message.chat.id,
-            response
-        )
-
-        logger.info(f"NOTE_SEARCH выполнен: user_id={user_id}, query='{search_text}', found={len(notes)}")
-
+    @staticmethod
+    def render_note_not_found(note_id):
+        """Текст для отсутствующей или чужой заметки"""
+        return f"❌ Заметка с ID `{note_id}` не найдена или вам не принадлежит."
 
     def show_note_for_edit(self, message, note_id):
         """Показать заметку для редактирования"""
@@ -946,17 +1091,25 @@ class NotesHandler:
         if not note:
             self.bot.send_message(
                 message.chat.id,
-                f"❌ Заметка с ID `{note_id}` не найдена или вам не принадлежит."
+                self.render_note_not_found(note_id)
             )
             return
 
         # Очищаем состояние
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.clear_state(user_id)
+
+        response, markup = self.render_note_for_edit(note_id, note)
+
+        self.bot.send_message(
+            message.chat.id,
+            response
+        )
 
-        created = datetime.strptime(note['created_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y %H:%M')
-        updated = datetime.strptime(note['updated_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y %H:%M')
-        tags = json.loads(note['tags']) if note['tags'] else []
+    def render_note_for_edit(self, note_id, note):
+        """Карточка заметки для редактирования: (текст, inline-клавиатура)"""
+        created = note.created_at.strftime('%d.%m.%Y %H:%M')
+        updated = note.updated_at.strftime('%d.%m.%Y %H:%M')
+        tags = note.tags
 
         response = (
             f"✏️ *Редактирование заметки #`{note_id}`*\n\n"
@@ -982,10 +1135,7 @@ class NotesHandler:
         ]
         markup.add(*buttons)
 
-        self.bot.send_message(
-            message.chat.id,
-            response
-        )
+        return response, markup
 
     def confirm_note_delete(self, message, note_id):
         """Подтверждение удаления заметки"""
@@ -995,14 +1145,24 @@ class NotesHandler:
         if not note:
             self.bot.send_message(
                 message.chat.id,
-                f"❌ Заметка с ID `{note_id}` не найдена или вам не принадлежит."
+                self.render_note_not_found(note_id)
             )
             return
 
         # Очищаем состояние
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.clear_state(user_id)
+
+        response, markup = self.render_delete_confirm(note_id, note)
 
+        self.bot.send_message(
+            message.chat.id,
+            response,
+            reply_markup=markup
+
+        )
+
+    def render_delete_confirm(self, note_id, note):
+        """Запрос подтверждения удаления: (текст, inline-клавиатура)"""
         response = (
             f"🗑 *Подтверждение удаления*\n\n"
             f"Вы действительно хотите удалить заметку?\n\n"
@@ -1018,91 +1178,95 @@ class NotesHandler:
             types.InlineKeyboardButton("❌ Нет, отменить", callback_data="cancel_delete")
         )
 
-        self.bot.send_message(
-            message.chat.id,
-            response,
-            reply_markup=markup
-
-        )
+        return response, markup
 
     def register_callbacks(self):
         """Регистрация обработчиков callback-запросов для заметок"""
+        callbacks = self.callbacks
 
-        @self.bot.callback_query_handler(func=lambda call: True)
-        def handle_note_callbacks(call):
-            """Обработка callback-запросов для заметок"""
-            user_id = call.from_user.id
-            data = call.data
-
-            logger.info(f"CALLBACK_NOTE: user_id={user_id}, data={data}")
-
-            if data.startswith("confirm_delete:"):
-            # Подтверждение удаления
-                note_id = int(data.split(":")[1])
-
-                if self.db.delete_note(user_id, note_id):
-                    self.bot.answer_callback_query(call.id, "Заметка удалена!")
-                    self.bot.edit_message_text(
-                        "✅ Заметка успешно удалена.",
-                        call.message.chat.id,
-                        call.message.message_id
-                    )
-                else:
-                    self.bot.answer_callback_query(call.id, "Ошибка удаления!")
-
-            elif data == "cancel_delete":
-            # Отмена удаления
-                self.bot.answer_callback_query(call.id, "Удаление отменено")
+        @callbacks.route('confirm_delete')
+        def handle_confirm_delete(call, note_id):
+            """Подтверждение удаления"""
+            if self.db.delete_note(call.from_user.id, int(note_id)):
+                callbacks.answer(call, "Заметка удалена!")
                 self.bot.edit_message_text(
+                    "✅ Заметка успешно удалена.",
+                    call.message.chat.id,
+                    call.message.message_id
+                )
+            else:
+                callbacks.answer(call, "Ошибка удаления!")
+
+        @callbacks.route('cancel_delete')
+        def handle_cancel_delete(call):
+            """Отмена удаления"""
+            callbacks.answer(call, "Удаление отменено")
+            self.bot.edit_message_text(
                 "❌ Удаление отменено.",
                 call.message.chat.id,
                 call.message.message_id
             )
 
-            elif data == "notes_list":
-                # Показ списка заметок
-                self.bot.answer_callback_query(call.id)
-                self.handle_notes_button(call.message)
-
-            elif data == "notes_add_new":
-                # Добавление новой заметки
-                self.bot.answer_callback_query(call.id)
-                self.handle_note_add1(call.message)
-
-            elif data == "notes_search":
-                # Поиск заметок
-                self.bot.answer_callback_query(call.id)
-                self.handle_note_find1(call.message)
-
-            elif data == "notes_stats":
-                # Статистика
-                self.bot.answer_callback_query(call.id)
-                self.handle_note_count1(call.message)
-
-            elif data == "notes_export":
-                # Экспорт заметок
-                self.bot.answer_callback_query(call.id, "📁 Создаю файл экспорта...")
-                self.handle_note_export1(call.message)
-            elif data.startswith("edit_"):
-                # Редактирование определенного поля
-                parts = data.split(":")
-                if len(parts) == 2:
-                    action, note_id = parts[0], int(parts[1])
-
-                    # Здесь можно реализовать обработку редактирования
-                    self.bot.answer_callback_query(
-                        call.id,
-                        f"Редактирование: {action.replace('edit_', '')}"
-                    )
+        # Категория может содержать ':' - отделяем только направление и курсор
+        @callbacks.route('notes_page', maxsplit=2)
+        def handle_notes_page(call, *args):
+            """Листание списка заметок: notes_page:<prev|next>:<курсор>[:<категория>]"""
+            response, markup = self.build_notes_page(call.from_user.id, **self.parse_page_callback(*args))
 
-                    # Пока просто показываем сообщение
-                    self.bot.send_message(
-                        call.message.chat.id,
-                        f"Для редактирования {action.replace('edit_', '')} "
-                        f"заметки #{note_id} используйте команду:\n"
-                        f"/note_edit {note_id}"
-                    )
+            if response is None:
+                callbacks.answer(call, "📭 Больше заметок нет")
+                return
+
+            callbacks.answer(call)
+            self.bot.edit_message_text(
+                response,
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=markup
+            )
 
+        @callbacks.route('notes_list')
+        def handle_notes_list(call):
+            """Показ списка заметок"""
+            callbacks.answer(call)
+            self.handle_notes_button(call.message)
 
-            else:
-                self.bot.answer_callback_query(call.id, "❌ Действие не распознано")
\ No newline at end of file
+        @callbacks.route('notes_add_new')
+        def handle_notes_add_new(call):
+            """Добавление новой заметки"""
+            callbacks.answer(call)
+            self.handle_note_add1(call.message)
+
+        @callbacks.route('notes_search')
+        def handle_notes_search(call):
+            """Поиск заметок"""
+            callbacks.answer(call)
+            self.handle_note_find1(call.message)
+
+        @callbacks.route('notes_stats')
+        def handle_notes_stats(call):
+            """Статистика"""
+            callbacks.answer(call)
+            self.handle_note_count1(call.message)
+
+        @callbacks.route('notes_export')
+        def handle_notes_export(call):
+            """Экспорт заметок"""
+            callbacks.answer(call, "📁 Создаю файл экспорта...")
+            self.handle_note_export1(call.message)
+
+        @callbacks.family('edit_')
+        def handle_edit_field(call, field, note_id):
+            """Редактирование определенного поля: edit_<поле>:<ID>"""
+            note_id = int(note_id)
+
+            # Здесь можно реализовать обработку редактирования
+            callbacks.answer(call, f"Редактирование: {field}")
+
+            # Пока просто показываем сообщение
+            self.bot.send_message(
+                call.message.chat.id,
+                f"Для редактирования {field} "
+                f"заметки #{note_id} используйте команду:\n"
+                f"/note_edit {note_id}"
+            )
@@ -0,0 +1,335 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone
+
+from notes_export import SEPARATOR
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.notes.import')
+
+# Сколько заметок записывать в базу одной транзакцией
+IMPORT_CHUNK_SIZE = 1000
+
+# Ограничение заголовка как при ручном добавлении заметки
+MAX_TITLE_LENGTH = 100
+
+# Поддерживаемые расширения файлов
+JSON_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+CSV_EXTENSIONS = ('.csv',)
+TEXT_EXTENSIONS = ('.txt', '.md', '')
+
+# Синонимы полей в файлах других приложений
+_FIELD_ALIASES = {
+    'title': ('title', 'name', 'subject', 'заголовок'),
+    'content': ('content', 'text', 'body', 'note', 'содержание'),
+    'tags': ('tags', 'labels', 'теги'),
+    'category': ('category', 'folder', 'notebook', 'категория'),
+    'created_at': ('created_at', 'created', 'создана'),
+    'updated_at': ('updated_at', 'updated', 'modified', 'обновлена'),
+}
+
+# Строки текстового экспорта (см. notes_export.write_notes_export)
+_EXPORT_HEADER = 'Экспорт заметок пользователя'
+_EXPORT_NOTE = 'ЗАМЕТКА #'
+_EXPORT_CONTENT = 'Содержание:'
+_EXPORT_FIELDS = {
+    'Заголовок:': 'title',
+    'Категория:': 'category',
+    'Создана:': 'created_at',
+    'Обновлена:': 'updated_at',
+    'Теги:': 'tags',
+}
+
+# Размер порции при чтении JSON-массива
+_JSON_READ_SIZE = 64 * 1024
+# Начало массива и разделители между его элементами
+_JSON_ARRAY_START = re.compile(r'\s*\[')
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+class ImportFormatError(ValueError):
+    """Файл импорта не удалось разобрать"""
+
+
+def _pick(raw, field):
+    """Значение поля по первому найденному синониму"""
+    for alias in _FIELD_ALIASES[field]:
+        value = raw.get(alias)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _parse_tags(value):
+    """Теги из списка, JSON-строки или строки через запятую"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        if isinstance(value, str):
+            value = value.replace(';', ',').split(',')
+    return [str(tag).strip() for tag in value if str(tag).strip()]
+
+
+def _parse_timestamp(value):
+    """Метка времени в формате SQLite (UTC) или None, если разобрать не удалось"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # SQLite хранит CURRENT_TIMESTAMP в UTC - смещение переводим, а не отбрасываем
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def normalize_note(raw):
+    """Приведение записи из файла к полям Database.add_notes_bulk
+
+    Возвращает None для записей без заголовка и содержания. Если
+    заголовка нет, берется первая строка содержания.
+    """
+    fields = {str(key).strip().lower(): value for key, value in raw.items() if key is not None}
+
+    title = str(_pick(fields, 'title') or '').strip()
+    content = str(_pick(fields, 'content') or '').strip()
+    if not title and not content:
+        return None
+    if not title:
+        title = content.split('\n', 1)[0].strip()
+
+    return {
+        'title': title[:MAX_TITLE_LENGTH],
+        'content': content,
+        'tags': _parse_tags(_pick(fields, 'tags')),
+        'category': str(_pick(fields, 'category') or 'general').strip(),
+        'created_at': _parse_timestamp(_pick(fields, 'created_at')),
+        'updated_at': _parse_timestamp(_pick(fields, 'updated_at')),
+    }
+
+
+def _iter_json_array(text):
+    """Потоковый разбор JSON-массива: в памяти только текущая порция"""
+    decoder = json.JSONDecoder()
+    buffer = text.read(_JSON_READ_SIZE)
+    pos = _JSON_ARRAY_START.match(buffer).end()
+    eof = False
+
+    while True:
+        pos = _JSON_SEPARATORS.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # Элемент не поместился в порцию - дочитываем
+            if eof:
+                raise ImportFormatError("Некорректный JSON-массив")
+            chunk = text.read(_JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+
+
+def iter_json_records(text):
+    """Записи из JSON-массива объектов или JSON Lines (объект на строку)"""
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    text.seek(0)
+
+    if not first:
+        return
+    if first == '[':
+        items = _iter_json_array(text)
+    elif first == '{':
+        items = (json.loads(line) for line in text if line.strip())
+    else:
+        raise ImportFormatError("Ожидался JSON-массив объектов или JSON Lines")
+
+    try:
+        for item in items:
+            if isinstance(item, dict):
+                yield item
+    except json.JSONDecodeError as e:
+        raise ImportFormatError(f"Некорректный JSON: {e}")
+
+
+def iter_csv_records(text):
+    """Записи из CSV с заголовком; разделитель определяется по началу файла"""
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    try:
+        yield from csv.DictReader(text, dialect=dialect)
+    except csv.Error as e:
+        raise ImportFormatError(f"Некорректный CSV: {e}")
+
+
+def iter_export_records(lines):
+    """Записи из текстового экспорта бота (формат /note_export)"""
+    note = None
+    content = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if content is not None:
+            # Содержание идет до строки-разделителя
+            if line == SEPARATOR:
+                note['content'] = '\n'.join(content)
+                yield note
+                note = content = None
+            else:
+                content.append(line)
+            continue
+
+        if line.startswith(_EXPORT_NOTE):
+            note = {}
+        elif note is not None:
+            if line == _EXPORT_CONTENT:
+                content = []
+                continue
+            for prefix, field in _EXPORT_FIELDS.items():
+                if line.startswith(prefix):
+                    note[field] = line[len(prefix):].strip()
+                    break
+
+    # Оборванный файл: сохраняем последнюю заметку как есть
+    if note is not None and content is not None:
+        note['content'] = '\n'.join(content)
+        yield note
+
+
+def iter_text_records(lines):
+    """Записи из простого текста: абзацы через пустую строку, первая строка - заголовок"""
+    paragraph = []
+
+    for line in lines:
+        line = line.rstrip()
+        if line:
+            paragraph.append(line)
+            continue
+        if paragraph:
+            yield {'title': paragraph[0], 'content': '\n'.join(paragraph[1:]) or paragraph[0]}
+            paragraph = []
+
+    if paragraph:
+        yield {'title': paragraph[0], 'content': '\n'.join(paragraph[1:]) or paragraph[0]}
+
+
+def iter_txt_records(text):
+    """Записи из TXT: экспорт бота распознается по заголовку, иначе - абзацы"""
+    first_line = ''
+    for line in text:
+        if line.strip():
+            first_line = line.strip()
+            break
+    text.seek(0)
+
+    if first_line.startswith((_EXPORT_HEADER, _EXPORT_NOTE)):
+        return iter_export_records(text)
+    return iter_text_records(text)
+
+
+def iter_import_records(stream, filename):
+    """Сырые записи из загруженного файла
+
+    stream - двоичный файл с поддержкой seek (например,
+    SpooledTemporaryFile), сжатый gzip файл распаковывается на лету.
+    Формат выбирается по расширению: JSON/JSON Lines, CSV или TXT
+    (включая файлы /note_export, в том числе .txt.gz).
+    """
+    name = (filename or '').lower()
+    if stream.read(2) == b'\x1f\x8b':
+        stream.seek(0)
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+        name = name[:-3] if name.endswith('.gz') else name
+    stream.seek(0)
+
+    extension = os.path.splitext(name)[1]
+    if extension in JSON_EXTENSIONS:
+        parse = iter_json_records
+    elif extension in CSV_EXTENSIONS:
+        parse = iter_csv_records
+    elif extension in TEXT_EXTENSIONS:
+        parse = iter_txt_records
+    else:
+        raise ImportFormatError(f"Неподдерживаемый формат файла: {extension}")
+
+    # utf-8-sig снимает BOM, который добавляют Excel и Блокнот
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        yield from parse(text)
+    except (OSError, EOFError) as e:
+        raise ImportFormatError(f"Не удалось прочитать файл: {e}")
+
+
+def import_notes(db, user_id, stream, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """Потоковый импорт заметок из файла в базу
+
+    Записи читаются и нормализуются по одной, в базу уходят порциями по
+    chunk_size через Database.add_notes_bulk - одна транзакция на
+    порцию. При ошибке записи импорт останавливается, уже записанные
+    порции остаются.
+
+    Если файл оборван или испорчен в середине, заметки до места ошибки
+    записываются, а текст ошибки попадает в format_error - пользователь
+    должен узнать, что часть файла уже импортирована. ImportFormatError
+    выбрасывается, только если из файла не записано ни одной заметки.
+
+    Возвращает словарь: imported, skipped (записи без заголовка и
+    содержания), failed (была ли ошибка записи), format_error (None или
+    текст ошибки разбора).
+    """
+    result = {'imported': 0, 'skipped': 0, 'failed': False, 'format_error': None}
+    chunk = []
+
+    def flush():
+        ids = db.add_notes_bulk(user_id, chunk)
+        chunk.clear()
+        if ids is None:
+            result['failed'] = True
+            return False
+        result['imported'] += len(ids)
+        return True
+
+    try:
+        for raw in iter_import_records(stream, filename):
+            note = normalize_note(raw)
+            if note is None:
+                result['skipped'] += 1
+                continue
+            chunk.append(note)
+            if len(chunk) >= chunk_size and not flush():
+                return result
+    except ImportFormatError as e:
+        if not result['imported'] and not chunk:
+            raise
+        result['format_error'] = str(e)
+        logger.warning(f"Импорт заметок прерван ошибкой формата: user_id={user_id}, "
+                       f"file={filename}, записано до ошибки: {result['imported'] + len(chunk)}")
+
+    if chunk:
+        flush()
+
+    logger.info(f"Импорт заметок: user_id={user_id}, file={filename}, {result}")
+    return result
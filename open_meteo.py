@@ -0,0 +1,206 @@
+"""Клиент Open-Meteo: бюджет времени на запрос и предохранитель
+
+Медленный Open-Meteo не должен занимать поток обработчика: у каждого
+запроса есть бюджет времени (deadline), в который укладываются все
+попытки - таймауты попыток и паузы между ними урезаются до остатка
+бюджета. Ошибки сети, таймауты, 429 и 5xx считает предохранитель; пока
+он разомкнут, запрос сразу завершается CircuitOpenError, и кэш отдает
+последние данные либо обработчик - быстрый ответ об ошибке. Время
+запросов по исходу и состояние предохранителя пишутся в метрики.
+"""
+import logging
+import threading
+import time
+
+import requests
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+from config import (
+    OPEN_METEO_URL, OPEN_METEO_DEADLINE, HTTP_RETRIES, HTTP_BACKOFF,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIMEOUT, CIRCUIT_HALF_OPEN_CALLS
+)
+from http_sessions import open_meteo_session
+from metrics import registry
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.open_meteo')
+
+# Коды, при которых запрос стоит повторить
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Попытка с меньшим остатком бюджета не имеет смысла, сек
+MIN_ATTEMPT_TIME = 0.05
+
+# Время запроса вместе с повторами; outcome: ok, http_error, deadline,
+# error (сеть), circuit_open (отклонен предохранителем)
+open_meteo_request_duration = registry.histogram(
+    'bot_open_meteo_request_duration_seconds', "Время запроса к Open-Meteo с повторами", ('outcome',)
+)
+open_meteo_circuit_state = registry.gauge(
+    'bot_open_meteo_circuit_state', "Предохранитель Open-Meteo: 0 - closed, 1 - half_open, 2 - open"
+)
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Бюджет времени на запрос исчерпан"""
+
+
+class Deadline:
+    """Бюджет времени: seconds секунд от создания"""
+
+    __slots__ = ('expires_at',)
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, connect, read):
+        """Таймаут попытки (подключение, чтение), урезанный до остатка бюджета"""
+        remaining = self.remaining()
+        if remaining < MIN_ATTEMPT_TIME:
+            raise DeadlineExceeded("Бюджет времени на запрос к Open-Meteo исчерпан")
+        return min(connect, remaining), min(read, remaining)
+
+
+class OpenMeteoClient:
+    """GET-запросы к Open-Meteo с повторами в пределах бюджета и предохранителем"""
+
+    def __init__(self, session, url, breaker=None, deadline=4.0, retries=3, backoff=0.5,
+                 connect_timeout=5.0, read_timeout=10.0):
+        self.session = session
+        self.url = url
+        self.breaker = breaker or CircuitBreaker('open-meteo')
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'retries': 0,
+            'deadline_exceeded': 0,
+        }
+
+    def get(self, params, deadline=None):
+        """JSON-ответ; deadline - бюджет в секундах (по умолчанию self.deadline)
+
+        CircuitOpenError - предохранитель разомкнут (запрос не выполнялся),
+        requests.RequestException - ошибка сети, HTTP или бюджета времени.
+        """
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            data = self._get(params, deadline)
+            outcome = 'ok'
+            return data
+        except CircuitOpenError:
+            outcome = 'circuit_open'
+            raise
+        except DeadlineExceeded:
+            outcome = 'deadline'
+            raise
+        except requests.exceptions.HTTPError:
+            outcome = 'http_error'
+            raise
+        finally:
+            open_meteo_request_duration.labels(outcome).observe(time.perf_counter() - start)
+
+    def _get(self, params, deadline):
+        self.breaker.before_call()
+        with self._lock:
+            self._stats['requests'] += 1
+
+        try:
+            data = self._get_with_retries(params, Deadline(deadline or self.deadline))
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and status < 500 and status != 429:
+                # 4xx - ошибка в запросе, сервис при этом работает
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            raise
+        except DeadlineExceeded:
+            with self._lock:
+                self._stats['deadline_exceeded'] += 1
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        return data
+
+    def _get_with_retries(self, params, deadline):
+        attempt = 0
+        while True:
+            timeout = deadline.timeout(self.connect_timeout, self.read_timeout)
+            try:
+                response = self.session.get(self.url, params=params, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+                delay = self.backoff * 2 ** attempt
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} от Open-Meteo", response=response
+                )
+                delay = _retry_after(response, self.backoff * 2 ** attempt)
+                # Соединение возвращается в пул
+                response.close()
+
+            attempt += 1
+            # Пауза, которая не оставит времени на попытку, бесполезна
+            if attempt > self.retries or deadline.remaining() - delay < MIN_ATTEMPT_TIME:
+                if isinstance(error, requests.exceptions.Timeout) and deadline.remaining() < MIN_ATTEMPT_TIME:
+                    raise DeadlineExceeded(f"Бюджет времени на запрос к Open-Meteo исчерпан: {error}")
+                raise error
+
+            with self._lock:
+                self._stats['retries'] += 1
+            logger.warning(f"Open-Meteo: {str(error)[:100]}, повтор через {delay:.1f} с "
+                           f"(попытка {attempt + 1})")
+            time.sleep(delay)
+
+    def stats(self):
+        """Статистика: запросы, повторы, превышения бюджета и состояние предохранителя"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['circuit'] = self.breaker.stats()
+        return stats
+
+
+def _retry_after(response, default):
+    """Пауза из заголовка Retry-After (в секундах) или default"""
+    try:
+        return float(response.headers.get('Retry-After', default))
+    except ValueError:
+        return default
+
+
+# Общий клиент для текущей погоды, прогноза и проверки доступности
+open_meteo_client = OpenMeteoClient(
+    open_meteo_session,
+    OPEN_METEO_URL,
+    CircuitBreaker(
+        'open-meteo',
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT,
+        half_open_max_calls=CIRCUIT_HALF_OPEN_CALLS
+    ),
+    deadline=OPEN_METEO_DEADLINE,
+    retries=HTTP_RETRIES,
+    backoff=HTTP_BACKOFF,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT
+)
+open_meteo_circuit_state.set_function(lambda: CIRCUIT_STATE_VALUES[open_meteo_client.breaker.state])
@@ -0,0 +1,355 @@
+"""Планировщик исходящих сообщений с учетом лимитов Telegram
+
+Telegram ограничивает отправку примерно 30 сообщениями в секунду на бота
+и примерно 1 сообщением в секунду в один чат (короткие всплески
+допускаются), при превышении отвечает 429 с retry_after. Планировщик
+держит очередь отправки: глобальный token bucket, token bucket на каждый
+чат, повтор после retry_after и приоритет ответов пользователю над
+массовыми отправками. Обработчик ставит сообщение в очередь и сразу
+продолжает работу.
+"""
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from telebot.apihelper import ApiTelegramException
+
+from metrics import registry
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.outbox')
+
+# Приоритеты: меньше - раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Сколько последних замеров задержки хранить для перцентилей
+LATENCY_WINDOW = 1000
+
+# Как часто забывать простаивающие чаты с полным bucket, сек
+IDLE_CHATS_PRUNE_INTERVAL = 60.0
+
+# Время от постановки в очередь до ответа Bot API, с ожиданием лимитов и повторами
+outbox_delivery_duration = registry.histogram(
+    'bot_outbox_delivery_seconds', "Время от постановки вызова в очередь до отправки",
+    ('priority', 'result'),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity про запас"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Сколько секунд ждать до появления токена (0 - токен есть)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ('priority', 'func', 'args', 'kwargs', 'future', 'enqueued_at', 'retries')
+
+    def __init__(self, priority, func, args, kwargs, now):
+        self.priority = priority
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = now
+        self.retries = 0
+
+
+class _ChatQueue:
+    __slots__ = ('jobs', 'bucket', 'blocked_until', 'in_flight', 'scheduled')
+
+    def __init__(self, bucket):
+        self.jobs = collections.deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.in_flight = False
+        self.scheduled = False
+
+
+class OutgoingScheduler:
+    """Очередь исходящих запросов к Bot API
+
+    submit(chat_id, func, *args) ставит вызов func в очередь чата и
+    возвращает Future с результатом. Внутри чата вызовы выполняются
+    строго по порядку и по одному; между чатами первыми уходят вызовы с
+    меньшим priority. Сами HTTP-запросы выполняют senders потоков,
+    поток планировщика только раздает токены.
+    """
+
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=3, senders=4, max_retries=5):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # Общий лимит без запаса: сообщения идут равномерно, без всплеска в первую секунду
+        self._global = TokenBucket(global_rate, 1, time.monotonic())
+        self._chats = {}
+        self._ready = []    # (priority, seq, chat_id) - можно отправлять
+        self._waiting = []  # (ready_at, seq, chat_id) - ждут токен чата или retry_after
+        self._depth = 0
+        self._in_flight = 0
+        self._closing = False
+        self._last_prune = time.monotonic()
+
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'errors': 0,
+            'retries': 0,
+            'max_depth': 0,
+        }
+        self._latencies = {
+            PRIORITY_INTERACTIVE: collections.deque(maxlen=LATENCY_WINDOW),
+            PRIORITY_BULK: collections.deque(maxlen=LATENCY_WINDOW),
+        }
+
+        self._executor = ThreadPoolExecutor(max_workers=senders, thread_name_prefix='outbox-sender')
+        self._thread = threading.Thread(target=self._run, name='outbox-scheduler', daemon=True)
+        self._thread.start()
+
+        logger.info(f"Очередь отправки: {global_rate} сообщ./с всего, {chat_rate} сообщ./с "
+                    f"на чат (запас {chat_burst}), потоков отправки: {senders}")
+
+    def submit(self, chat_id, func, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Постановка вызова func(*args, **kwargs) в очередь чата; возвращает Future"""
+        now = time.monotonic()
+        job = _Job(priority, func, args, kwargs, now)
+
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("Очередь отправки остановлена")
+
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _ChatQueue(
+                    TokenBucket(self.chat_rate, max(1, self.chat_burst), now)
+                )
+            chat.jobs.append(job)
+
+            self._depth += 1
+            self._stats['enqueued'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._depth)
+
+            self._schedule(chat_id, chat, now)
+            self._cond.notify()
+
+        return job.future
+
+    def _schedule(self, chat_id, chat, now):
+        """Постановка чата в ready или waiting (под self._cond)"""
+        if chat.scheduled or chat.in_flight or not chat.jobs:
+            return
+        chat.scheduled = True
+        ready_at = max(now + chat.bucket.delay(now), chat.blocked_until)
+        if ready_at <= now:
+            heapq.heappush(self._ready, (chat.jobs[0].priority, next(self._seq), chat_id))
+        else:
+            heapq.heappush(self._waiting, (ready_at, next(self._seq), chat_id))
+
+    def _run(self):
+        """Цикл планировщика: выдача токенов и передача вызовов потокам отправки"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+
+                while self._waiting and self._waiting[0][0] <= now:
+                    _, _, chat_id = heapq.heappop(self._waiting)
+                    chat = self._chats[chat_id]
+                    heapq.heappush(self._ready, (chat.jobs[0].priority, next(self._seq), chat_id))
+
+                if self._ready:
+                    timeout = self._global.delay(now)
+                    if timeout == 0:
+                        _, _, chat_id = heapq.heappop(self._ready)
+                        chat = self._chats[chat_id]
+                        chat.scheduled = False
+                        chat.in_flight = True
+                        job = chat.jobs.popleft()
+                        self._depth -= 1
+                        self._in_flight += 1
+                        self._global.take(now)
+                        chat.bucket.take(now)
+                        self._executor.submit(self._send, chat_id, chat, job)
+                        continue
+                elif self._waiting:
+                    timeout = self._waiting[0][0] - now
+                elif self._closing and not self._in_flight:
+                    break
+                else:
+                    timeout = None
+
+                if now - self._last_prune > IDLE_CHATS_PRUNE_INTERVAL:
+                    self._prune_idle_chats(now)
+
+                self._cond.wait(timeout)
+
+    def _prune_idle_chats(self, now):
+        """Удаление чатов без очереди с полным bucket - их лимит и так восстановлен"""
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.jobs and not chat.in_flight and chat.blocked_until <= now
+            and chat.bucket.is_full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+        self._last_prune = now
+
+    def _send(self, chat_id, chat, job):
+        """Выполнение вызова в потоке отправки"""
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429 and job.retries < self.max_retries:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                logger.warning(f"429 для чата {chat_id}: повтор через {retry_after} с "
+                               f"(попытка {job.retries + 1})")
+                self._retry(chat_id, chat, job, retry_after)
+                return
+            self._fail(chat_id, chat, job, e)
+        except Exception as e:
+            self._fail(chat_id, chat, job, e)
+        else:
+            job.future.set_result(result)
+            self._finish(chat_id, chat, job, sent=True)
+
+    def _retry(self, chat_id, chat, job, retry_after):
+        with self._cond:
+            job.retries += 1
+            self._stats['retries'] += 1
+            # Вызов возвращается в начало очереди чата - порядок сохраняется
+            chat.jobs.appendleft(job)
+            chat.blocked_until = time.monotonic() + retry_after
+            self._depth += 1
+            self._release(chat_id, chat)
+
+    def _fail(self, chat_id, chat, job, error):
+        logger.error(f"Ошибка отправки в чат {chat_id}: {error}")
+        job.future.set_exception(error)
+        self._finish(chat_id, chat, job, sent=False)
+
+    def _finish(self, chat_id, chat, job, sent):
+        latency = time.monotonic() - job.enqueued_at
+        outbox_delivery_duration.labels(
+            PRIORITY_NAMES[job.priority], 'sent' if sent else 'error'
+        ).observe(latency)
+        with self._cond:
+            if sent:
+                self._stats['sent'] += 1
+                self._latencies[job.priority].append(latency)
+            else:
+                self._stats['errors'] += 1
+            self._release(chat_id, chat)
+
+    def _release(self, chat_id, chat):
+        """Чат снова может отправлять (под self._cond)"""
+        chat.in_flight = False
+        self._in_flight -= 1
+        self._schedule(chat_id, chat, time.monotonic())
+        self._cond.notify()
+
+    def close(self, timeout=10.0):
+        """Остановка после отправки уже поставленных сообщений"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        logger.info(f"Очередь отправки остановлена: {self.stats()}")
+
+    def depth(self):
+        """Сколько вызовов ждут отправки"""
+        with self._cond:
+            return self._depth
+
+    def stats(self):
+        """Статистика: глубина очереди, отправлено, ошибки, повторы 429, задержка в мс"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['depth'] = self._depth
+            stats['in_flight'] = self._in_flight
+            stats['chats'] = len(self._chats)
+            latencies = {priority: sorted(values) for priority, values in self._latencies.items()}
+
+        for priority, name in PRIORITY_NAMES.items():
+            values = latencies[priority]
+            if values:
+                stats[f'{name}_latency_avg_ms'] = round(sum(values) / len(values) * 1000, 3)
+                stats[f'{name}_latency_p95_ms'] = round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3)
+        return stats
+
+
+class OutboxMixin:
+    """Отправка сообщений бота через OutgoingScheduler
+
+    send_message, edit_message_text и send_document ставятся в очередь и
+    возвращают Future (результат - Message). Файл, переданный в
+    send_document, переходит к очереди и закрывается после отправки или
+    ошибки - обработчик не ждет загрузки. Массовые отправки передают
+    priority=PRIORITY_BULK.
+    """
+
+    def __init__(self, *args, outbox, **kwargs):
+        self.outbox = outbox
+        super().__init__(*args, **kwargs)
+
+    def send_message(self, chat_id, text, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return self.outbox.submit(
+            chat_id, super().send_message, chat_id, text, *args, priority=priority, **kwargs
+        )
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, *args,
+                          priority=PRIORITY_INTERACTIVE, **kwargs):
+        # Сообщения inline-режима (без chat_id) в лимиты чата не попадают
+        return self.outbox.submit(
+            chat_id or kwargs.get('inline_message_id'), super().edit_message_text,
+            text, chat_id, message_id, *args, priority=priority, **kwargs
+        )
+
+    def send_document(self, chat_id, document, *args, priority=PRIORITY_BULK, **kwargs):
+        close = getattr(document, 'close', None)
+        try:
+            future = self.outbox.submit(
+                chat_id, super().send_document, chat_id, document, *args, priority=priority, **kwargs
+            )
+        except Exception:
+            if close is not None:
+                close()
+            raise
+
+        if close is not None:
+            future.add_done_callback(lambda _: close())
+        return future
@@ -0,0 +1,203 @@
+import logging
+
+import requests
+
+from circuit_breaker import CircuitOpenError
+from config import (
+    MOSCOW_COORDS, OPEN_METEO_PING_DEADLINE, WEATHER_CACHE_TTL, WEATHER_MAX_STALE,
+    WEATHER_PREFETCH_LOCATIONS, WEATHER_PREFETCH_LEAD, WEATHER_PREFETCH_JITTER,
+    WEATHER_PREFETCH_CALLS_PER_HOUR, WEATHER_GRID_STEP, WEATHER_BATCH_WINDOW_MS,
+    WEATHER_BATCH_MAX_POINTS
+)
+from open_meteo import open_meteo_client
+from locations import CITIES, find_city, grid_cell
+from weather_batch import WeatherBatcher
+from weather_cache import WeatherCache
+from weather_prefetch import WeatherPrefetcher
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.weather')
+
+# Простая интерпретация кодов погоды
+WEATHER_DESCRIPTIONS = {
+    0: "ясно ☀️",
+    1: "в основном ясно 🌤",
+    2: "переменная облачность ⛅",
+    3: "пасмурно ☁️",
+    45: "туман 🌫",
+    48: "туман с инеем 🌫",
+    51: "легкая морось 🌧",
+    53: "умеренная морось 🌧",
+    55: "сильная морось 🌧",
+    61: "небольшой дождь 🌦",
+    63: "умеренный дождь 🌧",
+    65: "сильный дождь 🌧",
+    56: "ледяная морось 🌧",
+    57: "сильная ледяная морось 🌧",
+    66: "ледяной дождь 🌧",
+    67: "сильный ледяной дождь 🌧",
+    71: "небольшой снег 🌨",
+    73: "умеренный снег 🌨",
+    75: "сильный снег ❄️",
+    77: "снежные зерна 🌨",
+    80: "ливни 🌧",
+    81: "сильные ливни 🌧",
+    82: "очень сильные ливни ⛈",
+    85: "снегопад 🌨",
+    86: "сильный снегопад ❄️",
+    95: "гроза ⛈",
+    96: "гроза с градом ⛈",
+    99: "гроза с сильным градом ⛈"
+}
+
+# Поля блока current для сообщения о погоде
+CURRENT_FIELDS = ("temperature_2m", "weather_code", "wind_speed_10m", "relative_humidity_2m")
+
+# Блок current Open-Meteo обновляется раз в 15 минут - запросы в пределах
+# TTL отдаются из кэша, а при недоступности API - последние данные
+weather_cache = WeatherCache(ttl=WEATHER_CACHE_TTL, max_stale=WEATHER_MAX_STALE)
+
+
+def fetch_current_batch(points, fields=CURRENT_FIELDS):
+    """Блоки current по списку точек одним запросом (None - по точке нет данных)"""
+    params = {
+        "latitude": ",".join(str(latitude) for latitude, _ in points),
+        "longitude": ",".join(str(longitude) for _, longitude in points),
+        "current": list(fields),
+        "timezone": "Europe/Moscow"
+    }
+
+    data = open_meteo_client.get(params)
+    # По одной точке Open-Meteo отвечает объектом, по нескольким - списком
+    if isinstance(data, dict):
+        data = [data]
+    if len(data) != len(points):
+        raise ValueError(f"Open-Meteo вернул {len(data)} ответов на {len(points)} точек")
+
+    results = [location.get("current") or None for location in data]
+    logger.info(f"Получены данные погоды по {len(points)} точкам")
+    return results
+
+
+# Промахи кэша по разным ячейкам за WEATHER_BATCH_WINDOW_MS уходят одним запросом
+weather_batcher = WeatherBatcher(
+    fetch_current_batch,
+    window=WEATHER_BATCH_WINDOW_MS / 1000,
+    max_batch=WEATHER_BATCH_MAX_POINTS
+)
+
+
+def current_weather_target(latitude, longitude, fields=CURRENT_FIELDS):
+    """Ключ кэша (ячейка сетки и поля) и загрузчик блока current для ячейки"""
+    fields = tuple(fields)
+    latitude, longitude = grid_cell(latitude, longitude, WEATHER_GRID_STEP)
+    return (latitude, longitude, fields), lambda: weather_batcher.fetch(latitude, longitude, fields)
+
+
+def get_current_weather(latitude, longitude, fields=CURRENT_FIELDS):
+    """Блок current из кэша (CachedWeather)"""
+    return weather_cache.get(*current_weather_target(latitude, longitude, fields))
+
+
+# Москва и точки из WEATHER_PREFETCH_LOCATIONS обновляются в фоне до
+# истечения TTL; запускается из main() бота
+weather_prefetcher = WeatherPrefetcher(
+    weather_cache,
+    [
+        current_weather_target(latitude, longitude)
+        for latitude, longitude in dict.fromkeys(
+            [(MOSCOW_COORDS["latitude"], MOSCOW_COORDS["longitude"])] + WEATHER_PREFETCH_LOCATIONS
+        )
+    ],
+    lead=WEATHER_PREFETCH_LEAD,
+    jitter=WEATHER_PREFETCH_JITTER,
+    calls_per_hour=WEATHER_PREFETCH_CALLS_PER_HOUR
+)
+
+
+def format_age(seconds):
+    """Возраст данных для пользователя: 'N мин' или 'N ч'"""
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{max(1, minutes)} мин"
+    return f"{minutes // 60} ч"
+
+
+def format_unavailable(error):
+    """Быстрый ответ, пока предохранитель Open-Meteo разомкнут"""
+    return (f"⚡ Сервис погоды временно недоступен. "
+            f"Попробуйте через {max(1, round(error.retry_after))} с.")
+
+
+def get_weather_moscow():
+    """Текущая погода в Москве (Open-Meteo через кэш)"""
+    return get_weather_text(MOSCOW_COORDS["latitude"], MOSCOW_COORDS["longitude"], "в Москве")
+
+
+def get_weather_city(name):
+    """Текущая погода в городе из локальной таблицы"""
+    found = find_city(name)
+    if found is None:
+        return (
+            f"🤷 Город «{name[:50]}» не найден.\n\n"
+            f"Доступные города: {', '.join(CITIES)}.\n"
+            f"Или отправьте геопозицию - покажу погоду рядом с вами."
+        )
+    _, where, latitude, longitude = found
+    return get_weather_text(latitude, longitude, where)
+
+
+def get_weather_location(latitude, longitude):
+    """Текущая погода в присланной геопозиции"""
+    return get_weather_text(latitude, longitude, "рядом с вами")
+
+
+def get_weather_text(latitude, longitude, where):
+    """Сообщение о текущей погоде в точке; where - 'в Москве', 'рядом с вами'"""
+    try:
+        cached = get_current_weather(latitude, longitude)
+
+        current = cached.value
+        temperature = current.get("temperature_2m")
+        wind_speed = current.get("wind_speed_10m")
+        weather_code = current.get("weather_code")
+        humidity = current.get("relative_humidity_2m")
+
+        weather_desc = WEATHER_DESCRIPTIONS.get(weather_code, "неизвестно")
+
+        if temperature is not None:
+            weather_text = (
+                f"🌤 Погода {where} сейчас:\n"
+                f"• Температура: {temperature}°C\n"
+                f"• Состояние: {weather_desc}\n"
+                f"• Влажность: {humidity}%\n"
+                f"• Ветер: {wind_speed} км/ч"
+            )
+            if cached.stale:
+                weather_text += f"\n\n⏳ Данные получены {format_age(cached.age)} назад"
+            return weather_text
+        else:
+            return "Не удалось получить данные о погоде. Попробуйте позже."
+
+    except CircuitOpenError as e:
+        # Open-Meteo недоступен, а в кэше по точке ничего нет - отвечаем сразу
+        return format_unavailable(e)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка при запросе погоды: {str(e)[:100]}...")
+        return "Ошибка при получении данных о погоде. Сервис временно недоступен."
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка в get_weather_text: {str(e)[:100]}...")
+        return "Произошла непредвиденная ошибка."
+
+
+def check_api_connection():
+    """Проверка доступности Open-Meteo API для фоновых проверок; исключение при ошибке
+
+    При разомкнутом предохранителе сразу CircuitOpenError.
+    """
+    params = {
+        "latitude": MOSCOW_COORDS["latitude"],
+        "longitude": MOSCOW_COORDS["longitude"],
+        "current": "temperature_2m"
+    }
+    open_meteo_client.get(params, deadline=OPEN_METEO_PING_DEADLINE)
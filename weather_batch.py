@@ -0,0 +1,97 @@
+"""Объединение запросов погоды по разным точкам в один запрос к API
+
+Open-Meteo принимает списки координат (latitude=55.8,59.9&longitude=
+37.6,30.3) и возвращает ответы по всем точкам сразу. Первый запрос с
+данным набором полей открывает пакет и ждет window секунд (или пока
+пакет не наполнится); точки, запрошенные за это время другими потоками,
+уходят вместе с ним одним HTTP-запросом.
+"""
+import logging
+import threading
+from concurrent.futures import Future
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.weather.batch')
+
+
+class _Batch:
+    __slots__ = ('points', 'future', 'full')
+
+    def __init__(self):
+        self.points = {}          # (широта, долгота) -> индекс в запросе
+        self.future = Future()    # список ответов по точкам
+        self.full = threading.Event()
+
+
+class WeatherBatcher:
+    """Пакетная загрузка: fetch(lat, lon, fields) -> ответ по одной точке
+
+    fetch_batch(points, fields) выполняет один запрос по списку точек и
+    возвращает ответы в том же порядке (None - по точке нет данных).
+    Ошибка запроса достается всем ожидающим пакета.
+    """
+
+    def __init__(self, fetch_batch, window=0.05, max_batch=50):
+        self.fetch_batch = fetch_batch
+        self.window = window
+        self.max_batch = max(1, int(max_batch))
+
+        self._open = {}     # fields -> пакет, принимающий точки
+        self._lock = threading.Lock()
+        self._stats = {
+            'points': 0,
+            'batches': 0,
+            'max_batch': 0,
+            'errors': 0,
+        }
+
+    def fetch(self, latitude, longitude, fields):
+        """Ответ по точке; поток ждет, пока уйдет пакет, в который она попала"""
+        point = (latitude, longitude)
+        with self._lock:
+            batch = self._open.get(fields)
+            leader = batch is None
+            if leader:
+                batch = self._open[fields] = _Batch()
+            index = batch.points.setdefault(point, len(batch.points))
+            if len(batch.points) >= self.max_batch:
+                # Полный пакет больше не принимает точки и уходит сразу
+                del self._open[fields]
+                batch.full.set()
+
+        if leader:
+            self._send(batch, fields)
+
+        result = batch.future.result()[index]
+        if result is None:
+            raise ValueError(f"Нет данных погоды для точки {point}")
+        return result
+
+    def _send(self, batch, fields):
+        """Ожидание попутных точек и запрос по всему пакету (в потоке первого запроса)"""
+        batch.full.wait(self.window)
+        with self._lock:
+            if self._open.get(fields) is batch:
+                del self._open[fields]
+            points = list(batch.points)
+            self._stats['points'] += len(points)
+            self._stats['batches'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(points))
+
+        try:
+            results = self.fetch_batch(points, fields)
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            batch.future.set_exception(e)
+            return
+        batch.future.set_result(results)
+        if len(points) > 1:
+            logger.info(f"Погода по {len(points)} точкам получена одним запросом")
+
+    def stats(self):
+        """Статистика: точек, запросов (пакетов), самый большой пакет, ошибки"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['points_per_batch'] = round(stats['points'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.weather.cache')
+
+# Значение из кэша: возраст в секундах и признак устаревших данных
+CachedWeather = namedtuple('CachedWeather', ['value', 'age', 'stale'])
+
+
+class WeatherCache:
+    """Кэш ответов погодного API с TTL, объединением запросов и stale-while-revalidate
+
+    Возраст записи определяет ответ:
+    - меньше ttl - запись свежая и отдается сразу;
+    - от ttl до max_stale - запись отдается сразу с пометкой stale, а
+      обновление идет в фоне;
+    - старше max_stale или записи нет - загрузка в потоке вызывающего;
+      если она не удалась, а старая запись есть - отдается она (stale).
+
+    Одновременные промахи по одному ключу объединяются: загрузчик
+    вызывается один раз, остальные ждут его результата.
+    """
+
+    def __init__(self, ttl=600.0, max_stale=3600.0, max_entries=1000, refresh_workers=2):
+        self.ttl = ttl
+        self.max_stale = max(ttl, max_stale)
+        self.max_entries = max(1, int(max_entries))
+        self.refresh_workers = refresh_workers
+
+        self._entries = OrderedDict()   # key -> (value, fetched_at)
+        self._inflight = {}             # key -> Future((value, fetched_at))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'loads': 0,
+            'background_refreshes': 0,
+            'errors': 0,
+            'stale_on_error': 0,
+            'evictions': 0,
+        }
+
+    def get(self, key, loader):
+        """Значение для ключа (CachedWeather); loader() загружает его из API"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return CachedWeather(value, age, False)
+                if age < self.max_stale:
+                    self._entries.move_to_end(key)
+                    self._stats['stale_hits'] += 1
+                    self._refresh_in_background(key, loader)
+                    return CachedWeather(value, age, True)
+
+            self._stats['misses'] += 1
+            future, leader = self._claim(key)
+            if not leader:
+                self._stats['coalesced'] += 1
+
+        if leader:
+            self._load(key, loader, future)
+
+        try:
+            value, fetched_at = future.result()
+        except Exception:
+            # API недоступен - лучше старые данные, чем ошибка
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    raise
+                self._stats['stale_on_error'] += 1
+            value, fetched_at = entry
+            return CachedWeather(value, time.monotonic() - fetched_at, True)
+
+        return CachedWeather(value, time.monotonic() - fetched_at, False)
+
+    def refresh(self, key, loader):
+        """Принудительное обновление (например, перед истечением TTL)
+
+        Если ключ уже загружается, ждет ту загрузку. Исключение загрузчика
+        пробрасывается, запись в кэше при этом не меняется.
+        """
+        with self._lock:
+            future, leader = self._claim(key)
+            if not leader:
+                self._stats['coalesced'] += 1
+        if leader:
+            self._load(key, loader, future)
+        return future.result()[0]
+
+    def expires_in(self, key):
+        """Секунд до истечения TTL записи (отрицательное - истекла), None - записи нет"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[1] + self.ttl - time.monotonic()
+
+    def _claim(self, key):
+        """Future загрузки ключа и признак, что загружать должен вызывающий (под self._lock)"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future, False
+        future = self._inflight[key] = Future()
+        return future, True
+
+    def _refresh_in_background(self, key, loader):
+        """Фоновое обновление, если ключ еще не загружается (под self._lock)"""
+        if key in self._inflight:
+            return
+        future, _ = self._claim(key)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.refresh_workers, thread_name_prefix='weather-refresh'
+            )
+        self._stats['background_refreshes'] += 1
+        self._executor.submit(self._load, key, loader, future)
+
+    def _load(self, key, loader, future):
+        """Вызов загрузчика и публикация результата ожидающим"""
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+                del self._inflight[key]
+            logger.warning(f"Не удалось обновить погоду {key}: {str(e)[:100]}")
+            future.set_exception(e)
+            return
+
+        fetched_at = time.monotonic()
+        with self._lock:
+            self._stats['loads'] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (value, fetched_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+            del self._inflight[key]
+        future.set_result((value, fetched_at))
+
+    def stats(self):
+        """Статистика: попадания (свежие и устаревшие), промахи, загрузки, размер"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Остановка фоновых обновлений"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
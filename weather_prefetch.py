@@ -0,0 +1,129 @@
+"""Фоновое обновление кэша погоды до истечения TTL
+
+Без него первый пользователь после истечения записи ждет ответа
+Open-Meteo. Планировщик обновляет настроенные координаты за lead секунд
+до истечения TTL: момент обновления сдвигается на случайную величину до
+jitter секунд (точки не обновляются одновременно), после ошибки
+следующая попытка откладывается с экспоненциальной задержкой, а число
+запросов к API за скользящий час ограничено calls_per_hour. Обработчик
+погоды в обычном случае только читает кэш.
+"""
+import collections
+import heapq
+import logging
+import random
+import threading
+import time
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.weather.prefetch')
+
+# Окно бюджета запросов, сек
+BUDGET_WINDOW = 3600.0
+
+
+class WeatherPrefetcher:
+    """Поток, обновляющий записи WeatherCache перед истечением TTL
+
+    targets - список пар (ключ кэша, загрузчик), тех же, что использует
+    обработчик погоды. Если запись уже обновил пользователь, планировщик
+    не тратит запрос и переносит обновление по expires_in().
+    """
+
+    def __init__(self, cache, targets, lead=60.0, jitter=30.0, calls_per_hour=60,
+                 backoff_base=30.0, backoff_max=900.0):
+        self.cache = cache
+        self.targets = list(targets)
+        # Обновление должно успеть до истечения, но не раньше половины TTL
+        self.lead = min(lead, cache.ttl / 2)
+        self.jitter = min(jitter, self.lead)
+        self.calls_per_hour = max(1, int(calls_per_hour))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._calls = collections.deque()   # моменты запросов за последний час
+        self._failures = [0] * len(self.targets)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'refreshes': 0,
+            'errors': 0,
+            'skipped_fresh': 0,
+            'deferred_budget': 0,
+        }
+
+    def start(self):
+        """Запуск потока; первые обновления - сразу, с разбросом jitter"""
+        if self._thread is not None or not self.targets:
+            return
+        self._thread = threading.Thread(target=self._run, name='weather-prefetch', daemon=True)
+        self._thread.start()
+        logger.info(f"Фоновое обновление погоды: точек {len(self.targets)}, за {self.lead:.0f} с "
+                    f"до истечения TTL, не больше {self.calls_per_hour} запросов в час")
+
+    def _run(self):
+        now = time.monotonic()
+        schedule = [(now + random.uniform(0, self.jitter), index) for index in range(len(self.targets))]
+        heapq.heapify(schedule)
+
+        while not self._stop.is_set():
+            due, index = schedule[0]
+            if self._stop.wait(max(0.0, due - time.monotonic())):
+                break
+            heapq.heapreplace(schedule, (self._process(index), index))
+
+    def _process(self, index):
+        """Обновление точки index; возвращает момент следующей проверки"""
+        key, loader = self.targets[index]
+        now = time.monotonic()
+
+        # Запись еще свежая (например, ее только что загрузил пользователь)
+        expires_in = self.cache.expires_in(key)
+        if expires_in is not None and expires_in > self.lead:
+            with self._lock:
+                self._stats['skipped_fresh'] += 1
+            return self._next_refresh(now + expires_in)
+
+        # Бюджет на час исчерпан - ждем, пока из окна выйдет самый старый запрос
+        while self._calls and now - self._calls[0] >= BUDGET_WINDOW:
+            self._calls.popleft()
+        if len(self._calls) >= self.calls_per_hour:
+            with self._lock:
+                self._stats['deferred_budget'] += 1
+            return self._calls[0] + BUDGET_WINDOW + random.uniform(0, self.jitter)
+
+        self._calls.append(now)
+        try:
+            self.cache.refresh(key, loader)
+        except Exception as e:
+            self._failures[index] += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures[index] - 1))
+            with self._lock:
+                self._stats['errors'] += 1
+            logger.warning(f"Обновление погоды {key} не удалось (попытка {self._failures[index]}), "
+                           f"повтор через {delay:.0f} с: {str(e)[:100]}")
+            return time.monotonic() + delay * random.uniform(0.5, 1.0)
+
+        self._failures[index] = 0
+        with self._lock:
+            self._stats['refreshes'] += 1
+        return self._next_refresh(time.monotonic() + self.cache.ttl)
+
+    def _next_refresh(self, expires_at):
+        """Момент обновления записи, истекающей в expires_at"""
+        return expires_at - self.lead + random.uniform(0, self.jitter)
+
+    def stop(self, timeout=5.0):
+        """Остановка потока"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Статистика: обновления, ошибки, пропуски (свежая запись, бюджет), запросы за час"""
+        with self._lock:
+            stats = dict(self._stats)
+        now = time.monotonic()
+        stats['calls_last_hour'] = sum(1 for t in list(self._calls) if now - t < BUDGET_WINDOW)
+        return stats
@@ -0,0 +1,229 @@
+"""Прием обновлений Telegram через webhook
+
+Легкий HTTP-сервер на стандартной библиотеке: проверяет секретный токен
+из заголовка X-Telegram-Bot-Api-Secret-Token, сразу отвечает 200 и
+передает обновления в пул обработчиков бота. Telegram не ждет, пока
+обработчик отработает, а обновления не копятся в long polling.
+
+Локальная проверка - отправка записанных обновлений:
+    python webhook_server.py replay updates.json --url http://127.0.0.1:8080/webhook --secret <токен>
+"""
+import collections
+import hmac
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Настройка логгера
+logger = logging.getLogger('telegram_bot.webhook')
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Обновление Telegram занимает единицы килобайт
+MAX_BODY_SIZE = 1024 * 1024
+
+# Сколько последних замеров задержки хранить для перцентилей
+LATENCY_WINDOW = 1000
+
+
+class WebhookStats:
+    """Счетчики запросов и задержка от приема запроса до запуска обработчика"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.updates = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def record(self, updates_count):
+        with self._lock:
+            self.requests += 1
+            self.updates += updates_count
+
+    def record_latency(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def stats(self):
+        """Снимок статистики; задержка в миллисекундах по последним обновлениям"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'requests': self.requests,
+                'updates': self.updates,
+                'rejected': self.rejected,
+                'errors': self.errors,
+            }
+
+        if latencies:
+            stats['latency_avg_ms'] = round(sum(latencies) / len(latencies) * 1000, 3)
+            stats['latency_p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 3)
+            stats['latency_p95_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3)
+            stats['latency_max_ms'] = round(latencies[-1] * 1000, 3)
+        return stats
+
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        # Часы те же, что у пула обработчиков (time.monotonic)
+        received_at = time.monotonic()
+        server = self.server
+
+        if self.path != server.webhook_path:
+            self._reply(404)
+            return
+
+        # Токен сравнивается за постоянное время. compare_digest принимает
+        # строки только из ASCII, поэтому сравниваются байты: http.server
+        # декодирует заголовки как latin-1, обратное кодирование дает
+        # исходные байты запроса
+        if server.secret_token and not hmac.compare_digest(
+                self.headers.get(SECRET_TOKEN_HEADER, '').encode('latin-1'),
+                server.secret_token.encode('utf-8')):
+            server.stats.reject()
+            logger.warning(f"Webhook: неверный секретный токен от {self.client_address[0]}")
+            self._reply(403)
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0
+        if not 0 < length <= MAX_BODY_SIZE:
+            server.stats.reject()
+            self._reply(413 if length > MAX_BODY_SIZE else 400)
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            server.stats.reject()
+            self._reply(400)
+            return
+
+        # Telegram присылает одно обновление, при проверке удобно слать список
+        updates = payload if isinstance(payload, list) else [payload]
+
+        # Отвечаем до обработки: Telegram не ждет обработчиков
+        self._reply(200)
+
+        def on_start():
+            # Задержка до запуска обработчика - с ожиданием в очереди чата
+            server.stats.record_latency(time.monotonic() - received_at)
+
+        try:
+            server.dispatch(updates, on_start)
+        except Exception as e:
+            server.stats.error()
+            logger.error(f"Webhook: ошибка передачи обновлений в обработчики: {e}")
+            return
+
+        server.stats.record(len(updates))
+
+    def do_GET(self):
+        # Проверка доступности для балансировщика
+        self._reply(200 if self.path == '/health' else 404)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        if status >= 400:
+            # Тело отклоненного запроса не прочитано - соединение не переиспользуем
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP-сервер webhook
+
+    dispatch(updates, on_start) получает список разобранных
+    JSON-обновлений и должен быстро вернуть управление - сама обработка
+    идет в пуле. on_start() вызывается в потоке пула перед обработкой
+    каждого обновления: по нему считается задержка до обработчика.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, dispatch, host='127.0.0.1', port=8080, path='/webhook', secret_token=None):
+        super().__init__((host, port), _WebhookRequestHandler)
+        self.dispatch = dispatch
+        self.webhook_path = path
+        self.secret_token = secret_token
+        self.stats = WebhookStats()
+
+        if not secret_token:
+            logger.warning("Webhook: секретный токен не задан, запросы не проверяются")
+
+    def get_stats(self):
+        """Статистика запросов webhook"""
+        return self.stats.stats()
+
+
+def create_bot_dispatch(bot):
+    """dispatch для ChatOrderedTeleBot: обновления уходят в очереди чатов"""
+    from telebot import types
+
+    def dispatch(updates, on_start=None):
+        bot.process_new_updates(
+            [types.Update.de_json(update) for update in updates], on_start=on_start
+        )
+
+    return dispatch
+
+
+def replay_updates(filename, url, secret_token=None):
+    """Отправка записанных обновлений (JSON-массив или JSON Lines) на webhook"""
+    import urllib.request
+
+    with open(filename, encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        updates = json.loads(text)
+    else:
+        updates = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    headers = {'Content-Type': 'application/json'}
+    if secret_token:
+        headers[SECRET_TOKEN_HEADER] = secret_token
+
+    for update in updates:
+        request = urllib.request.Request(
+            url, data=json.dumps(update).encode('utf-8'), headers=headers, method='POST'
+        )
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=10) as response:
+            status = response.status
+        print(f"update_id={update.get('update_id')}: {status}, {(time.perf_counter() - start) * 1000:.1f} мс")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Проверка webhook записанными обновлениями")
+    parser.add_argument('command', choices=['replay'])
+    parser.add_argument('file', help="JSON-массив обновлений или JSON Lines")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default=None, help="Секретный токен webhook")
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        replay_updates(args.file, args.url, args.secret)